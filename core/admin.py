@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Poll, Vote, UserProfile, User
+from .models import Poll, Vote, UserProfile, User, OutboxEmail, CategoryStats
 
 # Custom User Admin
 class CustomUserAdmin(UserAdmin):
@@ -46,8 +46,22 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'phone', 'is_verified')
     search_fields = ('user__email', 'phone')
 
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('to_email', 'subject')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    # Bodies hold one-time codes; never show them
+    exclude = ('body', 'html_body')
+
+class CategoryStatsAdmin(admin.ModelAdmin):
+    list_display = ('category', 'poll_count', 'vote_count', 'option_count', 'updated_at')
+    readonly_fields = ('category', 'poll_count', 'option_count', 'vote_count', 'updated_at')
+
 # Register models
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Poll, PollAdmin)
 admin.site.register(Vote, VoteAdmin)
 admin.site.register(UserProfile, UserProfileAdmin)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
+admin.site.register(CategoryStats, CategoryStatsAdmin)
@@ -0,0 +1,74 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import CategoryStats, Poll
+
+
+def category_analytics(top=5):
+    """
+    Dashboard totals per category from CategoryStats: polls, votes, average
+    options per poll and the ``top`` polls by votes.
+
+    One query reads the aggregate rows and one indexed ``LIMIT top`` query
+    per category (polls_category_votes_idx) fetches its top polls, so the
+    cost grows with the number of categories, not polls.
+    """
+    categories = []
+    for stats in CategoryStats.objects.filter(poll_count__gt=0):
+        top_polls = (
+            Poll.objects.filter(category=stats.category)
+            .order_by('-vote_count', 'id')
+            .values('id', 'question', 'vote_count')[:top]
+        ) if top else []
+        categories.append({
+            'category': stats.category,
+            'pollCount': stats.poll_count,
+            'voteCount': stats.vote_count,
+            'averageOptions': round(stats.average_options, 2),
+            'topPolls': [
+                {'id': poll['id'], 'question': poll['question'], 'totalVotes': poll['vote_count']}
+                for poll in top_polls
+            ],
+        })
+    return {
+        'totalPolls': sum(c['pollCount'] for c in categories),
+        'totalVotes': sum(c['voteCount'] for c in categories),
+        'categories': categories,
+    }
+
+
+def rebuild_category_stats(chunk_size=2000):
+    """
+    Recompute Poll.vote_count and every CategoryStats row from Poll.votes.
+
+    Needed after writes that skip Poll's signals (bulk_create, update(),
+    raw SQL, seed_data) and to repair drift. Reads every poll, in
+    ``chunk_size`` batches, and swaps the aggregate rows in one
+    transaction; votes recorded while it runs may be missed, so run it
+    again if the site was busy.
+    """
+    totals = defaultdict(lambda: [0, 0, 0])
+    stale = []
+    rows = Poll.objects.order_by().values_list('id', 'category', 'options', 'votes', 'vote_count')
+    for poll_id, category, options, votes, vote_count in rows.iterator(chunk_size=chunk_size):
+        total_votes = sum(votes.values()) if votes else 0
+        category_totals = totals[category]
+        category_totals[0] += 1
+        category_totals[1] += len(options or ())
+        category_totals[2] += total_votes
+        if total_votes != vote_count:
+            stale.append(Poll(id=poll_id, vote_count=total_votes))
+
+    with transaction.atomic():
+        Poll.objects.bulk_update(stale, ['vote_count'], batch_size=chunk_size)
+        CategoryStats.objects.all().delete()
+        CategoryStats.objects.bulk_create([
+            CategoryStats(category=category, poll_count=polls, option_count=options, vote_count=votes)
+            for category, (polls, options, votes) in totals.items()
+        ])
+    return {
+        'polls': sum(t[0] for t in totals.values()),
+        'categories': len(totals),
+        'vote_counts_fixed': len(stale),
+    }
@@ -0,0 +1,17 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .token_blacklist import token_blacklist
+
+
+class BlacklistJWTAuthentication(JWTAuthentication):
+    """JWT authentication that also rejects access tokens revoked at logout"""
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if token_blacklist.is_blacklisted(validated_token.get('jti')):
+            raise InvalidToken({
+                'detail': 'Token is blacklisted',
+                'code': 'token_not_valid',
+            })
+        return validated_token
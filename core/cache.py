@@ -0,0 +1,391 @@
+import math
+import os
+import pickle
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+from .db_router import use_primary
+
+GENERATION_KEY = '__two_tier_generation__'
+INVALIDATION_KEY = '__two_tier_invalidation__:{}'
+CLEAR_ALL = '__two_tier_clear__'  # Invalidation log entry: drop the whole L1
+
+_MISSING = object()
+
+
+class TwoTierCache(BaseCache):
+    """
+    Small per-process LRU (L1) in front of a shared cache (L2).
+
+    Reads are served from L1 when possible. Every write or delete goes to L2
+    and appends the key to a generation-stamped invalidation log stored in
+    L2; each process replays that log at most every SYNC_INTERVAL seconds and
+    evicts the listed keys from its L1. L1 entries also never outlive
+    L1_TIMEOUT, so a change made by one worker is visible to all others
+    within min(SYNC_INTERVAL, L1_TIMEOUT) seconds even if a log entry is
+    lost.
+
+    Generations come from ``incr`` on L2, which is atomic on Redis,
+    Memcached and locmem; on FileBasedCache it is a read-modify-write, so
+    it runs under an exclusive lock file in the cache directory.
+
+    OPTIONS:
+        L2: alias of the shared cache in CACHES (file/DB locally, Redis or
+            Memcached in production)
+        L1_MAX_ENTRIES: LRU size per process
+        L1_TIMEOUT: upper bound on how long L1 may hold an entry
+        SYNC_INTERVAL: how often the invalidation log is checked
+        LOG_SIZE: invalidations remembered; a process further behind clears L1
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = options.get('L2', 'shared')
+        self.l1_max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.sync_interval = options.get('SYNC_INTERVAL', 1)
+        self.log_size = options.get('LOG_SIZE', 1000)
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._own_generations = set()
+        self._synced_at = 0.0
+        self._stats = {'l1_hits': 0, 'l1_misses': 0, 'l2_hits': 0, 'l2_misses': 0, 'invalidations': 0}
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    # ---- L1 helpers ----
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, pickled = entry
+            if expires_at <= time.monotonic():
+                del self._l1[key]
+                return _MISSING
+            self._l1.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def _l1_set(self, key, value, timeout):
+        ttl = self.l1_timeout if timeout is None else min(timeout, self.l1_timeout)
+        if ttl <= 0:
+            self._l1_delete(key)
+            return
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._l1[key] = (time.monotonic() + ttl, pickled)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    # ---- cross-process invalidation ----
+
+    @contextmanager
+    def _generation_lock(self):
+        l2 = self.l2
+        if not isinstance(l2, FileBasedCache):
+            yield
+            return
+        os.makedirs(l2._dir, exist_ok=True)
+        with open(os.path.join(l2._dir, 'two_tier_generation.lock'), 'a') as f:
+            locks.lock(f, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(f)
+
+    def _next_generation(self, floor=0):
+        try:
+            return self.l2.incr(GENERATION_KEY)
+        except ValueError:
+            # First write, or L2 was flushed: continue from ``floor``
+            self.l2.add(GENERATION_KEY, floor, timeout=None)
+            return self.l2.incr(GENERATION_KEY)
+
+    def _publish(self, key):
+        """Record that ``key`` changed so other processes evict it from L1"""
+        with self._generation_lock():
+            generation = self._next_generation()
+        self._log(generation, key)
+
+    def _log(self, generation, key):
+        self.l2.set(INVALIDATION_KEY.format(generation), key, timeout=max(self.sync_interval * 60, 60))
+        with self._lock:
+            self._own_generations.add(generation)
+            if len(self._own_generations) > self.log_size:
+                self._own_generations = {g for g in self._own_generations if g > generation - self.log_size}
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+        generation = self.l2.get(GENERATION_KEY, 0)
+        previous = self._generation
+        self._generation = generation
+        if previous is None or generation == previous:
+            return
+        if generation < previous or generation - previous > self.log_size:
+            # L2 was flushed or we fell too far behind: start L1 from scratch
+            with self._lock:
+                self._l1.clear()
+            self._count('invalidations')
+            return
+        with self._lock:
+            missed = [g for g in range(previous + 1, generation + 1) if g not in self._own_generations]
+        if not missed:
+            return
+        log = self.l2.get_many([INVALIDATION_KEY.format(g) for g in missed])
+        with self._lock:
+            if len(log) < len(missed) or CLEAR_ALL in log.values():
+                # Part of the log expired (we can't tell which keys changed)
+                # or another process cleared the cache
+                self._l1.clear()
+            else:
+                for key in log.values():
+                    self._l1.pop(key, None)
+            self._stats['invalidations'] += len(missed)
+
+    # ---- cache API ----
+
+    def get(self, key, default=None, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        self._sync()
+        value = self._l1_get(made_key)
+        if value is not _MISSING:
+            self._count('l1_hits')
+            return value
+        self._count('l1_misses')
+        value = self.l2.get(made_key, _MISSING)
+        if value is _MISSING:
+            self._count('l2_misses')
+            return default
+        self._count('l2_hits')
+        self._l1_set(made_key, value, self.l1_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        timeout = self.get_backend_timeout(timeout)
+        self.l2.set(made_key, value, timeout=timeout)
+        self._publish(made_key)
+        self._l1_set(made_key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        timeout = self.get_backend_timeout(timeout)
+        added = self.l2.add(made_key, value, timeout=timeout)
+        if added:
+            self._publish(made_key)
+            self._l1_set(made_key, value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        return self.l2.touch(made_key, timeout=self.get_backend_timeout(timeout))
+
+    def delete(self, key, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        self._l1_delete(made_key)
+        deleted = self.l2.delete(made_key)
+        self._publish(made_key)
+        return deleted
+
+    def has_key(self, key, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        self._sync()
+        if self._l1_get(made_key) is not _MISSING:
+            return True
+        return self.l2.has_key(made_key)
+
+    def incr(self, key, delta=1, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        self._l1_delete(made_key)
+        value = self.l2.incr(made_key, delta)
+        self._publish(made_key)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        with self._generation_lock():
+            # Keep counting from the current generation so other processes
+            # replay the CLEAR_ALL entry instead of seeing the counter reset
+            floor = self.l2.get(GENERATION_KEY, 0)
+            self.l2.clear()
+            generation = self._next_generation(floor)
+        self._log(generation, CLEAR_ALL)
+
+    def get_backend_timeout(self, timeout=DEFAULT_TIMEOUT):
+        # L2 receives relative timeouts; convert back from Django's absolute ones
+        expires_at = super().get_backend_timeout(timeout)
+        if expires_at is None:
+            return None
+        return max(expires_at - time.time(), 0)
+
+    def stats(self):
+        """Hit/miss counters and hit ratios per tier for this process"""
+        with self._lock:
+            stats = dict(self._stats)
+            l1_entries = len(self._l1)
+        l1_total = stats['l1_hits'] + stats['l1_misses']
+        l2_total = stats['l2_hits'] + stats['l2_misses']
+        stats['l1_hit_ratio'] = round(stats['l1_hits'] / l1_total, 4) if l1_total else 0.0
+        stats['l2_hit_ratio'] = round(stats['l2_hits'] / l2_total, 4) if l2_total else 0.0
+        stats['overall_hit_ratio'] = (
+            round((stats['l1_hits'] + stats['l2_hits']) / l1_total, 4) if l1_total else 0.0
+        )
+        stats['l1_entries'] = l1_entries
+        return stats
+
+
+# ==================== SINGLE-FLIGHT RECOMPUTATION ====================
+
+class _Flight:
+    """An in-process recomputation other threads can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _should_refresh_early(now, expires_at, delta, beta):
+    # XFetch: refresh before expiry with a probability that rises as expiry
+    # nears and with how long the value takes to compute, so hot keys don't
+    # all expire (and recompute) at the same instant.
+    if beta <= 0 or delta <= 0:
+        return False
+    return now - delta * beta * math.log(random.random() or 1e-12) >= expires_at
+
+
+def _lead(key):
+    """Return a new _Flight if this thread should recompute ``key``, else the running one"""
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is not None:
+            return flight, False
+        flight = _flights[key] = _Flight()
+        return flight, True
+
+
+def _land(key, flight):
+    with _flights_lock:
+        _flights.pop(key, None)
+    flight.event.set()
+
+
+def get_or_compute(key, compute, timeout=None, stale_timeout=None, beta=None, cache_alias='default'):
+    """
+    Return the cached value for ``key``, recomputing it at most once at a time.
+
+    - Fresh value: returned as is, except that callers may be picked to
+      refresh it slightly early (probabilistic early expiration).
+    - Stale value (expired less than ``stale_timeout`` seconds ago): one
+      caller recomputes while everyone else keeps getting the stale value.
+    - Nothing cached: one caller per process recomputes and the other threads
+      wait for its result; across processes a lock in the shared cache lets
+      other workers wait briefly for the value instead of hitting the DB too.
+
+    Exceptions raised by ``compute`` propagate and nothing is cached.
+    """
+    cache = caches[cache_alias]
+    timeout = getattr(settings, 'CACHE_FRESH_TIMEOUT', 60) if timeout is None else timeout
+    stale_timeout = getattr(settings, 'CACHE_STALE_TIMEOUT', 30) if stale_timeout is None else stale_timeout
+    beta = getattr(settings, 'CACHE_EARLY_EXPIRY_BETA', 1.0) if beta is None else beta
+    lock_timeout = getattr(settings, 'CACHE_LOCK_TIMEOUT', 10)
+    lock_key = f'{key}:lock'
+
+    def recompute():
+        started = time.time()
+        # From the primary: a lagging replica would be cached for everyone
+        with use_primary():
+            value = compute()
+        delta = time.time() - started
+        cache.set(key, (value, time.time() + timeout, delta), timeout + stale_timeout)
+        return value
+
+    envelope = cache.get(key)
+    if envelope is not None:
+        value, expires_at, delta = envelope
+        now = time.time()
+        if now < expires_at and not _should_refresh_early(now, expires_at, delta, beta):
+            return value
+        # Stale-while-revalidate: only the lock holder recomputes
+        flight, leader = _lead(key)
+        if not leader:
+            return value
+        try:
+            if not cache.add(lock_key, 1, lock_timeout):
+                return value
+            try:
+                flight.value = recompute()
+            finally:
+                cache.delete(lock_key)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            _land(key, flight)
+
+    flight, leader = _lead(key)
+    if not leader:
+        if flight.event.wait(lock_timeout) and flight.error is None:
+            return flight.value
+        return recompute()
+
+    try:
+        if not cache.add(lock_key, 1, lock_timeout):
+            # Another process is computing it; give it a moment
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                envelope = cache.get(key)
+                if envelope is None and not cache.has_key(lock_key):
+                    # The holder finished without caching (its compute
+                    # failed) or its lock expired: stop waiting
+                    envelope = cache.get(key)
+                    if envelope is None:
+                        break
+                if envelope is not None:
+                    flight.value = envelope[0]
+                    return flight.value
+            flight.value = recompute()
+            return flight.value
+        try:
+            flight.value = recompute()
+        finally:
+            cache.delete(lock_key)
+        return flight.value
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        _land(key, flight)
@@ -0,0 +1,165 @@
+import hashlib
+import re
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # Optional: br is only offered when installed
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd is only offered when installed
+    zstandard = None
+
+_ACCEPT_ENCODING_ITEM = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*')
+
+# Attribute a view sets (see cache_compressed) to keep compressed bodies in the cache
+CACHE_KEY_ATTR = 'compression_cache_key'
+
+
+class _Brotli:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def _compressor(encoding, level):
+    """An object with compress(data) and flush(), emitting ``encoding``"""
+    if encoding == 'gzip':
+        return zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 16+15: gzip framing
+    if encoding == 'br':
+        return _Brotli(level)
+    return zstandard.ZstdCompressor(level=level).compressobj()
+
+
+def available_encodings():
+    available = {'gzip': True, 'br': brotli is not None, 'zstd': zstandard is not None}
+    return [encoding for encoding in settings.COMPRESSION_ENCODINGS if available.get(encoding)]
+
+
+def negotiate(accept_encoding):
+    """
+    The first of our available encodings (in COMPRESSION_ENCODINGS order)
+    that the Accept-Encoding header allows, or None.
+    """
+    accepted = {}
+    for item in accept_encoding.split(','):
+        match = _ACCEPT_ENCODING_ITEM.fullmatch(item)
+        if not match:
+            continue
+        try:
+            q = float(match.group(2)) if match.group(2) is not None else 1.0
+        except ValueError:
+            continue
+        accepted[match.group(1).lower()] = q
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    compressor = _compressor(encoding, settings.COMPRESSION_LEVELS[encoding])
+    return compressor.compress(data) + compressor.flush()
+
+
+def cache_compressed(response, key):
+    """
+    Mark ``response`` as the rendering of cache entry ``key``: its compressed
+    bodies are then kept in the cache next to it and reused while the
+    rendered bytes are unchanged.
+    """
+    setattr(response, CACHE_KEY_ATTR, key)
+    return response
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with the best encoding the client accepts.
+
+    Like django.middleware.gzip.GZipMiddleware, but negotiates zstd and
+    brotli (when installed) as well as gzip, with configurable levels.
+    Bodies under COMPRESSION_MIN_SIZE bytes, content types not listed in
+    COMPRESSION_CONTENT_TYPES, responses that already have a
+    Content-Encoding and non-200 responses are left alone. Streaming
+    responses are compressed chunk by chunk.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.should_compress(response):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._compress_async(response.streaming_content, encoding)
+            else:
+                response.streaming_content = self._compress_stream(response.streaming_content, encoding)
+            del response.headers['Content-Length']
+        else:
+            body = self.compressed_body(response, encoding)
+            if len(body) >= len(response.content):
+                return response
+            response.content = body
+            response.headers['Content-Length'] = str(len(body))
+
+        # The compressed body is a different representation: weaken a strong ETag
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def should_compress(self, response):
+        if response.status_code != 200 or response.has_header('Content-Encoding'):
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        return any(content_type.startswith(prefix) for prefix in settings.COMPRESSION_CONTENT_TYPES)
+
+    def compressed_body(self, response, encoding):
+        key = getattr(response, CACHE_KEY_ATTR, None)
+        if key is None:
+            return compress(response.content, encoding)
+        # One cache entry per rendering (JSON, MessagePack...) and encoding
+        renderer = getattr(response, 'accepted_renderer', None)
+        variant_key = f"{key}:{getattr(renderer, 'format', 'json')}:{encoding}"
+        digest = hashlib.blake2b(response.content, digest_size=16).digest()
+        cached = cache.get(variant_key)
+        if cached is not None and cached[0] == digest:
+            return cached[1]
+        body = compress(response.content, encoding)
+        cache.set(variant_key, (digest, body), settings.COMPRESSION_CACHE_TIMEOUT)
+        return body
+
+    def _compress_stream(self, chunks, encoding):
+        compressor = _compressor(encoding, settings.COMPRESSION_LEVELS[encoding])
+        for chunk in chunks:
+            if data := compressor.compress(chunk):
+                yield data
+        yield compressor.flush()
+
+    async def _compress_async(self, chunks, encoding):
+        compressor = _compressor(encoding, settings.COMPRESSION_LEVELS[encoding])
+        async for chunk in chunks:
+            if data := compressor.compress(chunk):
+                yield data
+        yield compressor.flush()
@@ -0,0 +1,110 @@
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+PIN_COOKIE = 'db_primary_until'
+
+# Per-request routing state: a mutable dict so writes made inside
+# sync_to_async / thread-sensitive code still pin the outer request.
+_request_state = contextvars.ContextVar('db_router_request_state', default=None)
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def _pinned():
+    state = _request_state.get()
+    return bool(state and state['pinned'])
+
+
+def _pin():
+    state = _request_state.get()
+    if state is not None:
+        state['pinned'] = True
+        state['wrote'] = True
+
+
+@contextmanager
+def use_primary():
+    """Route every read in this block to the primary (e.g. in management commands)"""
+    state = {'pinned': True, 'wrote': False}
+    token = _request_state.set(state)
+    try:
+        yield
+    finally:
+        _request_state.reset(token)
+
+
+class ReadReplicaRouter:
+    """
+    Send reads of ``core`` models to a replica and everything else to the primary.
+
+    After a write the rest of the request reads from the primary
+    (read-your-writes), and ReplicaStickinessMiddleware extends that to the
+    client's following requests for DATABASE_REPLICA_LAG_TOLERANCE seconds,
+    covering the time a replica may lag behind. Reads inside a transaction
+    on the primary always stay there, so check-then-write sequences see
+    the rows they are about to conflict with.
+    """
+
+    route_app_labels = {'core'}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in self.route_app_labels:
+            return None
+        aliases = replicas()
+        if not aliases or _pinned() or connections['default'].in_atomic_block:
+            return 'default'
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        _pin()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas normally receive schema through replication; allowing it
+        # here lets two local SQLite files be migrated independently.
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """Scope router state to a request and pin recent writers to the primary"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = False
+        if replicas():
+            try:
+                pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+            except ValueError:
+                pinned = False
+        state = {'pinned': pinned, 'wrote': False}
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if state['wrote'] and replicas():
+            tolerance = getattr(settings, 'DATABASE_REPLICA_LAG_TOLERANCE', 2)
+            response.set_cookie(
+                PIN_COOKIE,
+                str(time.time() + tolerance),
+                max_age=max(int(tolerance), 1),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
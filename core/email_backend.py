@@ -1,16 +1,178 @@
+import os
 import ssl
 import smtplib
+import threading
+import time
 from django.core.mail.backends.smtp import EmailBackend
 from django.conf import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+_ssl_context = None
+_ssl_context_lock = threading.Lock()
+
+
+def get_ssl_context():
+    """
+    SSL context that doesn't verify certificates, built once per process
+    instead of on every connection.
+    """
+    global _ssl_context
+    if _ssl_context is None:
+        with _ssl_context_lock:
+            if _ssl_context is None:
+                context = ssl.create_default_context()
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+                _ssl_context = context
+    return _ssl_context
+
+
+class PooledConnection:
+    """An authenticated SMTP session plus the bookkeeping the pool needs"""
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+        self.broken = False
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except (ssl.SSLError, smtplib.SMTPServerDisconnected, OSError):
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+        except smtplib.SMTPException:
+            pass
+
+
+class SMTPConnectionPool:
+    """
+    Process-wide pool of idle, already-authenticated SMTP sessions.
+
+    Sessions are keyed by server and credentials. A session is discarded
+    when it has been idle longer than ``idle_timeout``, has delivered
+    ``max_messages`` messages, or fails a NOOP liveness check.
+    """
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    @property
+    def max_idle(self):
+        return getattr(settings, 'EMAIL_POOL_MAX_IDLE', 4)
+
+    @property
+    def idle_timeout(self):
+        return getattr(settings, 'EMAIL_POOL_IDLE_TIMEOUT', 60)
+
+    @property
+    def max_messages(self):
+        return getattr(settings, 'EMAIL_POOL_MAX_MESSAGES', 100)
+
+    @property
+    def noop_after(self):
+        return getattr(settings, 'EMAIL_POOL_NOOP_AFTER', 1.0)
+
+    def acquire(self, key):
+        """Return a live pooled connection for ``key`` or None"""
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                pooled = idle.pop()
+            idle_for = time.monotonic() - pooled.last_used
+            if idle_for > self.idle_timeout or not self._is_alive(pooled, idle_for):
+                self._discard(pooled)
+                continue
+            self._count('reused')
+            return pooled
+
+    def _is_alive(self, pooled, idle_for):
+        # Sessions handed back moments ago are trusted without a round trip
+        if idle_for < self.noop_after:
+            return True
+        try:
+            return pooled.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def release(self, key, pooled):
+        """Return a connection to the pool, or close it if it is spent"""
+        pooled.last_used = time.monotonic()
+        if pooled.broken or pooled.messages_sent >= self.max_messages:
+            self._discard(pooled)
+            return
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(pooled)
+                return
+        self._discard(pooled)
+
+    def _discard(self, pooled):
+        self._count('discarded')
+        pooled.close()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def forget(self):
+        """
+        Drop every idle connection without closing it. Run in a forked
+        child, whose copies share their sockets with the parent's sessions.
+        """
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def clear(self):
+        """Close every idle connection (e.g. at shutdown)"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for pooled in connections:
+                pooled.close()
+
+    def stats(self):
+        with self._lock:
+            idle = sum(len(connections) for connections in self._idle.values())
+        return {
+            'idle': idle,
+            'created': self.created,
+            'reused': self.reused,
+            'discarded': self.discarded,
+        }
+
+
+connection_pool = SMTPConnectionPool()
+os.register_at_fork(after_in_child=connection_pool.forget)
+
+
 class CustomSMTPEmailBackend(EmailBackend):
     """
     Custom SMTP email backend that handles SSL certificate issues
+    and reuses authenticated connections across messages and threads
     """
-    
+
+    def __init__(self, *args, pool=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = getattr(settings, 'EMAIL_POOL_ENABLED', True) if pool is None else pool
+        self._pooled = None
+
+    @property
+    def pool_key(self):
+        return (self.host, self.port, self.username, self.use_ssl, self.use_tls)
+
     def open(self):
         """
         Ensure an open connection to the email server.
@@ -20,55 +182,95 @@ class CustomSMTPEmailBackend(EmailBackend):
         if self.connection:
             # Nothing to do if the connection is already open.
             return False
-        
+
+        if self.pool:
+            pooled = connection_pool.acquire(self.pool_key)
+            if pooled is not None:
+                self._pooled = pooled
+                self.connection = pooled.smtp
+                return True
+
+        self.connection = self._connect()
+        if self.pool:
+            connection_pool._count('created')
+            self._pooled = PooledConnection(self.connection)
+        return True
+
+    def _connect(self):
+        """Open and authenticate a brand-new SMTP session"""
         try:
-            # Create SSL context that doesn't verify certificates
-            context = ssl.create_default_context()
-            context.check_hostname = False
-            context.verify_mode = ssl.CERT_NONE
-            
+            context = get_ssl_context()
+
             if self.use_ssl:
                 # Use SSL
-                self.connection = smtplib.SMTP_SSL(
-                    self.host, 
-                    self.port, 
+                connection = smtplib.SMTP_SSL(
+                    self.host,
+                    self.port,
                     timeout=self.timeout,
                     context=context
                 )
             elif self.use_tls:
                 # Use TLS
-                self.connection = smtplib.SMTP(
-                    self.host, 
-                    self.port, 
+                connection = smtplib.SMTP(
+                    self.host,
+                    self.port,
                     timeout=self.timeout
                 )
-                self.connection.starttls(context=context)
+                connection.starttls(context=context)
             else:
                 # Plain connection
-                self.connection = smtplib.SMTP(
-                    self.host, 
-                    self.port, 
+                connection = smtplib.SMTP(
+                    self.host,
+                    self.port,
                     timeout=self.timeout
                 )
-            
+
             if self.username and self.password:
-                self.connection.login(self.username, self.password)
-            
-            return True
-            
+                connection.login(self.username, self.password)
+
+            return connection
+
         except Exception as e:
             logger.error(f"Failed to open SMTP connection: {str(e)}")
             # Try fallback connection without SSL/TLS
             try:
                 logger.info("Trying fallback connection without SSL/TLS...")
-                self.connection = smtplib.SMTP(
-                    self.host, 
-                    self.port, 
+                connection = smtplib.SMTP(
+                    self.host,
+                    self.port,
                     timeout=self.timeout
                 )
                 if self.username and self.password:
-                    self.connection.login(self.username, self.password)
-                return True
+                    connection.login(self.username, self.password)
+                return connection
             except Exception as fallback_error:
                 logger.error(f"Fallback connection also failed: {str(fallback_error)}")
                 raise e
+
+    def _send(self, email_message):
+        try:
+            sent = super()._send(email_message)
+        except Exception:
+            # Don't hand a session in an unknown state back to the pool
+            if self._pooled is not None:
+                self._pooled.broken = True
+            raise
+        if self._pooled is not None:
+            if sent:
+                self._pooled.messages_sent += 1
+            elif email_message.recipients():
+                # fail_silently swallowed an SMTP error: the session may be dead
+                self._pooled.broken = True
+        return sent
+
+    def close(self):
+        """Hand the session back to the pool instead of quitting it"""
+        if self.connection is None:
+            return
+        pooled = self._pooled
+        self._pooled = None
+        if pooled is None:
+            super().close()
+            return
+        self.connection = None
+        connection_pool.release(self.pool_key, pooled)
@@ -1,14 +1,22 @@
-from django.core.mail import send_mail
+from django.core.mail import send_mail, get_connection, EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils.html import strip_tags
+from itertools import islice
 import logging
 
+from . import email_templates, outbox
+
 logger = logging.getLogger(__name__)
 
 class EmailService:
     """Service for sending emails"""
     
+    @staticmethod
+    def build_otp_email(otp, user_name=None):
+        """Render the OTP email, returning (subject, plain_message, html_message)"""
+        return email_templates.OTP.render(otp=otp, user_name=user_name)
+    
     @staticmethod
     def send_otp_email(email, otp, user_name=None):
         """
@@ -20,151 +28,7 @@ class EmailService:
             user_name (str, optional): User's name for personalization
         """
         try:
-            # Create email content
-            subject = "Red Curtain - Password Reset OTP"
-            
-            # HTML email template
-            html_message = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="utf-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>Password Reset OTP</title>
-                <style>
-                    body {{
-                        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                        line-height: 1.6;
-                        color: #333;
-                        max-width: 600px;
-                        margin: 0 auto;
-                        padding: 20px;
-                        background-color: #f4f4f4;
-                    }}
-                    .container {{
-                        background-color: #ffffff;
-                        padding: 30px;
-                        border-radius: 10px;
-                        box-shadow: 0 0 20px rgba(0,0,0,0.1);
-                    }}
-                    .header {{
-                        text-align: center;
-                        margin-bottom: 30px;
-                    }}
-                    .logo {{
-                        background: linear-gradient(135deg, #ff6b35, #f7931e);
-                        color: white;
-                        padding: 15px 30px;
-                        border-radius: 25px;
-                        display: inline-block;
-                        font-size: 24px;
-                        font-weight: bold;
-                        margin-bottom: 20px;
-                    }}
-                    .otp-container {{
-                        background-color: #2F0000;
-                        color: white;
-                        padding: 30px;
-                        border-radius: 15px;
-                        text-align: center;
-                        margin: 30px 0;
-                    }}
-                    .otp-code {{
-                        font-size: 36px;
-                        font-weight: bold;
-                        letter-spacing: 8px;
-                        color: #ff6b35;
-                        margin: 20px 0;
-                        font-family: 'Courier New', monospace;
-                    }}
-                    .warning {{
-                        background-color: #fff3cd;
-                        border: 1px solid #ffeaa7;
-                        color: #856404;
-                        padding: 15px;
-                        border-radius: 8px;
-                        margin: 20px 0;
-                    }}
-                    .footer {{
-                        text-align: center;
-                        margin-top: 30px;
-                        color: #666;
-                        font-size: 14px;
-                    }}
-                    .button {{
-                        display: inline-block;
-                        background: linear-gradient(135deg, #ff6b35, #f7931e);
-                        color: white;
-                        padding: 12px 30px;
-                        text-decoration: none;
-                        border-radius: 25px;
-                        font-weight: bold;
-                        margin: 20px 0;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <div class="logo">🎬 Red Curtain</div>
-                        <h1>Password Reset Request</h1>
-                    </div>
-                    
-                    <p>Hello{f' {user_name}' if user_name else ''},</p>
-                    
-                    <p>We received a request to reset your password for your Red Curtain account. Use the OTP code below to verify your identity:</p>
-                    
-                    <div class="otp-container">
-                        <h2>Your Verification Code</h2>
-                        <div class="otp-code">{otp}</div>
-                        <p>This code will expire in 10 minutes</p>
-                    </div>
-                    
-                    <div class="warning">
-                        <strong>⚠️ Security Notice:</strong>
-                        <ul>
-                            <li>This code is valid for 10 minutes only</li>
-                            <li>Never share this code with anyone</li>
-                            <li>If you didn't request this, please ignore this email</li>
-                        </ul>
-                    </div>
-                    
-                    <p>If you're having trouble with the code above, you can also copy and paste it directly into the app.</p>
-                    
-                    <div class="footer">
-                        <p>This email was sent from Red Curtain Movie Polling App</p>
-                        <p>If you have any questions, please contact our support team.</p>
-                        <p>&copy; 2024 Red Curtain. All rights reserved.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            # Plain text version
-            plain_message = f"""
-            Red Curtain - Password Reset OTP
-            
-            Hello{f' {user_name}' if user_name else ''},
-            
-            We received a request to reset your password for your Red Curtain account.
-            
-            Your verification code is: {otp}
-            
-            This code will expire in 10 minutes.
-            
-            Security Notice:
-            - This code is valid for 10 minutes only
-            - Never share this code with anyone
-            - If you didn't request this, please ignore this email
-            
-            If you're having trouble, you can copy and paste the code directly into the app.
-            
-            This email was sent from Red Curtain Movie Polling App
-            If you have any questions, please contact our support team.
-            
-            © 2024 Red Curtain. All rights reserved.
-            """
+            subject, plain_message, html_message = EmailService.build_otp_email(otp, user_name)
             
             # Send email
             send_mail(
@@ -183,6 +47,11 @@ class EmailService:
             logger.error(f"Failed to send OTP email to {email}: {str(e)}")
             return False
     
+    @staticmethod
+    def build_password_reset_confirmation(user_name=None):
+        """Render the reset confirmation email, returning (subject, plain_message, html_message)"""
+        return email_templates.PASSWORD_RESET_CONFIRMATION.render(user_name=user_name)
+    
     @staticmethod
     def send_password_reset_confirmation(email, user_name=None):
         """
@@ -193,104 +62,7 @@ class EmailService:
             user_name (str, optional): User's name for personalization
         """
         try:
-            subject = "Red Curtain - Password Reset Successful"
-            
-            html_message = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="utf-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>Password Reset Successful</title>
-                <style>
-                    body {{
-                        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                        line-height: 1.6;
-                        color: #333;
-                        max-width: 600px;
-                        margin: 0 auto;
-                        padding: 20px;
-                        background-color: #f4f4f4;
-                    }}
-                    .container {{
-                        background-color: #ffffff;
-                        padding: 30px;
-                        border-radius: 10px;
-                        box-shadow: 0 0 20px rgba(0,0,0,0.1);
-                    }}
-                    .header {{
-                        text-align: center;
-                        margin-bottom: 30px;
-                    }}
-                    .logo {{
-                        background: linear-gradient(135deg, #ff6b35, #f7931e);
-                        color: white;
-                        padding: 15px 30px;
-                        border-radius: 25px;
-                        display: inline-block;
-                        font-size: 24px;
-                        font-weight: bold;
-                        margin-bottom: 20px;
-                    }}
-                    .success {{
-                        background-color: #d4edda;
-                        border: 1px solid #c3e6cb;
-                        color: #155724;
-                        padding: 20px;
-                        border-radius: 8px;
-                        text-align: center;
-                        margin: 20px 0;
-                    }}
-                    .footer {{
-                        text-align: center;
-                        margin-top: 30px;
-                        color: #666;
-                        font-size: 14px;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <div class="logo">🎬 Red Curtain</div>
-                        <h1>Password Reset Successful</h1>
-                    </div>
-                    
-                    <p>Hello{f' {user_name}' if user_name else ''},</p>
-                    
-                    <div class="success">
-                        <h2>✅ Your password has been successfully reset!</h2>
-                        <p>You can now log in to your Red Curtain account using your new password.</p>
-                    </div>
-                    
-                    <p>If you didn't make this change, please contact our support team immediately.</p>
-                    
-                    <div class="footer">
-                        <p>This email was sent from Red Curtain Movie Polling App</p>
-                        <p>If you have any questions, please contact our support team.</p>
-                        <p>&copy; 2024 Red Curtain. All rights reserved.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            plain_message = f"""
-            Red Curtain - Password Reset Successful
-            
-            Hello{f' {user_name}' if user_name else ''},
-            
-            Your password has been successfully reset!
-            
-            You can now log in to your Red Curtain account using your new password.
-            
-            If you didn't make this change, please contact our support team immediately.
-            
-            This email was sent from Red Curtain Movie Polling App
-            If you have any questions, please contact our support team.
-            
-            © 2024 Red Curtain. All rights reserved.
-            """
+            subject, plain_message, html_message = EmailService.build_password_reset_confirmation(user_name)
             
             send_mail(
                 subject=subject,
@@ -307,3 +79,159 @@ class EmailService:
         except Exception as e:
             logger.error(f"Failed to send password reset confirmation email to {email}: {str(e)}")
             return False
+    
+    @staticmethod
+    def queue_otp_email(email, otp, user_name=None):
+        """
+        Queue the OTP email in the outbox instead of sending it inline
+        
+        Returns:
+            bool: True if the email was queued
+        """
+        try:
+            subject, plain_message, html_message = EmailService.build_otp_email(otp, user_name)
+            outbox.enqueue(email, subject, plain_message, html_message)
+            logger.info(f"OTP email queued for {email}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to queue OTP email to {email}: {str(e)}")
+            return False
+    
+    @staticmethod
+    def queue_password_reset_confirmation(email, user_name=None):
+        """
+        Queue the password reset confirmation email in the outbox
+        
+        Returns:
+            bool: True if the email was queued
+        """
+        try:
+            subject, plain_message, html_message = EmailService.build_password_reset_confirmation(user_name)
+            outbox.enqueue(email, subject, plain_message, html_message)
+            logger.info(f"Password reset confirmation email queued for {email}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to queue password reset confirmation email to {email}: {str(e)}")
+            return False
+    
+    @staticmethod
+    def send_bulk(template, recipients, chunk_size=500, connection=None):
+        """
+        Mail-merge one template to many recipients
+        
+        Recipients are consumed lazily and rendered chunk_size at a time, and
+        each chunk is handed to the backend as one batch over one connection,
+        so memory stays bounded however many recipients there are. A
+        recipient whose message fails to render is logged and skipped. When
+        a batch fails, the connection is reopened and that chunk is retried
+        one message at a time, so only the failing recipients are skipped;
+        messages the server accepted before the failure may go out twice.
+        If the connection cannot be reopened the run stops and logs how far
+        it got.
+        
+        Args:
+            template (EmailTemplate): Compiled template from core.email_templates
+            recipients (iterable): (email, context dict) pairs
+            chunk_size (int): Messages rendered and handed to the backend at once
+            connection: Optional email backend instance to reuse
+        
+        Returns:
+            int: Number of messages the backend reported as sent
+        """
+        connection = connection or get_connection(fail_silently=False)
+        recipients = iter(recipients)
+        sent = failed = 0
+        connection.open()
+        try:
+            while True:
+                chunk = list(islice(recipients, chunk_size))
+                if not chunk:
+                    break
+                messages = []
+                for email, context in chunk:
+                    try:
+                        subject, plain_message, html_message = template.render(**context)
+                    except Exception as e:
+                        logger.error(f"Failed to render '{template.name}' email for {email}: {str(e)}")
+                        failed += 1
+                        continue
+                    message = EmailMultiAlternatives(
+                        subject=subject,
+                        body=plain_message,
+                        from_email=settings.DEFAULT_FROM_EMAIL,
+                        to=[email],
+                        connection=connection,
+                    )
+                    message.attach_alternative(html_message, 'text/html')
+                    messages.append(message)
+                if not messages:
+                    continue
+                try:
+                    sent += connection.send_messages(messages) or 0
+                    continue
+                except Exception as e:
+                    logger.warning(
+                        f"Batch of {len(messages)} '{template.name}' emails failed, retrying one by one: {str(e)}"
+                    )
+                reconnect = True
+                for i, message in enumerate(messages):
+                    # The session may be dead after a failure; retry on a fresh one
+                    if reconnect and not EmailService._reopen(connection):
+                        failed += len(messages) - i
+                        logger.error(
+                            f"Stopped bulk '{template.name}' email: cannot reconnect. "
+                            f"Sent {sent}, failed {failed}, remaining recipients not attempted"
+                        )
+                        return sent
+                    try:
+                        sent += connection.send_messages([message]) or 0
+                        reconnect = False
+                    except Exception as e:
+                        logger.error(f"Failed to send '{template.name}' email to {message.to[0]}: {str(e)}")
+                        failed += 1
+                        reconnect = True
+        finally:
+            connection.close()
+        
+        logger.info(f"Bulk '{template.name}' email sent to {sent} recipients, {failed} failed")
+        return sent
+    
+    @staticmethod
+    def _reopen(connection):
+        """Replace the connection's session; False if the server cannot be reached"""
+        try:
+            connection.close()
+            connection.open()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to reopen the email connection: {str(e)}")
+            return False
+    
+    @staticmethod
+    def send_poll_closed_announcement(poll, chunk_size=500):
+        """
+        Announce a closed poll's result to everyone who voted on it
+        
+        Voters are streamed from the database, so the poll_votes table is
+        never loaded into memory.
+        """
+        from .models import Vote
+        
+        votes = poll.votes or {}
+        winner = max(votes, key=votes.get) if votes else ''
+        poll_context = {
+            'question': poll.question,
+            'winner': winner,
+            'winner_votes': votes.get(winner, 0),
+            'total_votes': poll.total_votes,
+        }
+        voters = (
+            Vote.objects.filter(poll=poll)
+            .values_list('user__email', 'user__first_name', 'user__last_name')
+            .iterator(chunk_size=chunk_size)
+        )
+        recipients = (
+            (email, dict(poll_context, user_name=f"{first or ''} {last or ''}".strip() or None))
+            for email, first, last in voters
+        )
+        return EmailService.send_bulk(email_templates.POLL_CLOSED, recipients, chunk_size=chunk_size)
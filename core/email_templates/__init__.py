@@ -0,0 +1,53 @@
+"""
+Email templates compiled once at import time.
+
+Template files use ``${name}`` slots (so CSS braces need no escaping). Each
+file is split into literal chunks and slot names up front; rendering a
+message only fills the slots and joins the pieces.
+"""
+import re
+from html import escape
+from pathlib import Path
+
+TEMPLATE_DIR = Path(__file__).resolve().parent
+SLOT_PATTERN = re.compile(r'\$\{(\w+)\}')
+
+
+class CompiledTemplate:
+    """A template pre-split into literal parts and slot names"""
+
+    def __init__(self, source, autoescape=False):
+        pieces = SLOT_PATTERN.split(source)
+        self.literals = pieces[0::2]
+        self.slots = pieces[1::2]
+        self.autoescape = autoescape
+
+    def render(self, context):
+        literals = self.literals
+        parts = [literals[0]]
+        for i, slot in enumerate(self.slots):
+            value = str(context[slot])
+            parts.append(escape(value) if self.autoescape else value)
+            parts.append(literals[i + 1])
+        return ''.join(parts)
+
+
+class EmailTemplate:
+    """Subject, plain-text and HTML bodies for one kind of email"""
+
+    def __init__(self, name, subject):
+        self.name = name
+        self.subject = CompiledTemplate(subject)
+        self.text = CompiledTemplate((TEMPLATE_DIR / f'{name}.txt').read_text(encoding='utf-8'))
+        self.html = CompiledTemplate((TEMPLATE_DIR / f'{name}.html').read_text(encoding='utf-8'), autoescape=True)
+
+    def render(self, **context):
+        """Return (subject, plain_message, html_message)"""
+        user_name = context.pop('user_name', None)
+        context.setdefault('greeting_name', f' {user_name}' if user_name else '')
+        return self.subject.render(context), self.text.render(context), self.html.render(context)
+
+
+OTP = EmailTemplate('otp', 'Red Curtain - Password Reset OTP')
+PASSWORD_RESET_CONFIRMATION = EmailTemplate('password_reset_confirmation', 'Red Curtain - Password Reset Successful')
+POLL_CLOSED = EmailTemplate('poll_closed', 'Red Curtain - Poll Closed: ${question}')
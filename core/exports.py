@@ -0,0 +1,256 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Poll, Vote
+from .renderers import orjson
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional: only needed for Parquet exports
+    pyarrow = None
+
+
+class ExportError(ValueError):
+    """Invalid export parameters"""
+
+
+def _total_votes(votes):
+    return sum(votes.values()) if votes else 0
+
+
+class Dataset:
+    """
+    One exportable table: ``columns`` come from ``fields`` of ``model`` rows
+    read in primary key order; ``rows`` turns a chunk of value tuples into
+    output rows whose first column is the resume key.
+    """
+
+    def __init__(self, name, model, fields, columns, types, date_field, category_field):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        self.columns = columns
+        self.types = types
+        self.date_field = date_field
+        self.category_field = category_field
+
+    def queryset(self, category=None, since=None, until=None):
+        queryset = self.model.objects.all()
+        if category:
+            queryset = queryset.filter(**{self.category_field: category})
+        if since:
+            queryset = queryset.filter(**{f'{self.date_field}__gte': since})
+        if until:
+            queryset = queryset.filter(**{f'{self.date_field}__lt': until})
+        return queryset
+
+    def rows(self, values):
+        return values
+
+
+class TalliesDataset(Dataset):
+    """Per-option vote counts, one row per (poll, option), from Poll.votes"""
+
+    def rows(self, values):
+        return [
+            (poll_id, category, option, (votes or {}).get(option, 0))
+            for poll_id, category, options, votes in values
+            for option in options
+        ]
+
+
+class VotesDataset(Dataset):
+    """Individual votes; the voter is left out for anonymous polls"""
+
+    def rows(self, values):
+        return [
+            (vote_id, poll_id, None if anonymous else user_id, option, timestamp)
+            for vote_id, poll_id, user_id, anonymous, option, timestamp in values
+        ]
+
+
+class PollsDataset(Dataset):
+    def rows(self, values):
+        return [row[:-1] + (_total_votes(row[-1]),) for row in values]
+
+
+DATASETS = {
+    'polls': PollsDataset(
+        'polls', Poll,
+        fields=['id', 'question', 'category', 'visibility', 'is_active', 'is_anonymous',
+                'created_by_id', 'created_at', 'votes'],
+        columns=['id', 'question', 'category', 'visibility', 'is_active', 'is_anonymous',
+                 'created_by_id', 'created_at', 'total_votes'],
+        types=['int64', 'string', 'string', 'string', 'bool', 'bool', 'int64', 'timestamp', 'int64'],
+        date_field='created_at', category_field='category',
+    ),
+    'tallies': TalliesDataset(
+        'tallies', Poll,
+        fields=['id', 'category', 'options', 'votes'],
+        columns=['poll_id', 'category', 'option', 'votes'],
+        types=['int64', 'string', 'string', 'int64'],
+        date_field='created_at', category_field='category',
+    ),
+    'votes': VotesDataset(
+        'votes', Vote,
+        fields=['id', 'poll_id', 'user_id', 'poll__is_anonymous', 'option', 'timestamp'],
+        columns=['id', 'poll_id', 'user_id', 'option', 'timestamp'],
+        types=['int64', 'int64', 'int64', 'string', 'timestamp'],
+        date_field='timestamp', category_field='poll__category',
+    ),
+}
+
+
+def parse_bound(value, name):
+    """A date (midnight, current time zone) or datetime filter bound"""
+    if not value:
+        return None
+    try:
+        # Both return None for a wrong format and raise for a wrong value (month 13)
+        parsed = parse_datetime(value)
+        day = None if parsed is not None else parse_date(value)
+    except ValueError:
+        parsed = day = None
+    if parsed is None:
+        if day is None:
+            raise ExportError(f'{name} must be a date (YYYY-MM-DD) or ISO datetime')
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _cell(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class CSVFormat:
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def _encode(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+    def header(self):
+        return self._encode([self.columns])
+
+    def chunk(self, rows):
+        return self._encode([[_cell(v) for v in row] for row in rows])
+
+
+class JSONLFormat:
+    content_type = 'application/x-ndjson'
+    extension = 'jsonl'
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def header(self):
+        return b''
+
+    def chunk(self, rows):
+        if orjson is not None:
+            return b''.join(orjson.dumps(dict(zip(self.columns, row))) + b'\n' for row in rows)
+        return ''.join(
+            json.dumps(dict(zip(self.columns, map(_cell, row))), ensure_ascii=False) + '\n' for row in rows
+        ).encode()
+
+
+FORMATS = {'csv': CSVFormat, 'jsonl': JSONLFormat}
+
+
+class PollExport:
+    """
+    Stream a dataset in primary key order, ``chunk_size`` rows per query.
+
+    Each chunk is a keyset query (``pk > last``), so neither the database
+    nor this process holds more than one chunk, however large poll_votes
+    is, and an interrupted export resumes with ``after`` set to the last key
+    it wrote. The date range applies to poll creation for polls and tallies
+    and to the vote time for votes.
+    """
+
+    def __init__(self, dataset, category=None, since=None, until=None, after=None, chunk_size=5000):
+        if dataset not in DATASETS:
+            raise ExportError(f"Unknown dataset {dataset!r}; choose from {', '.join(DATASETS)}")
+        self.dataset = DATASETS[dataset]
+        self.category = category
+        self.since = parse_bound(since, 'since') if isinstance(since, str) else since
+        self.until = parse_bound(until, 'until') if isinstance(until, str) else until
+        self.after = after
+        self.chunk_size = chunk_size
+
+    @property
+    def columns(self):
+        return self.dataset.columns
+
+    def chunks(self):
+        """Yield ``(last_key, rows)`` per chunk"""
+        values = (
+            self.dataset.queryset(self.category, self.since, self.until)
+            .order_by('pk')
+            .values_list(*self.dataset.fields)
+        )
+        last = self.after
+        while True:
+            batch = list((values if last is None else values.filter(pk__gt=last))[:self.chunk_size])
+            if not batch:
+                return
+            last = batch[-1][0]
+            yield last, self.dataset.rows(batch)
+            if len(batch) < self.chunk_size:
+                return
+
+    def stream(self, fmt, header=True):
+        """Encoded bytes in ``fmt`` (csv or jsonl), chunk by chunk"""
+        if fmt not in FORMATS:
+            raise ExportError(f"Unknown format {fmt!r}; choose from {', '.join(FORMATS)}")
+        encoder = FORMATS[fmt](self.columns)
+
+        def pieces():
+            if header:
+                yield encoder.header()
+            for _, rows in self.chunks():
+                yield encoder.chunk(rows)
+
+        return pieces()
+
+
+class ParquetWriter:
+    """Writes chunks of rows as row groups of one Parquet file (needs pyarrow)"""
+
+    def __init__(self, path, dataset):
+        if pyarrow is None:
+            raise ExportError('Parquet export needs pyarrow (pip install pyarrow)')
+        dataset = DATASETS[dataset] if isinstance(dataset, str) else dataset
+        types = {
+            'int64': pyarrow.int64(),
+            'string': pyarrow.string(),
+            'bool': pyarrow.bool_(),
+            'timestamp': pyarrow.timestamp('us', tz='UTC'),
+        }
+        self.columns = dataset.columns
+        self.schema = pyarrow.schema([(c, types[t]) for c, t in zip(dataset.columns, dataset.types)])
+        self.writer = pyarrow.parquet.ParquetWriter(os.fspath(path), self.schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows)) if rows else [()] * len(self.columns)
+        self.writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        ))
+
+    def close(self):
+        self.writer.close()
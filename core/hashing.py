@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHashingBusy(APIException):
+    """Raised when the hashing queue is full; surfaces as 503 so clients back off"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Server is busy, please retry shortly.'
+    default_code = 'password_hashing_busy'
+
+
+class PasswordHashingPool:
+    """
+    Bounded worker pool for PBKDF2 hashing and verification.
+
+    hashlib releases the GIL while deriving keys, so a thread pool gives real
+    CPU parallelism while capping how many hashes run at once. At most
+    ``max_workers + max_queue`` jobs may be admitted; callers beyond that wait
+    up to ``queue_timeout`` seconds for a slot and then get
+    ``PasswordHashingBusy`` instead of piling onto the CPU.
+    """
+
+    def __init__(self, max_workers=None, max_queue=None, queue_timeout=None):
+        self.max_workers = max_workers or getattr(settings, 'PASSWORD_HASHING_WORKERS', None) or os.cpu_count() or 2
+        self.max_queue = max_queue if max_queue is not None else getattr(settings, 'PASSWORD_HASHING_MAX_QUEUE', 64)
+        self.queue_timeout = queue_timeout if queue_timeout is not None else getattr(settings, 'PASSWORD_HASHING_QUEUE_TIMEOUT', 2.0)
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._started = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+
+    def _get_executor(self):
+        # Created lazily and re-created after fork so pre-forked workers
+        # never inherit a dead pool from the master process.
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix='password-hashing'
+                    )
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, enqueued_at, args):
+        started_at = time.monotonic()
+        waited = started_at - enqueued_at
+        with self._lock:
+            self._started += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._completed += 1
+                self._run_total += time.monotonic() - started_at
+
+    def submit(self, fn, *args):
+        """Admit a hashing job or raise PasswordHashingBusy; returns a Future"""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._reject()
+        return self._start(fn, args)
+
+    async def asubmit(self, fn, *args):
+        """
+        Awaitable ``submit``. Waiting for a slot happens on a helper thread,
+        so a saturated pool never blocks the event loop.
+        """
+        if not self._slots.acquire(blocking=False):
+            acquiring = asyncio.get_running_loop().run_in_executor(
+                None, self._slots.acquire, True, self.queue_timeout
+            )
+            try:
+                acquired = await asyncio.shield(acquiring)
+            except asyncio.CancelledError:
+                # Hand back the slot if the abandoned wait still gets one
+                acquiring.add_done_callback(lambda f: f.result() and self._slots.release())
+                raise
+            if not acquired:
+                self._reject()
+        return await asyncio.wrap_future(self._start(fn, args))
+
+    def _reject(self):
+        with self._lock:
+            self._rejected += 1
+        logger.warning("Password hashing pool saturated, rejecting request")
+        raise PasswordHashingBusy()
+
+    def _start(self, fn, args):
+        # The caller holds a slot; it is released when the job finishes
+        with self._lock:
+            self._submitted += 1
+        try:
+            future = self._get_executor().submit(self._run, fn, time.monotonic(), args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def stats(self):
+        """Snapshot of queue depth and timing counters"""
+        with self._lock:
+            in_flight = self._started - self._completed
+            return {
+                'workers': self.max_workers,
+                'maxQueue': self.max_queue,
+                'queueDepth': self._submitted - self._started,
+                'inFlight': in_flight,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'avgWaitMs': round(self._wait_total / self._started * 1000, 3) if self._started else 0.0,
+                'maxWaitMs': round(self._wait_max * 1000, 3),
+                'avgRunMs': round(self._run_total / self._completed * 1000, 3) if self._completed else 0.0,
+            }
+
+
+password_pool = PasswordHashingPool()
+
+
+def make_password(raw_password):
+    """Hash a password on the pool (blocks the caller until done)"""
+    return password_pool.submit(hashers.make_password, raw_password).result()
+
+
+def check_password(user, raw_password):
+    """
+    Pooled equivalent of ``user.check_password``.
+
+    Outdated hashes are upgraded like Django does, with the re-hash also
+    running on the pool and only the password column written back.
+    """
+    encoded = user.password
+    valid = password_pool.submit(hashers.check_password, raw_password, encoded).result()
+    if valid and hashers.is_password_usable(encoded):
+        try:
+            must_update = hashers.identify_hasher(encoded).must_update(encoded)
+        except ValueError:
+            must_update = False
+        if must_update:
+            set_password(user, raw_password)
+            user.save(update_fields=['password'])
+    return valid
+
+
+def set_password(user, raw_password):
+    """Pooled equivalent of ``user.set_password``; the caller still saves"""
+    user.password = make_password(raw_password)
+    user._password = raw_password
+
+
+def create_user(password, **fields):
+    """
+    Drop-in for ``User.objects.create_user`` that hashes on the pool and
+    inserts the row with a single save.
+    """
+    from .models import User
+    fields['email'] = User.objects.normalize_email(fields.get('email'))
+    fields['username'] = User.normalize_username(fields['username'])
+    return User.objects.create(password=make_password(password), **fields)
+
+
+async def amake_password(raw_password):
+    """Awaitable variant for async (ASGI) views"""
+    return await password_pool.asubmit(hashers.make_password, raw_password)
+
+
+async def acheck_password(user, raw_password):
+    """Awaitable variant for async (ASGI) views; does not upgrade old hashes"""
+    return await password_pool.asubmit(hashers.check_password, raw_password, user.password)
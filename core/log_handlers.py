@@ -0,0 +1,129 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import weakref
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, suitable for log shippers"""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        # Structured fields passed as logger.info(..., extra={'data': {...}})
+        if isinstance(getattr(record, 'data', None), dict):
+            entry['data'] = record.data
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of low-level records from noisy loggers.
+
+    Records at or below ``max_level`` whose logger name starts with
+    ``prefix`` pass with probability ``rate``; everything else passes.
+    """
+
+    def __init__(self, prefix='core', rate=0.1, max_level='DEBUG'):
+        super().__init__()
+        self.prefix = prefix
+        self.rate = rate
+        self.max_level = logging.getLevelName(max_level) if isinstance(max_level, str) else max_level
+
+    def filter(self, record):
+        if record.levelno > self.max_level or not record.name.startswith(self.prefix):
+            return True
+        return random.random() < self.rate
+
+
+# Live QueueListenerHandlers, restarted in forked children
+_queue_handlers = weakref.WeakSet()
+
+
+def _restart_listeners():
+    for handler in list(_queue_handlers):
+        handler.restart()
+
+
+os.register_at_fork(after_in_child=_restart_listeners)
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Non-blocking handler: request threads only enqueue records and a
+    background QueueListener writes them to the real ``handlers``.
+
+    ``handlers`` are the target handlers; in LOGGING declare this handler
+    with ``'()'`` and refer to other handlers of the same config as
+    ``'cfg://handlers.<name>'``. When the
+    queue is full, records are dropped and counted rather than blocking
+    the caller. A forked child (e.g. a gunicorn --preload worker) gets a
+    fresh queue and listener, since the parent's thread does not survive
+    the fork.
+    """
+
+    def __init__(self, handlers, queue_size=10000):
+        # Index rather than iterate: dictConfig resolves 'cfg://' items on access
+        targets = [handlers[i] for i in range(len(handlers))]
+        for target in targets:
+            if not isinstance(target, logging.Handler):
+                # dictConfig defers and retries handlers that raise this
+                raise ValueError(f'target not configured yet: {target!r}')
+        super().__init__(queue.Queue(queue_size))
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, *targets, respect_handler_level=True)
+        self.listener.start()
+        _queue_handlers.add(self)
+        atexit.register(self.stop)
+
+    def restart(self):
+        """Start a new queue and listener thread (after fork)"""
+        self.queue = queue.Queue(self.queue_size)
+        self.listener = QueueListener(self.queue, *self.listener.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def prepare(self, record):
+        # Like QueueHandler.prepare, but keep the traceback in exc_text instead
+        # of folding it into the message, so formatters can still place it.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Flush everything still queued (runs at interpreter exit)"""
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        _queue_handlers.discard(self)
+        self.stop()
+        super().close()
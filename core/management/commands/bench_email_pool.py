@@ -0,0 +1,118 @@
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.mail import EmailMessage
+from django.core.management.base import BaseCommand
+from core.email_backend import CustomSMTPEmailBackend, connection_pool
+
+
+class StandInSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail; ``connect_delay`` mimics TCP+TLS+AUTH cost"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        time.sleep(self.server.connect_delay)
+        self.reply('220 standin ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.decode('ascii', 'replace').strip().split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.wfile.write(b'250-standin\r\n250 8BITMIME\r\n')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                self.server.count_message()
+                self.reply('250 OK queued')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class StandInSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_delay):
+        super().__init__(('127.0.0.1', 0), StandInSMTPHandler)
+        self.connect_delay = connect_delay
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    def count_message(self):
+        with self._lock:
+            self.messages += 1
+
+
+class Command(BaseCommand):
+    help = 'Benchmark CustomSMTPEmailBackend with and without connection pooling against a local SMTP stand-in'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200, help='Messages sent per run')
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent senders')
+        parser.add_argument(
+            '--connect-delay',
+            type=float,
+            default=0.02,
+            help='Seconds the stand-in waits before greeting, simulating the TLS/AUTH handshake'
+        )
+
+    def run(self, port, pooled, messages, threads):
+        def send_one(i):
+            # One backend per message, exactly like send_mail() does
+            backend = CustomSMTPEmailBackend(
+                host='127.0.0.1', port=port, username='', password='',
+                use_tls=False, use_ssl=False, timeout=10, pool=pooled,
+            )
+            EmailMessage(
+                subject=f'Benchmark {i}',
+                body='Red Curtain benchmark message',
+                from_email='bench@example.com',
+                to=['user@example.com'],
+                connection=backend,
+            ).send()
+
+        connection_pool.clear()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(send_one, range(messages)))
+        elapsed = time.perf_counter() - started
+        stats = connection_pool.stats()
+        connection_pool.clear()
+        return elapsed, stats
+
+    def handle(self, *args, **options):
+        server = StandInSMTPServer(options['connect_delay'])
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        port = server.server_address[1]
+        messages = options['messages']
+        threads = options['threads']
+
+        self.stdout.write(
+            f'SMTP stand-in on port {port}: {messages} messages, {threads} threads, '
+            f'{options["connect_delay"] * 1000:.0f}ms handshake'
+        )
+        try:
+            results = {}
+            for label, pooled in (('without pooling', False), ('with pooling', True)):
+                elapsed, stats = self.run(port, pooled, messages, threads)
+                results[label] = messages / elapsed
+                line = f'{label:>16}: {messages / elapsed:8.1f} msg/s ({elapsed:.2f}s)'
+                if pooled:
+                    line += f'  connections created={stats["created"]} reused={stats["reused"]}'
+                self.stdout.write(line)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        speedup = results['with pooling'] / results['without pooling']
+        self.stdout.write(self.style.SUCCESS(f'Pooling speedup: {speedup:.1f}x'))
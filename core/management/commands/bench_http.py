@@ -0,0 +1,379 @@
+import asyncio
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from core.seeding import SEED_EMAIL_DOMAIN, SEED_PASSWORD
+from core.slow_queries import percentile
+
+# Benchmarks run against a throwaway database and cache, never the dev ones
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TwoTierCache',
+        'OPTIONS': {'L2': 'shared'},
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench-http',
+    },
+}
+
+
+class Routes:
+    """Request factories for the benchmarked routes; ``i`` makes each request reproducible"""
+
+    def __init__(self, user_ids, poll_options, seed, voted):
+        self.user_ids = user_ids
+        self.poll_options = poll_options
+        self.poll_ids = list(poll_options)
+        self.seed = seed
+        # Each (voter, poll) pair votes once across all runs so votes succeed
+        self.ballots = (
+            (user, poll) for poll in itertools.cycle(self.poll_ids) for user in user_ids
+            if (user, poll) not in voted
+        )
+        self.ballots_lock = threading.Lock()
+
+    def rng(self, i):
+        return random.Random(self.seed * 1_000_003 + i)
+
+    def polls(self, i):
+        return 'GET', '/api/polls/', None
+
+    def poll(self, i):
+        return 'GET', f'/api/polls/{self.rng(i).choice(self.poll_ids)}/', None
+
+    def vote(self, i):
+        with self.ballots_lock:
+            voter, poll = next(self.ballots)
+        body = {'option': self.rng(i).choice(self.poll_options[poll]), 'voterUserId': voter}
+        return 'POST', f'/api/polls/{poll}/vote/', body
+
+    def login(self, i):
+        user = self.rng(i).randrange(len(self.user_ids))
+        email = f'user{user}.{self.seed}@{SEED_EMAIL_DOMAIN}'
+        return 'POST', '/api/auth/login/', {'email': email, 'password': SEED_PASSWORD}
+
+    def user(self, i):
+        return 'GET', f'/api/users/{self.rng(i).choice(self.user_ids)}/', None
+
+    def categories(self, i):
+        return 'GET', '/api/polls/categories/', None
+
+    names = ['polls', 'poll', 'vote', 'login', 'user', 'categories']
+
+
+def wsgi_environ(method, path, body):
+    payload = json.dumps(body).encode() if body is not None else b''
+    return {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'REMOTE_ADDR': '127.0.0.1',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(payload)),
+        'wsgi.input': io.BytesIO(payload),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def run_wsgi(application, factory, requests, concurrency):
+    """``concurrency`` threads calling the WSGI app directly, as a threaded server would"""
+    indices = iter(range(requests))
+    lock = threading.Lock()
+    latencies, statuses = [], []
+
+    def worker():
+        while True:
+            with lock:
+                i = next(indices, None)
+            if i is None:
+                break
+            status = []
+            started = time.perf_counter()
+            result = application(wsgi_environ(*factory(i)), lambda s, headers, exc_info=None: status.append(s))
+            try:
+                for _ in result:
+                    pass
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+            latencies.append(time.perf_counter() - started)
+            statuses.append(int(status[0].split()[0]))
+        connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, statuses
+
+
+async def asgi_request(application, method, path, body):
+    payload = json.dumps(body).encode() if body is not None else b''
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [
+            (b'host', b'localhost'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(payload)).encode()),
+        ],
+        'client': ('127.0.0.1', 50000),
+        'server': ('localhost', 80),
+    }
+    done = asyncio.Event()
+    sent_body = False
+    status = []
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {'type': 'http.request', 'body': payload, 'more_body': False}
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            done.set()
+
+    await application(scope, receive, send)
+    done.set()
+    return status[0]
+
+
+def run_asgi(application, factory, requests, concurrency):
+    """``concurrency`` coroutines on one event loop, as an ASGI server would"""
+    latencies, statuses = [], []
+
+    async def main():
+        indices = iter(range(requests))
+
+        async def worker():
+            for i in indices:
+                started = time.perf_counter()
+                statuses.append(await asgi_request(application, *factory(i)))
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(main())
+    return elapsed, latencies, statuses
+
+
+@contextmanager
+def test_database_name(name):
+    """Point the test database of 'default' at ``name`` for this block only"""
+    settings_dict = connections['default'].settings_dict
+    original = settings_dict.get('TEST', {})
+    settings_dict['TEST'] = {**original, 'NAME': name}
+    try:
+        yield
+    finally:
+        settings_dict['TEST'] = original
+
+
+def summarize(elapsed, latencies, statuses):
+    errors = sum(1 for s in statuses if s >= 400)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def change(before, after):
+    """Relative change in percent"""
+    return (after / before - 1) * 100 if before else 0.0
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway database and benchmark the main /api routes through the WSGI and ASGI apps'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per route and interface')
+        parser.add_argument(
+            '--login-requests', type=int, default=50,
+            help='Requests for auth/login/, which is bound by password hashing'
+        )
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per route first')
+        parser.add_argument('--users', type=int, default=1000, help='Seeded users')
+        parser.add_argument('--polls', type=int, default=200, help='Seeded polls')
+        parser.add_argument('--votes', type=int, default=20000, help='Seeded votes')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for data and requests')
+        parser.add_argument(
+            '--routes', nargs='+', choices=Routes.names, default=Routes.names, help='Routes to run'
+        )
+        parser.add_argument(
+            '--interfaces', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'],
+            help='Application interfaces to drive'
+        )
+        parser.add_argument(
+            '--output',
+            help='Results file (default: bench_results/http-<commit>.json)'
+        )
+        parser.add_argument('--compare', help='Earlier results file to print changes against')
+
+    def validate(self, options):
+        pairs = options['users'] * options['polls']
+        if options['votes'] > pairs:
+            raise CommandError(
+                f"--votes {options['votes']} needs more than --users {options['users']} x --polls {options['polls']}"
+            )
+        if 'vote' in options['routes']:
+            # Every benchmarked vote needs a (user, poll) pair that has not voted yet
+            needed = (options['warmup'] + options['requests']) * len(options['interfaces'])
+            if pairs - options['votes'] < needed:
+                raise CommandError(
+                    f"The vote route needs {needed} unused (user, poll) pairs; "
+                    f"lower --votes or raise --users/--polls"
+                )
+
+    def handle(self, *args, **options):
+        self.validate(options)
+        commit = git_commit()
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'bench_results', f"http-{commit or 'local'}.json"
+        )
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # A file database (not in-memory) so concurrent writers behave as in production
+            with test_database_name(os.path.join(tmp, 'bench.sqlite3')), override_settings(
+                DEBUG=False, CACHES=BENCH_CACHES, METRICS_DIR=os.path.join(tmp, 'metrics')
+            ):
+                old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+                try:
+                    results = self.run_benchmarks(options)
+                finally:
+                    connections.close_all()
+                    teardown_databases(old_config, verbosity=0)
+
+        report = {
+            'meta': {
+                'commit': commit,
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'database': settings.DATABASES['default']['ENGINE'],
+                'config': {
+                    key: options[key] for key in (
+                        'requests', 'login_requests', 'concurrency', 'warmup', 'users', 'polls', 'votes', 'seed'
+                    )
+                },
+            },
+            'results': results,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def compare(self, path, results):
+        with open(path) as f:
+            baseline = json.load(f)
+        self.stdout.write(f"Compared with {baseline['meta'].get('commit') or path}:")
+        for interface, routes in results.items():
+            for name, summary in routes.items():
+                before = baseline['results'].get(interface, {}).get(name)
+                if not before:
+                    continue
+                throughput = change(before['throughput_rps'], summary['throughput_rps'])
+                p95 = change(before['p95_ms'], summary['p95_ms'])
+                self.stdout.write(
+                    f'{interface:>4} {name:<10} throughput {throughput:+7.1f}%  p95 {p95:+7.1f}%'
+                )
+
+    def run_benchmarks(self, options):
+        from django.core.asgi import get_asgi_application
+        from django.core.wsgi import get_wsgi_application
+
+        from core.models import Poll, User, Vote
+        from core.seeding import SeedGenerator
+
+        SeedGenerator(options['users'], options['polls'], options['votes'], seed=options['seed']).run()
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        poll_options = dict(Poll.objects.order_by('id').values_list('id', 'options'))
+        voted = set(Vote.objects.values_list('user_id', 'poll_id'))
+        routes = Routes(user_ids, poll_options, options['seed'], voted)
+        runners = {
+            'wsgi': (run_wsgi, get_wsgi_application()),
+            'asgi': (run_asgi, get_asgi_application()),
+        }
+
+        results = {}
+        for interface in options['interfaces']:
+            run, application = runners[interface]
+            results[interface] = {}
+            for name in options['routes']:
+                factory = getattr(routes, name)
+                requests = options['login_requests'] if name == 'login' else options['requests']
+                if options['warmup']:
+                    run(application, factory, min(options['warmup'], requests), options['concurrency'])
+                summary = summarize(*run(application, factory, requests, options['concurrency']))
+                results[interface][name] = summary
+                self.stdout.write(
+                    f"{interface:>4} {name:<10} {summary['throughput_rps']:>8.1f} req/s  "
+                    f"p50 {summary['p50_ms']:>8.2f}ms  p95 {summary['p95_ms']:>8.2f}ms  "
+                    f"p99 {summary['p99_ms']:>8.2f}ms  errors {summary['errors']}/{summary['requests']}"
+                )
+        return results
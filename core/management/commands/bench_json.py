@@ -0,0 +1,110 @@
+import io
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Poll, User
+from core.parsers import CBORParser, MessagePackParser, ORJSONParser
+from core.renderers import CBORRenderer, MessagePackRenderer, ORJSONRenderer, orjson
+from core.seeding import CATEGORIES, MOVIES
+from core.serializers import PollResponseSerializer, UserSerializer
+
+
+def best_of(repeat, fn):
+    """Fastest of ``repeat`` runs, in seconds, and the last result"""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark JSON encoding and decoding of poll and user lists: stock DRF vs orjson, '
+        'and the size and speed of MessagePack and CBOR against JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--polls', type=int, default=10_000, help='Polls in the list')
+        parser.add_argument('--users', type=int, default=10_000, help='Users in the list')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement; the best is reported')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the generated rows')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson is not installed; ORJSONRenderer would just use JSONRenderer')
+        payloads = self.payloads(options['polls'], options['users'], options['seed'])
+        for name, data in payloads.items():
+            self.compare(name, data, options['repeat'])
+            self.compare_binary(name, data, options['repeat'])
+
+    def payloads(self, polls, users, seed):
+        """Serialized like the list views, from unsaved instances so no database is needed"""
+        rng = random.Random(seed)
+        now = timezone.now()
+        people = [
+            User(
+                id=i, username=f'user{i}@example.com', email=f'user{i}@example.com',
+                first_name=f'Zoë{i}', last_name=f'Seed', loyalty_points=rng.randrange(2000),
+                date_joined=now - timedelta(days=rng.randrange(365)),
+            )
+            for i in range(1, max(users, 1) + 1)
+        ]
+        poll_list = []
+        for i in range(1, polls + 1):
+            options = rng.sample(MOVIES, rng.randint(2, 5))
+            poll_list.append(Poll(
+                id=i,
+                question=f'Which one should we watch on night #{i}?',
+                options=options,
+                votes={option: rng.randrange(500) for option in options},
+                category=rng.choice(CATEGORIES),
+                created_by=rng.choice(people),
+                created_at=now - timedelta(seconds=rng.randrange(10 ** 7)),
+            ))
+        return {
+            f'{polls} polls': PollResponseSerializer(poll_list, many=True).data,
+            f'{users} users': UserSerializer(people[:users], many=True).data,
+        }
+
+    def compare(self, name, data, repeat):
+        stock_encode, stock_bytes = best_of(repeat, lambda: JSONRenderer().render(data))
+        fast_encode, fast_bytes = best_of(repeat, lambda: ORJSONRenderer().render(data))
+        if stock_bytes != fast_bytes:
+            raise CommandError(f'{name}: ORJSONRenderer output differs from JSONRenderer')
+        stock_decode, stock_data = best_of(repeat, lambda: JSONParser().parse(io.BytesIO(stock_bytes)))
+        fast_decode, fast_data = best_of(repeat, lambda: ORJSONParser().parse(io.BytesIO(stock_bytes)))
+        if stock_data != fast_data:
+            raise CommandError(f'{name}: ORJSONParser result differs from JSONParser')
+
+        self.stdout.write(f'{name} ({len(stock_bytes) / 1024:.0f} KiB, identical bytes)')
+        for step, stock, fast in [('encode', stock_encode, fast_encode), ('decode', stock_decode, fast_decode)]:
+            self.stdout.write(
+                f'  {step}  stock {stock * 1000:8.2f}ms  orjson {fast * 1000:8.2f}ms  {stock / fast:5.1f}x faster'
+            )
+
+    def compare_binary(self, name, data, repeat):
+        """Size and speed of the binary formats relative to orjson-rendered JSON"""
+        json_encode, json_bytes = best_of(repeat, lambda: ORJSONRenderer().render(data))
+        json_decode, _ = best_of(repeat, lambda: ORJSONParser().parse(io.BytesIO(json_bytes)))
+        for renderer, parser in [(MessagePackRenderer, MessagePackParser), (CBORRenderer, CBORParser)]:
+            if not renderer.available:
+                self.stdout.write(f'  {renderer.format:<8} not installed')
+                continue
+            encode, body = best_of(repeat, lambda: renderer().render(data))
+            decode, decoded = best_of(repeat, lambda: parser().parse(io.BytesIO(body)))
+            if decoded != orjson.loads(json_bytes):
+                raise CommandError(f'{name}: {renderer.format} round trip differs from JSON')
+            self.stdout.write(
+                f'  {renderer.format:<8} {len(body) / 1024:6.0f} KiB ({len(body) / len(json_bytes):4.0%} of JSON)'
+                f'  encode {encode * 1000:8.2f}ms ({encode / json_encode:4.1f}x JSON)'
+                f'  decode {decode * 1000:8.2f}ms ({decode / json_decode:4.1f}x JSON)'
+            )
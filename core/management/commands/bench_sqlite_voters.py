@@ -0,0 +1,149 @@
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SCHEMA = [
+    'CREATE TABLE polls (id INTEGER PRIMARY KEY, votes TEXT NOT NULL)',
+    'CREATE TABLE poll_votes ('
+    ' id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, poll_id INTEGER NOT NULL,'
+    ' option TEXT NOT NULL, timestamp TEXT NOT NULL, UNIQUE (user_id, poll_id))',
+]
+OPTIONS = ['A', 'B', 'C', 'D']
+
+
+def default_profile():
+    """What the project ran with before: rollback journal, deferred transactions, reconnect per request"""
+    return {'pragmas': [], 'begin': 'BEGIN', 'timeout': 5.0, 'persistent': False}
+
+
+def tuned_profile():
+    """The profile configured in settings.DATABASES['default']"""
+    options = settings.DATABASES['default'].get('OPTIONS', {})
+    pragmas = [p.strip() for p in options.get('init_command', '').split(';') if p.strip()]
+    mode = options.get('transaction_mode')
+    return {
+        'pragmas': pragmas,
+        'begin': f'BEGIN {mode}' if mode else 'BEGIN',
+        'timeout': options.get('timeout', 5.0),
+        'persistent': bool(settings.DATABASES['default'].get('CONN_MAX_AGE')),
+    }
+
+
+def connect(path, profile):
+    conn = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None)
+    for pragma in profile['pragmas']:
+        conn.execute(pragma)
+    return conn
+
+
+def cast_vote(conn, profile, user_id, poll_id, option):
+    """Mirror of vote_on_poll: duplicate check, insert vote, bump the JSON tally"""
+    conn.execute(profile['begin'])
+    try:
+        exists = conn.execute(
+            'SELECT 1 FROM poll_votes WHERE user_id = ? AND poll_id = ?', (user_id, poll_id)
+        ).fetchone()
+        if not exists:
+            votes = json.loads(conn.execute('SELECT votes FROM polls WHERE id = ?', (poll_id,)).fetchone()[0])
+            conn.execute(
+                'INSERT INTO poll_votes (user_id, poll_id, option, timestamp) VALUES (?, ?, ?, datetime())',
+                (user_id, poll_id, option)
+            )
+            votes[option] = votes.get(option, 0) + 1
+            conn.execute('UPDATE polls SET votes = ? WHERE id = ?', (json.dumps(votes), poll_id))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def voter(args):
+    path, profile, worker_id, votes, polls, reads_per_vote = args
+    rng = random.Random(worker_id)
+    ok = locked = 0
+    latencies = []
+    conn = connect(path, profile) if profile['persistent'] else None
+    for i in range(votes):
+        started = time.perf_counter()
+        c = conn or connect(path, profile)
+        try:
+            for _ in range(reads_per_vote):
+                c.execute('SELECT votes FROM polls WHERE id = ?', (rng.randint(1, polls),)).fetchone()
+            cast_vote(c, profile, worker_id * votes + i, rng.randint(1, polls), rng.choice(OPTIONS))
+            ok += 1
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            locked += 1
+        finally:
+            if conn is None:
+                c.close()
+        latencies.append(time.perf_counter() - started)
+    if conn is not None:
+        conn.close()
+    return ok, locked, latencies
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent voters against SQLite with the default and the tuned connection profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help='Concurrent voter processes')
+        parser.add_argument('--votes', type=int, default=200, help='Votes cast per process')
+        parser.add_argument('--polls', type=int, default=50, help='Polls voters spread across')
+        parser.add_argument('--reads', type=int, default=5, help='Poll reads issued before each vote')
+
+    def run_profile(self, name, profile, options):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.sqlite3')
+            setup = connect(path, profile)
+            for statement in SCHEMA:
+                setup.execute(statement)
+            setup.executemany(
+                'INSERT INTO polls (id, votes) VALUES (?, ?)',
+                [(i, json.dumps({o: 0 for o in OPTIONS})) for i in range(1, options['polls'] + 1)]
+            )
+            setup.close()
+
+            jobs = [
+                (path, profile, worker_id, options['votes'], options['polls'], options['reads'])
+                for worker_id in range(options['processes'])
+            ]
+            started = time.perf_counter()
+            with multiprocessing.get_context('spawn').Pool(options['processes']) as pool:
+                results = pool.map(voter, jobs)
+            elapsed = time.perf_counter() - started
+
+            check = sqlite3.connect(path)
+            stored = check.execute('SELECT COUNT(*) FROM poll_votes').fetchone()[0]
+            tallied = sum(sum(json.loads(v).values()) for (v,) in check.execute('SELECT votes FROM polls'))
+            check.close()
+
+        ok = sum(r[0] for r in results)
+        locked = sum(r[1] for r in results)
+        latencies = sorted(l for r in results for l in r[2])
+        attempts = ok + locked
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0.0
+        # A run can end with no attempts, e.g. when every worker failed to start
+        throughput = ok / elapsed if elapsed else 0.0
+        locked_percent = locked / attempts * 100 if attempts else 0.0
+        self.stdout.write(
+            f'{name:>8}: {throughput:8.1f} votes/s  lock errors {locked}/{attempts} '
+            f'({locked_percent:5.1f}%)  p95 {p95:7.1f}ms  '
+            f'rows={stored} tallies={tallied}'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['processes']} processes x {options['votes']} votes over "
+            f"{options['polls']} polls ({options['reads']} reads per vote)"
+        )
+        self.run_profile('default', default_profile(), options)
+        self.run_profile('tuned', tuned_profile(), options)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.email_service import EmailService
+from core.models import Poll
+
+
+class Command(BaseCommand):
+    help = 'Deactivate polls whose end time (duration) has passed and mail the result to their voters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-email', action='store_true', help='Close polls without announcing them')
+
+    def handle(self, *args, **options):
+        due = Poll.objects.filter(is_active=True, duration__lte=timezone.now()).values_list('id', flat=True)
+        closed = mailed = 0
+        for poll_id in list(due):
+            with transaction.atomic():
+                # Locked and re-checked so concurrent runs close (and announce) each poll once
+                poll = Poll.objects.select_for_update().filter(id=poll_id, is_active=True).first()
+                if poll is None:
+                    continue
+                poll.is_active = False
+                poll.save(update_fields=['is_active', 'updated_at'])
+            closed += 1
+            if not options['no_email']:
+                mailed += EmailService.send_poll_closed_announcement(poll)
+        self.stdout.write(self.style.SUCCESS(f'Closed {closed} polls, announced to {mailed} voters'))
@@ -0,0 +1,136 @@
+import json
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import DATASETS, FORMATS, ExportError, ParquetWriter, PollExport
+
+
+def checkpoint_path(path):
+    return f'{path}.checkpoint'
+
+
+def save_checkpoint(path, state):
+    # Written aside and renamed so a crash never leaves half a checkpoint
+    tmp = checkpoint_path(path) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, checkpoint_path(path))
+
+
+class Command(BaseCommand):
+    help = 'Export polls, per-option tallies or individual votes to CSV, JSON Lines or Parquet, in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS), help='What to export')
+        parser.add_argument('--output', '-o', default='-', help="File to write, or '-' for stdout (default)")
+        parser.add_argument(
+            '--format', choices=[*FORMATS, 'parquet'],
+            help='Output format (default: from the --output extension, else csv)'
+        )
+        parser.add_argument('--category', help='Only polls in this category')
+        parser.add_argument('--since', help='From this date/datetime (poll creation; vote time for votes)')
+        parser.add_argument('--until', help='Before this date/datetime')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per query and write')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Continue an interrupted CSV/JSONL export into --output from its checkpoint'
+        )
+
+    def handle(self, *args, **options):
+        path = options['output']
+        fmt = options['format'] or self.format_for(path)
+        filters = {key: options[key] for key in ('category', 'since', 'until')}
+        if path == '-' and (fmt == 'parquet' or options['resume']):
+            raise CommandError('Parquet output and --resume need an --output file')
+        if fmt == 'parquet' and options['resume']:
+            raise CommandError('Parquet exports cannot be resumed; start again')
+
+        state = {'dataset': options['dataset'], 'format': fmt, 'filters': filters, 'after': None, 'offset': 0}
+        if options['resume']:
+            state = self.load_checkpoint(path, state)
+
+        try:
+            export = PollExport(
+                options['dataset'], after=state['after'], chunk_size=options['chunk_size'], **filters
+            )
+            started = time.perf_counter()
+            if fmt == 'parquet':
+                rows = self.write_parquet(export, path)
+            else:
+                rows = self.write_text(export, fmt, path, state)
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        log = self.stderr if path == '-' else self.stdout
+        log.write(self.style.SUCCESS(
+            f"Exported {rows} {options['dataset']} rows as {fmt} in {time.perf_counter() - started:.1f}s"
+            + ('' if path == '-' else f' to {path}')
+        ))
+
+    def format_for(self, path):
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        return extension if extension in (*FORMATS, 'parquet') else 'csv'
+
+    def load_checkpoint(self, path, expected):
+        try:
+            with open(checkpoint_path(path)) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            raise CommandError(f'No checkpoint for {path}; nothing to resume')
+        for key in ('dataset', 'format', 'filters'):
+            if state[key] != expected[key]:
+                raise CommandError(f'{path} was started with {key}={state[key]!r}; resume with the same options')
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = -1
+        if size < state['offset']:
+            # Resuming would pad the missing part with zero bytes
+            raise CommandError(
+                f'{path} is missing or shorter than its checkpoint; delete {checkpoint_path(path)} and start again'
+            )
+        return state
+
+    def write_text(self, export, fmt, path, state):
+        """Write chunk by chunk, checkpointing after each so --resume can continue"""
+        encoder = FORMATS[fmt](export.columns)
+        if path == '-':
+            out = sys.stdout.buffer
+            out.write(encoder.header())
+            rows = 0
+            for _, chunk in export.chunks():
+                out.write(encoder.chunk(chunk))
+                rows += len(chunk)
+            out.flush()
+            return rows
+
+        resuming = state['after'] is not None or state['offset']
+        with open(path, 'r+b' if resuming else 'wb') as out:
+            # Drop whatever was written after the last checkpoint
+            out.truncate(state['offset'])
+            out.seek(state['offset'])
+            if not resuming:
+                out.write(encoder.header())
+            rows = 0
+            for last, chunk in export.chunks():
+                out.write(encoder.chunk(chunk))
+                out.flush()
+                rows += len(chunk)
+                save_checkpoint(path, dict(state, after=last, offset=out.tell()))
+        if os.path.exists(checkpoint_path(path)):
+            os.remove(checkpoint_path(path))
+        return rows
+
+    def write_parquet(self, export, path):
+        writer = ParquetWriter(path, export.dataset)
+        rows = 0
+        try:
+            for _, chunk in export.chunks():
+                writer.write(chunk)
+                rows += len(chunk)
+        finally:
+            writer.close()
+        return rows
@@ -0,0 +1,60 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.user_import import UserImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import users from CSV or JSON Lines (email, password or passwordHash, '
+        'firstName, lastName, phoneNumber), hashing passwords across processes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows validated and inserted together')
+        parser.add_argument('--workers', type=int, help='Password hashing processes (default: CPU count)')
+        parser.add_argument(
+            '--rejects',
+            help="JSON Lines file receiving rejected rows and reasons (default: <path>.rejects.jsonl)"
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Validate and deduplicate only; write nothing')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or (detect_format(path) if path != '-' else None)
+        if fmt is None:
+            raise CommandError('Cannot tell the input format; pass --format csv or --format jsonl')
+        rejects_path = options['rejects'] or (
+            f'{path}.rejects.jsonl' if path != '-' else 'import_users.rejects.jsonl'
+        )
+
+        source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        try:
+            with open(rejects_path, 'w', encoding='utf-8') as rejects:
+                def on_reject(line, row, reason):
+                    if row:
+                        row = {k: '***' if k in ('password', 'passwordHash') else v for k, v in row.items()}
+                    rejects.write(json.dumps({'line': line, 'reason': reason, 'row': row}, default=str) + '\n')
+
+                importer = UserImporter(
+                    batch_size=options['batch_size'],
+                    workers=options['workers'],
+                    dry_run=options['dry_run'],
+                    on_reject=on_reject,
+                )
+                result = importer.run(read_rows(source, fmt))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        verb = 'would be created' if options['dry_run'] else 'created'
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {result['read']} rows in {result['seconds']}s: {result['created']} users {verb}, "
+            f"{result['rejected']} rejected"
+        ))
+        if result['rejected']:
+            self.stdout.write(f'Rejected rows written to {rejects_path}')
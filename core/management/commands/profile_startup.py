@@ -0,0 +1,71 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.startup import profile_startup
+
+
+class Command(BaseCommand):
+    help = 'Cold-start the WSGI/ASGI entry point in a fresh interpreter and report import costs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--entry-point', default='moviepoll.wsgi', help='Module to import (e.g. moviepoll.asgi)'
+        )
+        parser.add_argument(
+            '--no-urls', action='store_true',
+            help='Skip building the URLconf (otherwise loaded by the first request)'
+        )
+        parser.add_argument('--top', type=int, default=25, help='Modules to list')
+        parser.add_argument(
+            '--sort', choices=['cumulative', 'self'], default='cumulative', help='Order modules by this time'
+        )
+        parser.add_argument('--prefix', help='Only list modules starting with this (e.g. core.)')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Fail if over STARTUP_IMPORT_BUDGET_MS or if a STARTUP_LAZY_MODULES module was loaded'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            profile = profile_startup(options['entry_point'], load_urls=not options['no_urls'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        top = profile.top(options['top'], key=f"{options['sort']}_us", prefix=options['prefix'])
+        eager = [m for m in settings.STARTUP_LAZY_MODULES if profile.loaded(m)]
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'entry_point': profile.entry_point,
+                'seconds': round(profile.seconds, 4),
+                'import_ms': round(profile.import_us / 1000, 1),
+                'modules_loaded': len(profile.modules),
+                'eager_lazy_modules': eager,
+                'top': [
+                    {'module': r.module, 'self_ms': r.self_us / 1000, 'cumulative_ms': r.cumulative_us / 1000}
+                    for r in top
+                ],
+            }, indent=2))
+        else:
+            self.stdout.write(f"{'cumulative ms':>14} {'self ms':>9}  module")
+            for r in top:
+                self.stdout.write(
+                    f'{r.cumulative_us / 1000:>14.1f} {r.self_us / 1000:>9.1f}  {"  " * r.depth}{r.module}'
+                )
+            self.stdout.write(
+                f'{profile.entry_point}: {profile.import_us / 1000:.1f}ms importing '
+                f'{len(profile.modules)} modules, {profile.seconds * 1000:.1f}ms wall clock'
+            )
+
+        if options['check']:
+            budget = settings.STARTUP_IMPORT_BUDGET_MS
+            problems = []
+            if profile.import_us / 1000 > budget:
+                problems.append(f'import time {profile.import_us / 1000:.1f}ms exceeds {budget}ms')
+            if eager:
+                problems.append(f"loaded at startup but meant to be lazy: {', '.join(eager)}")
+            if problems:
+                raise CommandError('; '.join(problems))
+            self.stdout.write(self.style.SUCCESS('Within the startup budget'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from core.token_blacklist import token_blacklist
+
+class Command(BaseCommand):
+    help = 'Delete expired entries from the token blacklist in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows deleted per statement'
+        )
+
+    def handle(self, *args, **options):
+        deleted = token_blacklist.purge_expired(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Purged {deleted} expired blacklisted tokens')
+        )
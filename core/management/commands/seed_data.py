@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Poll, User, UserProfile, Vote
+from core.seeding import SEED_EMAIL_DOMAIN, SEED_PASSWORD, SeedGenerator
+
+
+class Command(BaseCommand):
+    help = 'Generate deterministic, realistically skewed users, polls and votes with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000, help='Users to create')
+        parser.add_argument('--polls', type=int, default=10_000, help='Polls to create')
+        parser.add_argument('--votes', type=int, default=1_000_000, help='Votes to create')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; same seed, same data')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Objects per bulk_create call')
+        parser.add_argument('--days', type=int, default=365, help='Spread creation dates over this many days')
+        parser.add_argument(
+            '--popularity-skew', type=float, default=1.1,
+            help='Zipf exponent for votes per poll (higher: fewer polls get most votes)'
+        )
+        parser.add_argument(
+            '--category-skew', type=float, default=1.0,
+            help='Zipf exponent for polls per category'
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help=f'First delete all previously seeded data (users @{SEED_EMAIL_DOMAIN})'
+        )
+
+    def clear(self):
+        seeded = User.objects.filter(email__endswith=f'@{SEED_EMAIL_DOMAIN}')
+        with transaction.atomic():
+            votes = Vote.objects.filter(poll__created_by__in=seeded).delete()[0]
+            votes += Vote.objects.filter(user__in=seeded).delete()[0]
+            polls = Poll.objects.filter(created_by__in=seeded).delete()[0]
+            UserProfile.objects.filter(user__in=seeded).delete()
+            users = seeded.delete()[0]
+        self.stdout.write(f'Cleared {users} users, {polls} polls and {votes} votes')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.clear()
+        elif User.objects.filter(email__endswith=f".{options['seed']}@{SEED_EMAIL_DOMAIN}").exists():
+            raise CommandError(f"Data for seed {options['seed']} already exists; use --clear or another --seed")
+
+        started = time.perf_counter()
+        generator = SeedGenerator(
+            users=options['users'],
+            polls=options['polls'],
+            votes=options['votes'],
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            days=options['days'],
+            popularity_skew=options['popularity_skew'],
+            category_skew=options['category_skew'],
+            log=lambda message: self.stdout.write(f'  {message} ({time.perf_counter() - started:.1f}s)'),
+        )
+        try:
+            generator.run()
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded in {time.perf_counter() - started:.1f}s; every user\'s password is "{SEED_PASSWORD}"'
+        ))
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.outbox import deliver_batch, purge_finished
+
+class Command(BaseCommand):
+    help = (
+        'Deliver queued emails from the outbox in batches, with retries and backoff, '
+        'and delete finished ones past EMAIL_OUTBOX_RETENTION_DAYS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Emails sent per SMTP connection (default: EMAIL_OUTBOX_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling the outbox instead of exiting once it is drained'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep between polls when the outbox is empty'
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        purged_at = None
+        try:
+            while True:
+                sent, failed = deliver_batch(batch_size=options['batch_size'])
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f'Batch: {sent} sent, {failed} failed')
+                    continue
+                # Retention cleanup while idle, at most every few minutes
+                if purged_at is None or time.monotonic() - purged_at >= 300:
+                    purge_finished()
+                    purged_at = time.monotonic()
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Outbox run finished: {total_sent} sent, {total_failed} failed')
+        )
@@ -0,0 +1,82 @@
+import glob
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.slow_queries import percentile
+
+
+class Command(BaseCommand):
+    help = 'Aggregate slow queries from the JSON log (all workers, rotated files included) by statement'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log-file',
+            default=settings.LOG_FILE_HANDLER['filename'],
+            help='JSON log file written by core.log_handlers.JSONFormatter'
+        )
+        parser.add_argument('--top', type=int, default=20, help='Statements to show, by total time')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def read_entries(self, log_file):
+        for path in sorted(glob.glob(f'{log_file}*')):
+            with open(path, encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    if '"core.slow_queries"' not in line:
+                        continue
+                    try:
+                        data = json.loads(line).get('data')
+                    except ValueError:
+                        continue
+                    if data:
+                        yield data
+
+    def handle(self, *args, **options):
+        statements = {}
+        for data in self.read_entries(options['log_file']):
+            entry = statements.setdefault(data['statement'], {
+                'durations': [], 'views': set(), 'params': set(), 'plan': None,
+            })
+            entry['durations'].append(data['duration_ms'])
+            if data.get('view'):
+                entry['views'].add(data['view'])
+            if data.get('params_fingerprint'):
+                entry['params'].add(data['params_fingerprint'])
+            entry['plan'] = data.get('plan') or entry['plan']
+
+        rows = sorted(
+            (
+                {
+                    'statement': statement,
+                    'count': len(entry['durations']),
+                    'total_ms': round(sum(entry['durations']), 2),
+                    'p95_ms': round(percentile(entry['durations'], 0.95), 2),
+                    'max_ms': round(max(entry['durations']), 2),
+                    'distinct_params': len(entry['params']),
+                    'views': sorted(entry['views']),
+                    'plan': entry['plan'],
+                }
+                for statement, entry in statements.items()
+            ),
+            key=lambda row: row['total_ms'],
+            reverse=True,
+        )[:options['top']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+        if not rows:
+            self.stdout.write('No slow queries logged')
+            return
+        for row in rows:
+            self.stdout.write(self.style.WARNING(
+                f"{row['count']:>6}x  p95 {row['p95_ms']:>9.1f}ms  max {row['max_ms']:>9.1f}ms  "
+                f"total {row['total_ms']:>10.1f}ms  params {row['distinct_params']}"
+            ))
+            self.stdout.write(f"  {row['statement']}")
+            if row['views']:
+                self.stdout.write(f"  views: {', '.join(row['views'])}")
+            for line in row['plan'] or []:
+                self.stdout.write(f'    {line}')
+            self.stdout.write('')
@@ -0,0 +1,23 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.warmup import Warmup
+
+
+class Command(BaseCommand):
+    help = 'Preload URLs and serializers and prime the catalogue, top poll and auth caches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-polls', type=int, default=100, help='Most voted polls to cache')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        warmup = Warmup(top_polls=options['top_polls'])
+        report = warmup.run()
+        if options['json']:
+            self.stdout.write(json.dumps({'seconds': warmup.seconds, 'steps': report}, indent=2))
+            return
+        for step in report:
+            self.stdout.write(f"{step['step']:<12} {step['seconds'] * 1000:>9.1f}ms  {step['primed']} primed")
+        self.stdout.write(self.style.SUCCESS(f'Warmed up in {warmup.seconds * 1000:.1f}ms'))
@@ -0,0 +1,358 @@
+import atexit
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.core.files import locks
+from django.http import HttpResponse, HttpResponseForbidden
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RETIRED_SNAPSHOT = 'retired.json'  # Counters folded in from workers that exited
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None) or os.path.join(tempfile.gettempdir(), 'moviepoll-metrics')
+
+
+class ProcessMetrics:
+    """
+    In-memory metrics for this worker process.
+
+    Recording a request is a handful of dict updates under one lock. A
+    background thread writes a snapshot to ``<METRICS_DIR>/<pid>.json``
+    every METRICS_FLUSH_INTERVAL seconds (and once more at exit) so the
+    /metrics view of any worker can aggregate all of them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+        self.reset()
+        atexit.register(self.flush_at_exit)
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}  # (route, method, status) -> count
+            self.durations = {}  # route -> [count, sum, bucket counts...]
+            self.db_queries = {}  # route -> [queries, seconds]
+            self.response_bytes = {}  # route -> bytes
+            self.in_flight = 0
+            self._pid = os.getpid()
+
+    def started(self):
+        self.start_flusher()
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, route, method, status, duration, queries, query_time, size):
+        with self._lock:
+            key = (route, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.durations.get(route)
+            if histogram is None:
+                histogram = self.durations[route] = [0, 0.0] + [0] * (len(DURATION_BUCKETS) + 1)
+            histogram[0] += 1
+            histogram[1] += duration
+            histogram[2 + bisect_left(DURATION_BUCKETS, duration)] += 1
+            db = self.db_queries.get(route)
+            if db is None:
+                db = self.db_queries[route] = [0, 0.0]
+            db[0] += queries
+            db[1] += query_time
+            self.response_bytes[route] = self.response_bytes.get(route, 0) + size
+            self.in_flight -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'requests': [[*key, count] for key, count in self.requests.items()],
+                'durations': {route: list(h) for route, h in self.durations.items()},
+                'db_queries': {route: list(db) for route, db in self.db_queries.items()},
+                'response_bytes': dict(self.response_bytes),
+                'in_flight': self.in_flight,
+                'gauges': process_gauges(),
+            }
+
+    def start_flusher(self):
+        """Start the snapshot thread of this process unless it is running"""
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        with self._lock:
+            if self._flusher_pid == pid:
+                return
+            # Set before starting: a forked child sees the parent's pid and
+            # starts its own thread, since the parent's did not survive
+            self._flusher_pid = pid
+        threading.Thread(target=self._flush_periodically, name='metrics-flusher', daemon=True).start()
+
+    def _flush_periodically(self):
+        pid = os.getpid()
+        while self._flusher_pid == pid:
+            time.sleep(getattr(settings, 'METRICS_FLUSH_INTERVAL', 5))
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def flush_at_exit(self):
+        if self._flusher_pid == os.getpid():
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def flush(self):
+        if self._pid != os.getpid():
+            # Forked child: don't report the parent's numbers as our own
+            self.reset()
+        directory = metrics_dir()
+        os.makedirs(directory, exist_ok=True)
+        _write_snapshot(os.path.join(directory, f'{os.getpid()}.json'), self.snapshot())
+
+
+process_metrics = ProcessMetrics()
+
+
+def process_gauges():
+    """Current values from other subsystems of this process; names ending in _total are counters"""
+    from .hashing import password_pool
+    stats = password_pool.stats()
+    return {
+        'password_hashing_queue_depth': stats['queueDepth'],
+        'password_hashing_in_flight': stats['inFlight'],
+        'password_hashing_rejected_total': stats['rejected'],
+    }
+
+
+class _QueryCounter:
+    """connection.execute_wrapper hook counting queries and their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Record latency, status, DB work and response size per resolved URL name"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        process_metrics.started()
+        started = time.perf_counter()
+        status = 500
+        response = None
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(counter))
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            duration = time.perf_counter() - started
+            match = getattr(request, 'resolver_match', None)
+            route = (match.url_name or match.view_name) if match else 'unresolved'
+            size = 0
+            if response is not None and not getattr(response, 'streaming', False):
+                size = len(response.content)
+            process_metrics.finished(
+                route, request.method, status, duration, counter.count, counter.seconds, size
+            )
+
+
+# ==================== AGGREGATION & EXPOSITION ====================
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(path, snapshot):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def _empty():
+    return {'requests': {}, 'durations': {}, 'db_queries': {}, 'response_bytes': {}, 'in_flight': 0, 'gauges': {}}
+
+
+def _merge_counters(merged, snapshot):
+    for route, method, status, count in snapshot['requests']:
+        key = (route, method, status)
+        merged['requests'][key] = merged['requests'].get(key, 0) + count
+    for route, histogram in snapshot['durations'].items():
+        current = merged['durations'].setdefault(route, [0] * len(histogram))
+        merged['durations'][route] = [a + b for a, b in zip(current, histogram)]
+    for route, db in snapshot['db_queries'].items():
+        current = merged['db_queries'].setdefault(route, [0, 0.0])
+        merged['db_queries'][route] = [current[0] + db[0], current[1] + db[1]]
+    for route, size in snapshot['response_bytes'].items():
+        merged['response_bytes'][route] = merged['response_bytes'].get(route, 0) + size
+
+
+def _retire(directory, name):
+    """Fold a dead worker's counters into RETIRED_SNAPSHOT and delete its file"""
+    with open(os.path.join(directory, 'retire.lock'), 'a') as lock:
+        locks.lock(lock, locks.LOCK_EX)
+        try:
+            path = os.path.join(directory, name)
+            snapshot = _read_snapshot(path)
+            if snapshot is None:
+                # Another worker retired it first
+                return
+            retired_path = os.path.join(directory, RETIRED_SNAPSHOT)
+            retired = _empty()
+            for counters in (_read_snapshot(retired_path), snapshot):
+                if counters is not None:
+                    _merge_counters(retired, counters)
+            retired['requests'] = [[*key, count] for key, count in retired['requests'].items()]
+            _write_snapshot(retired_path, retired)
+            os.remove(path)
+        finally:
+            locks.unlock(lock)
+
+
+def aggregate():
+    """
+    Merge the snapshots of every worker that has written one.
+
+    Snapshots of workers that have exited are folded into RETIRED_SNAPSHOT
+    and removed, so counters stay cumulative without the directory growing
+    with every restart.
+    """
+    process_metrics.flush()
+    merged = _empty()
+    directory = metrics_dir()
+    for name in os.listdir(directory):
+        pid = name[:-len('.json')]
+        if name.endswith('.json') and pid.isdigit() and not _pid_alive(int(pid)):
+            _retire(directory, name)
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        snapshot = _read_snapshot(os.path.join(directory, name))
+        if snapshot is None:
+            continue
+        _merge_counters(merged, snapshot)
+        if name != RETIRED_SNAPSHOT:
+            merged['in_flight'] += snapshot['in_flight']
+            for gauge, value in snapshot.get('gauges', {}).items():
+                merged['gauges'][gauge] = merged['gauges'].get(gauge, 0) + value
+    return merged
+
+
+def _escape(value):
+    # Label value escaping of the Prometheus text format
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+def render_prometheus(merged):
+    lines = [
+        '# HELP http_requests_total Requests by route, method and status.',
+        '# TYPE http_requests_total counter',
+    ]
+    for (route, method, status), count in sorted(merged['requests'].items()):
+        lines.append(f'http_requests_total{{{_labels(route=route, method=method, status=status)}}} {count}')
+
+    lines += [
+        '# HELP http_request_duration_seconds Request latency by route.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for route, histogram in sorted(merged['durations'].items()):
+        count, total, buckets = histogram[0], histogram[1], histogram[2:]
+        cumulative = 0
+        for bound, bucket in zip(DURATION_BUCKETS, buckets):
+            cumulative += bucket
+            lines.append(f'http_request_duration_seconds_bucket{{{_labels(route=route, le=bound)}}} {cumulative}')
+        lines.append(f'http_request_duration_seconds_bucket{{{_labels(route=route, le="+Inf")}}} {count}')
+        lines.append(f'http_request_duration_seconds_sum{{{_labels(route=route)}}} {total}')
+        lines.append(f'http_request_duration_seconds_count{{{_labels(route=route)}}} {count}')
+
+    lines += [
+        '# HELP db_queries_total Database queries issued by route.',
+        '# TYPE db_queries_total counter',
+    ]
+    for route, (queries, _) in sorted(merged['db_queries'].items()):
+        lines.append(f'db_queries_total{{{_labels(route=route)}}} {queries}')
+    lines += [
+        '# HELP db_query_duration_seconds_total Time spent in database queries by route.',
+        '# TYPE db_query_duration_seconds_total counter',
+    ]
+    for route, (_, seconds) in sorted(merged['db_queries'].items()):
+        lines.append(f'db_query_duration_seconds_total{{{_labels(route=route)}}} {seconds}')
+
+    lines += [
+        '# HELP http_response_size_bytes_total Response body bytes by route.',
+        '# TYPE http_response_size_bytes_total counter',
+    ]
+    for route, size in sorted(merged['response_bytes'].items()):
+        lines.append(f'http_response_size_bytes_total{{{_labels(route=route)}}} {size}')
+
+    lines += [
+        '# HELP http_requests_in_flight Requests currently being served across live workers.',
+        '# TYPE http_requests_in_flight gauge',
+        f'http_requests_in_flight {merged["in_flight"]}',
+    ]
+    for gauge, value in sorted(merged['gauges'].items()):
+        lines.append(f"# TYPE {gauge} {'counter' if gauge.endswith('_total') else 'gauge'}")
+        lines.append(f'{gauge} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_allowed(request):
+    """A METRICS_TOKEN bearer token, or a client address in METRICS_ALLOWED_IPS"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode()):
+            return True
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+
+
+def metrics_view(request):
+    """Prometheus text exposition of metrics aggregated over all workers"""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_prometheus(aggregate()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_token_blacklist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('to_email', models.EmailField(max_length=254)),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('html_body', models.TextField(blank=True, default='')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('SENDING', 'Sending'), ('SENT', 'Sent'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'email_outbox',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='email_outbox_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:58
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def populate_analytics(apps, schema_editor):
+    # Same as core.analytics.rebuild_category_stats, on the historical models.
+    # Walks the table by primary key so only one batch is held at a time
+    Poll = apps.get_model('core', 'Poll')
+    CategoryStats = apps.get_model('core', 'CategoryStats')
+    totals = defaultdict(lambda: [0, 0, 0])
+    polls = Poll.objects.only('id', 'category', 'options', 'votes').order_by('pk')
+    last_pk = None
+    while True:
+        batch = list((polls if last_pk is None else polls.filter(pk__gt=last_pk))[:BATCH_SIZE])
+        if not batch:
+            break
+        for poll in batch:
+            poll.vote_count = sum(poll.votes.values()) if poll.votes else 0
+            category_totals = totals[poll.category]
+            category_totals[0] += 1
+            category_totals[1] += len(poll.options or ())
+            category_totals[2] += poll.vote_count
+        Poll.objects.bulk_update(batch, ['vote_count'])
+        last_pk = batch[-1].pk
+    CategoryStats.objects.bulk_create([
+        CategoryStats(category=category, poll_count=count, option_count=options, vote_count=votes)
+        for category, (count, options, votes) in totals.items()
+    ])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_email_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('poll_count', models.PositiveIntegerField(default=0)),
+                ('option_count', models.PositiveIntegerField(default=0)),
+                ('vote_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'poll_category_stats',
+                'ordering': ['category'],
+            },
+        ),
+        migrations.AddField(
+            model_name='poll',
+            name='vote_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='poll',
+            index=models.Index(fields=['category', '-vote_count'], name='polls_category_votes_idx'),
+        ),
+        migrations.RunPython(populate_analytics, migrations.RunPython.noop),
+    ]
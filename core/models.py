@@ -1,12 +1,21 @@
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 import uuid
 
 # Create your models here.
 
+# Cache keys for per-poll and catalogue data (see core.cache.get_or_compute)
+POLL_CACHE_KEY = 'poll:{}'
+POLL_STATISTICS_CACHE_KEY = 'poll:{}:statistics'
+POLL_CATEGORIES_CACHE_KEY = 'poll:categories'
+
 class LoyaltyTier(models.TextChoices):
     BRONZE = 'BRONZE', 'Bronze'
     SILVER = 'SILVER', 'Silver'
@@ -18,6 +27,12 @@ class PollVisibility(models.TextChoices):
     PRIVATE = 'PRIVATE', 'Private'
     FRIENDS = 'FRIENDS', 'Friends'
 
+class OutboxStatus(models.TextChoices):
+    PENDING = 'PENDING', 'Pending'
+    SENDING = 'SENDING', 'Sending'
+    SENT = 'SENT', 'Sent'
+    FAILED = 'FAILED', 'Failed'
+
 class User(AbstractUser):
     """Enhanced User model matching Spring Boot User entity"""
     id = models.BigAutoField(primary_key=True)
@@ -61,6 +76,23 @@ class User(AbstractUser):
             self.updated_at = timezone.now()
         
         super().save(*args, **kwargs)
+    
+    def record_login(self):
+        """
+        Stamp last_login/last_login_at with a single narrow UPDATE.
+        
+        Writes are coalesced: if the previous stamp is younger than
+        LAST_LOGIN_UPDATE_INTERVAL seconds the database is not touched.
+        Uses QuerySet.update(), so save() and post_save signals are skipped.
+        """
+        now = timezone.now()
+        interval = getattr(settings, 'LAST_LOGIN_UPDATE_INTERVAL', 60)
+        if self.last_login_at and (now - self.last_login_at).total_seconds() < interval:
+            return False
+        User.objects.filter(pk=self.pk).update(last_login=now, last_login_at=now)
+        self.last_login = now
+        self.last_login_at = now
+        return True
 
 class Poll(models.Model):
     """Enhanced Poll model matching Spring Boot Poll entity"""
@@ -81,21 +113,39 @@ class Poll(models.Model):
     created_by = models.ForeignKey('User', on_delete=models.CASCADE, null=False, blank=False)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(null=True, blank=True)
+    # Sum of votes, kept by save() so polls can be ranked in SQL
+    vote_count = models.PositiveIntegerField(default=0)
     
     class Meta:
         db_table = 'polls'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['category', '-vote_count'], name='polls_category_votes_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stats_contribution = instance.stats_contribution()
+        return instance
     
     def save(self, *args, **kwargs):
         if not self.pk:  # New poll
             self.created_at = timezone.now()
         else:
             self.updated_at = timezone.now()
+        self.vote_count = self.total_votes
         super().save(*args, **kwargs)
     
     @property
     def total_votes(self):
         return sum(self.votes.values()) if self.votes else 0
+    
+    def stats_contribution(self):
+        """What this poll adds to its CategoryStats row, as stored"""
+        if self.get_deferred_fields() & {'category', 'options', 'votes'}:
+            return None
+        return self.category, len(self.options or ()), self.total_votes
 
 class Vote(models.Model):
     """Vote model for tracking individual votes"""
@@ -109,6 +159,55 @@ class Vote(models.Model):
         db_table = 'poll_votes'
         unique_together = ['user', 'poll']  # One vote per user per poll
 
+class CategoryStats(models.Model):
+    """
+    Running totals per poll category, so analytics read one row per
+    category instead of every poll. Kept up to date by the Poll signals
+    below; rebuild_poll_analytics recomputes it after bulk changes.
+    """
+    category = models.CharField(max_length=100, primary_key=True)
+    poll_count = models.PositiveIntegerField(default=0)
+    option_count = models.PositiveIntegerField(default=0)
+    vote_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'poll_category_stats'
+        ordering = ['category']
+    
+    @property
+    def average_options(self):
+        return self.option_count / self.poll_count if self.poll_count else 0
+    
+    @classmethod
+    def add(cls, category, polls=0, options=0, votes=0):
+        """
+        Add to a category's totals (negative amounts subtract) with one
+        UPDATE, so concurrent writers can't lose each other's changes.
+        Totals never go below zero; a category left without polls keeps
+        its row (analytics skip it) until the next rebuild.
+        """
+        if not (polls or options or votes):
+            return
+        rows = cls.objects.filter(category=category)
+        changes = {
+            'poll_count': Greatest(F('poll_count') + polls, 0),
+            'option_count': Greatest(F('option_count') + options, 0),
+            'vote_count': Greatest(F('vote_count') + votes, 0),
+            'updated_at': timezone.now(),
+        }
+        if rows.update(**changes):
+            return
+        if polls <= 0:
+            return  # Nothing to subtract from; rebuild_poll_analytics catches up
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    category=category, poll_count=polls, option_count=max(options, 0), vote_count=max(votes, 0)
+                )
+        except IntegrityError:  # Created concurrently
+            rows.update(**changes)
+
 class UserProfile(models.Model):
     """Legacy UserProfile model - keeping for backward compatibility"""
     user = models.OneToOneField('User', on_delete=models.CASCADE)
@@ -119,8 +218,82 @@ class UserProfile(models.Model):
     class Meta:
         db_table = 'user_profiles'
 
+class BlacklistedToken(models.Model):
+    """Revoked JWT, kept only until the token would have expired anyway"""
+    id = models.BigAutoField(primary_key=True)
+    jti = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    blacklisted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'token_blacklist'
+
+class OutboxEmail(models.Model):
+    """Queued outgoing email, delivered by the send_outbox_emails worker"""
+    id = models.BigAutoField(primary_key=True)
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, default='')
+    status = models.CharField(
+        max_length=10,
+        choices=OutboxStatus.choices,
+        default=OutboxStatus.PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'email_outbox'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='email_outbox_due_idx'),
+        ]
+
 # Signal to auto-create UserProfile when a new User is created
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        UserProfile.objects.get_or_create(user=instance)
+    # A brand-new user cannot have a profile yet, so skip the lookup
+    if created and not kwargs.get('raw', False):
+        UserProfile.objects.create(user=instance)
+
+# Signal to drop cached poll data whenever a poll changes
+@receiver(post_save, sender=Poll)
+@receiver(post_delete, sender=Poll)
+def invalidate_poll_cache(sender, instance, created=False, **kwargs):
+    keys = [POLL_CACHE_KEY.format(instance.id), POLL_STATISTICS_CACHE_KEY.format(instance.id)]
+    # Categories change when polls appear, disappear or move category. Runs
+    # before update_category_stats_on_save, so the snapshot is still the
+    # stored row; without one the old category is unknown
+    stored = getattr(instance, '_stats_contribution', None)
+    if created or kwargs.get('signal') is post_delete or stored is None or stored[0] != instance.category:
+        keys.append(POLL_CATEGORIES_CACHE_KEY)
+    # Wait for commit so a concurrent reader can't re-cache the old row
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+# Signals to keep CategoryStats in step with each saved or deleted poll
+@receiver(post_save, sender=Poll)
+def update_category_stats_on_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    new = instance.stats_contribution()
+    old = None if created else getattr(instance, '_stats_contribution', None)
+    if new is None or old == new or (old is None and not created):
+        # Unchanged, or not loaded in full so the difference is unknown
+        return
+    if old is not None and old[0] == new[0]:
+        CategoryStats.add(new[0], options=new[1] - old[1], votes=new[2] - old[2])
+    else:
+        if old is not None:
+            CategoryStats.add(old[0], polls=-1, options=-old[1], votes=-old[2])
+        CategoryStats.add(new[0], polls=1, options=new[1], votes=new[2])
+    instance._stats_contribution = new
+
+@receiver(post_delete, sender=Poll)
+def update_category_stats_on_delete(sender, instance, **kwargs):
+    # The totals as stored, whatever was changed on the instance since
+    stored = getattr(instance, '_stats_contribution', None) or instance.stats_contribution()
+    if stored is not None:
+        CategoryStats.add(stored[0], polls=-1, options=-stored[1], votes=-stored[2])
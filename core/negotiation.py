@@ -0,0 +1,19 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+def _available(classes):
+    return [cls for cls in classes if getattr(cls, 'available', True)]
+
+
+class AvailableFormatsNegotiation(DefaultContentNegotiation):
+    """
+    DefaultContentNegotiation that skips renderers and parsers whose
+    optional library isn't installed (``available = False``), so such a
+    format gets 406/415 rather than a server error.
+    """
+
+    def select_parser(self, request, parsers):
+        return super().select_parser(request, _available(parsers))
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return super().select_renderer(request, _available(renderers), format_suffix)
@@ -0,0 +1,156 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboxEmail, OutboxStatus
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(to_email, subject, body, html_body=''):
+    """Queue a single email with one INSERT; delivery happens in the worker"""
+    return OutboxEmail.objects.create(
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        html_body=html_body or '',
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff: base * 2^(attempts - 1), capped"""
+    base = _setting('EMAIL_OUTBOX_RETRY_BASE_DELAY', 30)
+    cap = _setting('EMAIL_OUTBOX_RETRY_MAX_DELAY', 3600)
+    return timedelta(seconds=min(base * (2 ** max(attempts - 1, 0)), cap))
+
+
+def claim_batch(batch_size):
+    """
+    Claim up to ``batch_size`` due emails for this worker.
+
+    Claimed rows are flipped to SENDING with ``next_attempt_at`` set to the
+    lease expiry, so a crashed worker's batch becomes due again once the
+    lease runs out. The exact lease timestamp identifies this worker's rows.
+    """
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=_setting('EMAIL_OUTBOX_LEASE', 300))
+    due = (
+        OutboxEmail.objects
+        .filter(Q(status=OutboxStatus.PENDING) | Q(status=OutboxStatus.SENDING), next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    ids = list(due)
+    if not ids:
+        return []
+    OutboxEmail.objects.filter(
+        Q(status=OutboxStatus.PENDING) | Q(status=OutboxStatus.SENDING),
+        id__in=ids,
+        next_attempt_at__lte=now,
+    ).update(status=OutboxStatus.SENDING, next_attempt_at=lease_until)
+    return list(
+        OutboxEmail.objects.filter(
+            id__in=ids,
+            status=OutboxStatus.SENDING,
+            next_attempt_at=lease_until,
+        ).order_by('id')
+    )
+
+
+def deliver_batch(batch_size=None, connection=None):
+    """
+    Deliver one batch of due emails over a single SMTP connection.
+
+    Returns a (sent, failed) tuple. Failed messages are rescheduled with
+    exponential backoff until EMAIL_OUTBOX_MAX_ATTEMPTS is reached.
+    """
+    batch_size = batch_size or _setting('EMAIL_OUTBOX_BATCH_SIZE', 50)
+    max_attempts = _setting('EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    emails = claim_batch(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Outbox could not open mail connection: {str(e)}")
+        for email in emails:
+            _mark_failed(email, e, max_attempts)
+        return 0, len(emails)
+
+    try:
+        for email in emails:
+            message = EmailMultiAlternatives(
+                subject=email.subject,
+                body=email.body,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[email.to_email],
+                connection=connection,
+            )
+            if email.html_body:
+                message.attach_alternative(email.html_body, 'text/html')
+            try:
+                message.send()
+            except Exception as e:
+                _mark_failed(email, e, max_attempts)
+                failed += 1
+                continue
+            email.status = OutboxStatus.SENT
+            email.attempts += 1
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            _redact(email)
+            email.save(update_fields=['status', 'attempts', 'sent_at', 'last_error', 'body', 'html_body'])
+            sent += 1
+    finally:
+        connection.close()
+
+    logger.info(f"Outbox batch delivered: {sent} sent, {failed} failed")
+    return sent, failed
+
+
+def _mark_failed(email, error, max_attempts):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = OutboxStatus.FAILED
+        _redact(email)
+        logger.error(f"Giving up on email {email.id} to {email.to_email} after {email.attempts} attempts: {error}")
+    else:
+        email.status = OutboxStatus.PENDING
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+        logger.warning(f"Email {email.id} to {email.to_email} failed, retrying at {email.next_attempt_at}: {error}")
+    email.save(update_fields=['status', 'attempts', 'last_error', 'next_attempt_at', 'body', 'html_body'])
+
+
+def _redact(email):
+    # Bodies carry OTP and verification codes; keep them only while undelivered
+    email.body = ''
+    email.html_body = ''
+
+
+def purge_finished(batch_size=1000):
+    """
+    Delete SENT and FAILED emails older than EMAIL_OUTBOX_RETENTION_DAYS in
+    primary-key batches. Returns the number of rows removed.
+    """
+    cutoff = timezone.now() - timedelta(days=_setting('EMAIL_OUTBOX_RETENTION_DAYS', 7))
+    finished = OutboxEmail.objects.filter(
+        status__in=[OutboxStatus.SENT, OutboxStatus.FAILED], created_at__lt=cutoff
+    )
+    deleted = 0
+    while ids := list(finished.values_list('id', flat=True)[:batch_size]):
+        deleted += OutboxEmail.objects.filter(id__in=ids).delete()[0]
+    if deleted:
+        logger.info(f"Purged {deleted} delivered or abandoned outbox emails")
+    return deleted
@@ -0,0 +1,53 @@
+import codecs
+import io
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser, get_encoding
+
+from .renderers import CBORRenderer, MessagePackRenderer, ORJSONRenderer, cbor2, msgpack, orjson
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSONParser decoding UTF-8 bodies with orjson.
+
+    Bodies orjson rejects are handed to the stock parser, so what is
+    accepted and the ParseError messages stay exactly as before. Other
+    charsets, STRICT_JSON off (NaN allowed) and a missing orjson use
+    JSONParser directly.
+    """
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        if orjson is None or not self.strict or codecs.lookup(get_encoding(parser_context)).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+    available = msgpack is not None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read())
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
+
+
+class CBORParser(BaseParser):
+    media_type = 'application/cbor'
+    renderer_class = CBORRenderer
+    available = cbor2 is not None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return cbor2.loads(stream.read())
+        except (ValueError, cbor2.CBORDecodeError) as exc:
+            raise ParseError(f'CBOR parse error - {exc}')
@@ -0,0 +1,169 @@
+import logging
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\s*(?:%s|\?|\?\d*)\s*,?)+\)', re.IGNORECASE)
+# Not work a view asked for: transaction control (TestCase adds savepoints
+# too) and the plans core.slow_queries captures
+_NOT_COUNTED = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', 'BEGIN', 'COMMIT', 'ROLLBACK', 'EXPLAIN')
+_LIBRARY_DIRS = (os.sep + 'site-packages' + os.sep, os.sep + 'dist-packages' + os.sep)
+# Execute wrappers of our own sit on the stack between the ORM and the caller
+_INSTRUMENTATION_FILES = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('metrics.py', 'query_budget.py', 'slow_queries.py')
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a request or block issues more queries than allowed"""
+
+
+def normalize_sql(sql):
+    """Reduce a statement to its shape: literals and IN lists become placeholders"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+def _origin():
+    """First stack frame inside the project, as ``path:line in function``"""
+    frame = sys._getframe(2)
+    base_dir = str(settings.BASE_DIR)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(base_dir) and filename not in _INSTRUMENTATION_FILES
+                and not any(part in filename for part in _LIBRARY_DIRS)):
+            return f'{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return '<unknown>'
+
+
+class QueryRecorder:
+    """
+    connection.execute_wrapper hook keeping every query issued while active.
+
+    With ``capture_origins`` each query also remembers the project line that
+    triggered it, which is what makes an N+1 report actionable.
+    """
+
+    def __init__(self, capture_origins=True):
+        self.capture_origins = capture_origins
+        self.queries = []  # (sql, shape, seconds, origin)
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(_NOT_COUNTED):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            origin = _origin() if self.capture_origins else None
+            self.queries.append((sql, normalize_sql(sql), time.perf_counter() - started, origin))
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated(self, threshold=None):
+        """Query shapes issued at least ``threshold`` times: [(shape, count, origins)]"""
+        threshold = threshold or getattr(settings, 'QUERY_REPEAT_THRESHOLD', 3)
+        by_shape = defaultdict(list)
+        for _, shape, _, origin in self.queries:
+            by_shape[shape].append(origin)
+        return [
+            (shape, len(origins), sorted({o for o in origins if o}))
+            for shape, origins in by_shape.items()
+            if len(origins) >= threshold
+        ]
+
+
+def describe_repeated(repeated):
+    lines = []
+    for shape, count, origins in repeated:
+        lines.append(f'  {count}x {shape}')
+        lines.extend(f'      from {origin}' for origin in origins)
+    return '\n'.join(lines)
+
+
+def budget_for(url_name):
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    return budgets.get(url_name, getattr(settings, 'QUERY_BUDGET_DEFAULT', None))
+
+
+class QueryBudgetMiddleware:
+    """
+    Count queries per request, report repeated query shapes (likely N+1)
+    with the lines that issued them, and check the route's QUERY_BUDGETS
+    entry. Only active when QUERY_BUDGET_ENABLED (defaults to DEBUG); with
+    QUERY_BUDGET_ENFORCE an exceeded budget raises instead of logging.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match else None
+        repeated = recorder.repeated()
+        if repeated:
+            logger.warning(
+                'Repeated queries in %s %s (%s):\n%s',
+                request.method, request.path, url_name, describe_repeated(repeated)
+            )
+
+        budget = budget_for(url_name)
+        if budget is not None and len(recorder) > budget:
+            message = (
+                f'{request.method} {request.path} ({url_name}) issued {len(recorder)} queries, '
+                f'budget is {budget}'
+            )
+            if getattr(settings, 'QUERY_BUDGET_ENFORCE', False):
+                raise QueryBudgetExceeded(message + '\n' + '\n'.join(q[0] for q in recorder.queries))
+            logger.warning(message)
+        return response
+
+
+# ==================== TEST UTILITIES ====================
+
+@contextmanager
+def assert_max_queries(max_queries=None, repeat_threshold=None):
+    """
+    Fail if the block issues more than ``max_queries`` queries or repeats any
+    query shape ``repeat_threshold`` times (QUERY_REPEAT_THRESHOLD by default).
+    """
+    recorder = QueryRecorder()
+    with recorder.record():
+        yield recorder
+    if max_queries is not None and len(recorder) > max_queries:
+        raise QueryBudgetExceeded(
+            f'{len(recorder)} queries issued, budget is {max_queries}:\n'
+            + '\n'.join(q[0] for q in recorder.queries)
+        )
+    repeated = recorder.repeated(repeat_threshold)
+    if repeated:
+        raise QueryBudgetExceeded('Repeated queries (likely N+1):\n' + describe_repeated(repeated))
+
@@ -0,0 +1,119 @@
+import datetime
+import decimal
+import uuid
+
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # Optional: without it the stock renderer is used
+    orjson = None
+
+
+try:
+    import msgpack
+except ImportError:  # Optional: application/msgpack is only offered when installed
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # Optional: application/cbor is only offered when installed
+    cbor2 = None
+
+# Matches JSONRenderer's output: UTC as "Z", non-str keys coerced like json.dumps
+ORJSON_OPTIONS = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def vary_on_accept(renderer_context):
+    # The representation depends on Accept once binary formats are offered
+    response = (renderer_context or {}).get('response')
+    if response is not None:
+        patch_vary_headers(response, ('Accept',))
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer producing the same JSON through orjson, several times faster.
+
+    Types orjson doesn't know (Decimal, lazy strings, querysets...) go
+    through the stock encoder's ``default``. Indented output, non-default
+    UNICODE_JSON/COMPACT_JSON settings and anything orjson refuses (e.g.
+    integers beyond 64 bits) fall back to JSONRenderer, as does a missing
+    orjson. The output is byte-identical except for floats:
+
+    - NaN and Infinity become null where STRICT_JSON makes JSONRenderer raise.
+    - Very large and very small floats may be spelled differently (e.g.
+      orjson writes ``1e-7`` and ``0.00001`` where JSONRenderer writes
+      ``1e-07`` and ``1e-05``); both parse to the same number.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        vary_on_accept(renderer_context)
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like JSONRenderer so the output stays a strict JavaScript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+# Types cbor2 has native tags for, which JSON carries as strings, numbers or arrays
+CBOR_TAGGED_TYPES = (
+    datetime.datetime, datetime.date, datetime.time, datetime.timedelta, decimal.Decimal, uuid.UUID, set, frozenset,
+)
+
+
+class BinaryRenderer(BaseRenderer):
+    """
+    Base for compact binary encodings of the JSON payloads.
+
+    The data is the same as the JSON rendering: types JSON has no literal
+    for (dates, Decimal, UUID, lazy strings...) go through JSONRenderer's
+    encoder and arrive as the same strings and numbers. ``available`` is
+    False when the encoding library isn't installed, and
+    AvailableFormatsNegotiation then never selects the renderer.
+    """
+    charset = None
+    render_style = 'binary'
+    available = False
+
+    def json_default(self, value):
+        return JSONRenderer.encoder_class().default(value)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        vary_on_accept(renderer_context)
+        if data is None:
+            return b''
+        return self.dumps(data)
+
+
+class MessagePackRenderer(BinaryRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    available = msgpack is not None
+
+    def dumps(self, data):
+        return msgpack.packb(data, default=self.json_default, datetime=False)
+
+
+class CBORRenderer(BinaryRenderer):
+    media_type = 'application/cbor'
+    format = 'cbor'
+    available = cbor2 is not None
+
+    def dumps(self, data):
+        # cbor2 has native tags for these; override them to match JSON
+        return cbor2.dumps(
+            data, encoders=dict.fromkeys(CBOR_TAGGED_TYPES, self.encode_as_json),
+            default=self.encode_as_json,
+        )
+
+    def encode_as_json(self, encoder, value):
+        encoder.encode(self.json_default(value))
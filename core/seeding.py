@@ -0,0 +1,235 @@
+import bisect
+import itertools
+import random
+from datetime import timedelta
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .analytics import rebuild_category_stats
+from .hashing import make_password
+from .models import LoyaltyTier, Poll, User, UserProfile, Vote
+
+SEED_EMAIL_DOMAIN = 'seed.example.com'
+SEED_PASSWORD = 'seed-password'
+
+CATEGORIES = [
+    'Drama', 'Comedy', 'Action', 'Thriller', 'Sci-Fi', 'Horror', 'Romance',
+    'Animation', 'Documentary', 'Fantasy', 'Crime', 'Musical',
+]
+MOVIES = [
+    'Inception', 'Parasite', 'Arrival', 'Heat', 'Alien', 'Amelie', 'Up', 'Rocky',
+    'Vertigo', 'Jaws', 'Casablanca', 'Memento', 'Her', 'Coco', 'Se7en', 'Fargo',
+    'Gravity', 'Psycho', 'Brazil', 'Oldboy', 'Drive', 'Moon', 'Tenet', 'Dune',
+]
+
+
+def zipf_weights(n, s):
+    """Weights proportional to 1 / rank**s for ranks 1..n"""
+    return [1 / rank ** s for rank in range(1, n + 1)]
+
+
+def allocate(total, weights, cap):
+    """Split ``total`` proportionally to ``weights`` with no share above ``cap``"""
+    shares = [0] * len(weights)
+    remaining = total
+    open_slots = list(range(len(weights)))
+    while remaining > 0 and open_slots:
+        weight_sum = sum(weights[i] for i in open_slots)
+        handed_out = 0
+        for i in open_slots:
+            extra = min(int(remaining * weights[i] / weight_sum), cap - shares[i])
+            shares[i] += extra
+            handed_out += extra
+        open_slots = [i for i in open_slots if shares[i] < cap]
+        if handed_out == 0:
+            # Rounding left a few over: give them to the most popular open slots
+            for i in open_slots[:remaining]:
+                shares[i] += 1
+                handed_out += 1
+        remaining -= handed_out
+    return shares
+
+
+def insert_rows(model, fields, rows, chunk_size):
+    """
+    INSERT plain value tuples for ``fields`` with executemany, in chunks.
+
+    For the bulkiest table only: it skips model instantiation and per-field
+    preparation (most of bulk_create's cost), so values must already be in
+    database form. Returns the number of rows inserted.
+    """
+    alias = router.db_for_write(model)
+    connection = connections[alias]
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    sql = f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})'
+    inserted = 0
+    rows = iter(rows)
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            cursor.executemany(sql, chunk)
+            inserted += len(chunk)
+    return inserted
+
+
+def loyalty_tier(points):
+    if points >= 1000:
+        return LoyaltyTier.PLATINUM
+    if points >= 500:
+        return LoyaltyTier.GOLD
+    if points >= 100:
+        return LoyaltyTier.SILVER
+    return LoyaltyTier.BRONZE
+
+
+class SeedGenerator:
+    """
+    Deterministic synthetic data for benchmarks and capacity planning.
+
+    - Users share one precomputed password hash (SEED_PASSWORD); profiles
+      are inserted alongside since bulk_create skips the post_save signal.
+    - Poll categories and poll popularity follow Zipf distributions, so a
+      few categories and polls hold most of the votes.
+    - Each poll gets at most one vote per user; votes lean towards each
+      poll's favourite options and cluster shortly after the poll opened.
+    - Poll.votes tallies are built from the generated votes, so they always
+      match the poll_votes rows; the category analytics are rebuilt after.
+
+    Users, profiles and polls are inserted with bulk_create and votes with
+    insert_rows, in ``chunk_size`` batches inside one transaction per model.
+    The same ``seed`` yields the same data.
+    """
+
+    def __init__(self, users, polls, votes, seed=42, chunk_size=5000, days=365,
+                 popularity_skew=1.1, category_skew=1.0, log=None):
+        self.users = users
+        self.polls = polls
+        self.votes = votes
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.days = days
+        self.popularity_skew = popularity_skew
+        self.category_skew = category_skew
+        self.log = log or (lambda message: None)
+        self.now = timezone.now().replace(microsecond=0)
+
+    def rng(self, *parts):
+        return random.Random(':'.join(str(p) for p in (self.seed, *parts)))
+
+    def run(self):
+        if self.users and self.polls and self.votes > self.users * self.polls:
+            raise ValueError(
+                f'{self.votes} votes need more than {self.users} users x {self.polls} polls'
+            )
+        user_ids = self.create_users()
+        polls = self.create_polls(user_ids)
+        self.create_votes(user_ids, polls)
+        # bulk_create skipped the signals that maintain the analytics aggregates
+        rebuild_category_stats(chunk_size=self.chunk_size)
+        self.log('category analytics rebuilt')
+        return len(user_ids), len(polls)
+
+    def chunks(self, iterable):
+        iterator = iter(iterable)
+        while chunk := list(itertools.islice(iterator, self.chunk_size)):
+            yield chunk
+
+    def create_users(self):
+        password = make_password(SEED_PASSWORD)
+        rng = self.rng('users')
+        joined_span = self.days * 86400
+
+        def users():
+            for i in range(self.users):
+                points = int(rng.paretovariate(1.5) * 20) - 20
+                joined = self.now - timedelta(seconds=rng.randrange(joined_span))
+                yield User(
+                    username=f'seed-{self.seed}-{i}',
+                    email=f'user{i}.{self.seed}@{SEED_EMAIL_DOMAIN}',
+                    password=password,
+                    first_name=f'User{i}',
+                    last_name=f'Seed{self.seed}',
+                    loyalty_points=points,
+                    loyalty_tier=loyalty_tier(points),
+                    email_verified=rng.random() < 0.8,
+                    created_at=joined,
+                    date_joined=joined,
+                )
+
+        with transaction.atomic():
+            for chunk in self.chunks(users()):
+                User.objects.bulk_create(chunk, batch_size=self.chunk_size)
+            user_ids = list(
+                User.objects.filter(email__endswith=f'.{self.seed}@{SEED_EMAIL_DOMAIN}')
+                .order_by('id').values_list('id', flat=True)
+            )
+            for chunk in self.chunks(user_ids):
+                UserProfile.objects.bulk_create(
+                    [UserProfile(user_id=user_id) for user_id in chunk], batch_size=self.chunk_size
+                )
+        self.log(f'{len(user_ids)} users and profiles')
+        return user_ids
+
+    def create_polls(self, user_ids):
+        rng = self.rng('polls')
+        category_cdf = list(itertools.accumulate(zipf_weights(len(CATEGORIES), self.category_skew)))
+        created_span = self.days * 86400
+
+        def polls():
+            for i in range(self.polls):
+                category = CATEGORIES[bisect.bisect(category_cdf, rng.random() * category_cdf[-1])]
+                options = rng.sample(MOVIES, rng.randint(2, 5))
+                yield Poll(
+                    question=f'{category} night #{i}: which one should we watch?',
+                    options=options,
+                    votes={option: 0 for option in options},
+                    category=category,
+                    is_anonymous=rng.random() < 0.2,
+                    visibility=rng.choices(['PUBLIC', 'PRIVATE', 'FRIENDS'], [85, 5, 10])[0],
+                    created_by_id=rng.choice(user_ids),
+                    created_at=self.now - timedelta(seconds=rng.randrange(created_span)),
+                )
+
+        created = []
+        with transaction.atomic():
+            for chunk in self.chunks(polls()):
+                created.extend(Poll.objects.bulk_create(chunk, batch_size=self.chunk_size))
+        if not created or created[0].pk is None:
+            # Backends that can't return ids from bulk_create
+            created = list(Poll.objects.order_by('-id')[:self.polls])[::-1]
+        self.log(f'{len(created)} polls')
+        return created
+
+    def create_votes(self, user_ids, polls):
+        if not polls or not user_ids:
+            return
+        # Popularity rank is shuffled so it isn't correlated with poll id
+        ranks = list(range(len(polls)))
+        self.rng('ranks').shuffle(ranks)
+        weights = zipf_weights(len(polls), self.popularity_skew)
+        counts = allocate(self.votes, [weights[rank] for rank in ranks], len(user_ids))
+
+        adapt_datetime = connections[router.db_for_write(Vote)].ops.adapt_datetimefield_value
+
+        def votes():
+            for index, (poll, count) in enumerate(zip(polls, counts)):
+                # Keyed by position, not pk, so reruns into other ids give the same data
+                rng = self.rng('votes', index)
+                option_weights = zipf_weights(len(poll.options), 0.8)
+                rng.shuffle(option_weights)
+                choices = rng.choices(poll.options, option_weights, k=count)
+                # Most votes arrive soon after a poll opens
+                age = max((self.now - poll.created_at).total_seconds(), 1)
+                tally = poll.votes
+                for user_id, option in zip(rng.sample(user_ids, count), choices):
+                    tally[option] += 1
+                    poll.vote_count += 1
+                    delay = min(rng.expovariate(1 / 43200), age)
+                    yield user_id, poll.pk, option, adapt_datetime(poll.created_at + timedelta(seconds=delay))
+
+        with transaction.atomic():
+            inserted = insert_rows(Vote, ['user', 'poll', 'option', 'timestamp'], votes(), self.chunk_size)
+            Poll.objects.bulk_update(polls, ['votes', 'vote_count'], batch_size=500)
+        self.log(f'{inserted} votes, tallies updated')
@@ -1,7 +1,8 @@
 from rest_framework import serializers
-from django.contrib.auth import authenticate
+from django.contrib.auth import authenticate, hashers
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from . import hashing
 from .models import User, UserProfile, Poll, Vote, LoyaltyTier, PollVisibility
 from datetime import datetime
 import json
@@ -33,7 +34,7 @@ class CreateUserRequestSerializer(serializers.Serializer):
         return value
 
     def create(self, validated_data):
-        user = User.objects.create_user(
+        user = hashing.create_user(
             username=validated_data['email'],  # Use email as username
             email=validated_data['email'],
             password=validated_data['password'],
@@ -43,6 +44,35 @@ class CreateUserRequestSerializer(serializers.Serializer):
         )
         return user
 
+class ImportUserRowSerializer(serializers.Serializer):
+    """
+    One row of a bulk user import (core.user_import).
+
+    Like CreateUserRequestSerializer, but email uniqueness is checked per
+    batch by the importer, and a row may carry an already encoded
+    ``passwordHash`` instead of a raw ``password``. Rows with neither get an
+    unusable password and sign in after a password reset.
+    """
+    email = serializers.EmailField(max_length=150)
+    password = serializers.CharField(required=False, allow_blank=True, validators=[validate_password])
+    passwordHash = serializers.CharField(max_length=128, required=False, allow_blank=True)
+    firstName = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    lastName = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    phoneNumber = serializers.CharField(max_length=20, required=False, allow_blank=True)
+
+    def validate_passwordHash(self, value):
+        if value:
+            try:
+                hashers.identify_hasher(value)
+            except ValueError:
+                raise serializers.ValidationError("Unknown password hash format.")
+        return value
+
+    def validate(self, data):
+        if data.get('password') and data.get('passwordHash'):
+            raise serializers.ValidationError("Give either password or passwordHash, not both.")
+        return data
+
 class UpdateUserRequestSerializer(serializers.Serializer):
     """Serializer for updating user information"""
     firstName = serializers.CharField(max_length=150, required=False, allow_blank=True)
@@ -102,6 +132,7 @@ class AuthResponseSerializer(serializers.Serializer):
     success = serializers.BooleanField()
     message = serializers.CharField()
     token = serializers.CharField(required=False)
+    refreshToken = serializers.CharField(required=False)
     user = UserSerializer(required=False)
     expiresIn = serializers.IntegerField(required=False)
 
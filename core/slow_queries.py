@@ -0,0 +1,170 @@
+import contextvars
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .query_budget import _NOT_COUNTED, normalize_sql
+
+logger = logging.getLogger(__name__)
+
+# Set while we run EXPLAIN so the wrapper doesn't time (or explain) itself
+_explaining = contextvars.ContextVar('slow_query_explaining', default=False)
+
+_EXPLAINABLE = ('SELECT', 'WITH')
+
+
+def threshold():
+    return getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100) / 1000
+
+
+def params_fingerprint(params):
+    """Short stable hash of the bound values: groups repeats without logging them"""
+    if params is None:
+        return None
+    return hashlib.sha1(repr(params).encode('utf-8', 'replace')).hexdigest()[:12]
+
+
+def explain(connection, sql, params):
+    """The backend's plan for ``sql`` as a list of lines, or None if it can't be explained"""
+    if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    sqlite = connection.vendor == 'sqlite'
+    prefix = 'EXPLAIN QUERY PLAN' if sqlite else 'EXPLAIN'
+    token = _explaining.set(True)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+        if sqlite:
+            # (id, parent, notused, detail): the detail is the readable part
+            return [row[-1] for row in rows]
+        return [' '.join(str(column) for column in row) for row in rows]
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        _explaining.reset(token)
+
+
+class SlowQueryStats:
+    """
+    Per-process aggregate of slow queries by normalized statement: count,
+    total/max time, a bounded sample of durations for percentiles, the views
+    that issued it and the plan captured the first time it was slow.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._statements = {}
+
+    def record(self, shape, seconds, view):
+        """Add one slow execution; returns (entry, is_new, count, p95 seconds)"""
+        samples = getattr(settings, 'SLOW_QUERY_SAMPLES', 1000)
+        with self._lock:
+            entry = self._statements.get(shape)
+            is_new = entry is None
+            if is_new:
+                entry = self._statements[shape] = {
+                    'count': 0, 'total': 0.0, 'max': 0.0,
+                    'durations': deque(maxlen=samples), 'views': set(), 'plan': None,
+                }
+            entry['count'] += 1
+            entry['total'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            entry['durations'].append(seconds)
+            if view:
+                entry['views'].add(view)
+            return entry, is_new, entry['count'], percentile(entry['durations'], 0.95)
+
+    def report(self):
+        """Statements ordered by total time spent in them"""
+        with self._lock:
+            rows = [
+                {
+                    'statement': shape,
+                    'count': entry['count'],
+                    'total_ms': round(entry['total'] * 1000, 2),
+                    'p95_ms': round(percentile(entry['durations'], 0.95) * 1000, 2),
+                    'max_ms': round(entry['max'] * 1000, 2),
+                    'views': sorted(entry['views']),
+                    'plan': entry['plan'],
+                }
+                for shape, entry in self._statements.items()
+            ]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+
+
+slow_query_stats = SlowQueryStats()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class SlowQueryLogger:
+    """connection.execute_wrapper hook logging statements slower than SLOW_QUERY_THRESHOLD_MS"""
+
+    def __init__(self, request=None):
+        self.request = request
+
+    def view_name(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else None
+
+    def __call__(self, execute, sql, params, many, context):
+        if _explaining.get() or sql.lstrip().upper().startswith(_NOT_COUNTED):
+            # Transaction control: its time is the commit's, not a query's
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed = time.perf_counter() - started
+        if elapsed >= threshold():
+            self.report(context['connection'], sql, params, many, elapsed)
+        return result
+
+    def report(self, connection, sql, params, many, elapsed):
+        shape = normalize_sql(sql)
+        view = self.view_name()
+        entry, is_new, count, p95 = slow_query_stats.record(shape, elapsed, view)
+        # One EXPLAIN per statement shape and process is enough to see the plan
+        if is_new and not many and getattr(settings, 'SLOW_QUERY_EXPLAIN', True):
+            entry['plan'] = explain(connection, sql, params)
+        logger.warning(
+            'Slow query (%.1f ms) in %s: %s', elapsed * 1000, view or '-', shape,
+            extra={'data': {
+                'duration_ms': round(elapsed * 1000, 2),
+                'statement': shape,
+                'params_fingerprint': None if many else params_fingerprint(params),
+                'view': view,
+                'database': connection.alias,
+                'plan': entry['plan'],
+                'count': count,
+                'p95_ms': round(p95 * 1000, 2),
+            }},
+        )
+
+
+class SlowQueryMiddleware:
+    """Attach SlowQueryLogger to every database connection for the duration of a request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        slow_query_logger = SlowQueryLogger(request)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(slow_query_logger))
+            return self.get_response(request)
@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+# Run in a fresh interpreter under -X importtime: import the entry point,
+# then build the URLconf, which Django otherwise defers to the first request.
+_CHILD = """
+import importlib, json, os, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'moviepoll.settings')
+importlib.import_module(sys.argv[1])
+if sys.argv[2] == '1':
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+print(json.dumps({'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}))
+"""
+
+
+@dataclass
+class ImportRecord:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+@dataclass
+class StartupProfile:
+    entry_point: str
+    seconds: float
+    records: list = field(default_factory=list)
+    modules: list = field(default_factory=list)
+
+    @property
+    def import_us(self):
+        """Total import time: the sum over top-level imports"""
+        return sum(r.cumulative_us for r in self.records if r.depth == 0)
+
+    def top(self, n, key='cumulative_us', prefix=None):
+        records = [r for r in self.records if prefix is None or r.module.startswith(prefix)]
+        return sorted(records, key=lambda r: getattr(r, key), reverse=True)[:n]
+
+    def loaded(self, module):
+        """Whether ``module`` or any of its submodules was imported"""
+        return any(m == module or m.startswith(module + '.') for m in self.modules)
+
+
+def parse_importtime(output):
+    """
+    Parse ``-X importtime`` lines (``import time: self | cumulative | name``),
+    where the name's indentation, two spaces per level, gives the nesting.
+    """
+    records = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        if not self_us.strip().isdigit():
+            continue  # The header line
+        module = name.strip()
+        records.append(ImportRecord(
+            module=module,
+            self_us=int(self_us),
+            cumulative_us=int(cumulative_us),
+            depth=(len(name) - len(name.lstrip(' ')) - 1) // 2,
+        ))
+    return records
+
+
+def profile_startup(entry_point='moviepoll.wsgi', load_urls=True):
+    """Cold-start ``entry_point`` in a new interpreter and profile its imports"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _CHILD, entry_point, '1' if load_urls else '0'],
+        cwd=settings.BASE_DIR,
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE='1'),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'Starting {entry_point} failed:\n{result.stderr[-2000:]}')
+    summary = json.loads(result.stdout.strip().splitlines()[-1])
+    return StartupProfile(
+        entry_point=entry_point,
+        seconds=summary['seconds'],
+        records=parse_importtime(result.stderr),
+        modules=summary['modules'],
+    )
@@ -0,0 +1,71 @@
+import itertools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.settings import api_settings
+
+STREAM_PARAM = 'stream'
+
+
+def wants_stream(request):
+    """
+    ``?stream=true`` (or 1/yes) asks a list endpoint for a streamed full
+    dump. Only JSON is streamed; binary formats (MessagePack needs the array
+    length up front) get the regular response.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    if renderer is not None and renderer.format != 'json':
+        return False
+    return request.query_params.get(STREAM_PARAM, '').lower() in ('1', 'true', 'yes')
+
+
+def json_array_chunks(queryset, serializer_class, chunk_size):
+    """
+    Yield a JSON array of the serialized ``queryset`` in pieces.
+
+    Rows are fetched with ``iterator(chunk_size)`` and serialized and
+    rendered ``chunk_size`` at a time, so only one chunk of model instances
+    and bytes is alive at once. The concatenated output is byte-identical to
+    rendering the whole list with the default renderer.
+    """
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    rows = queryset.iterator(chunk_size=chunk_size)
+    yield b'['
+    separator = b''
+    while batch := list(itertools.islice(rows, chunk_size)):
+        rendered = renderer.render(serializer_class(batch, many=True).data)
+        yield separator + rendered[1:-1]  # Drop the brackets of the chunk's own array
+        separator = b','
+    yield b']'
+
+
+async def _iterate_async(chunks):
+    # Each chunk is produced on the request's sync thread, where the cursor lives
+    next_chunk = sync_to_async(lambda: next(chunks, None), thread_sensitive=True)
+    while (chunk := await next_chunk()) is not None:
+        yield chunk
+
+
+def streaming_response(request, chunks, content_type):
+    """
+    StreamingHttpResponse sending ``chunks`` (a sync iterator of bytes).
+
+    Under ASGI the chunks are handed over as an async iterator, as Django
+    would otherwise buffer a sync one entirely before sending.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = _iterate_async(chunks)
+    return StreamingHttpResponse(chunks, content_type=content_type)
+
+
+def stream_json_list(request, queryset, serializer_class, chunk_size=None):
+    """
+    StreamingHttpResponse carrying the whole ``queryset`` as a JSON array.
+
+    Note that MySQL's client library buffers the full result set; SQLite
+    and PostgreSQL fetch ``chunk_size`` rows at a time.
+    """
+    chunks = json_array_chunks(queryset, serializer_class, chunk_size or settings.STREAMING_CHUNK_SIZE)
+    return streaming_response(request, chunks, 'application/json')
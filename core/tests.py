@@ -1,3 +1,1291 @@
-from django.test import TestCase
+import datetime
+import decimal
+import asyncio
+import gzip
+import io
+import json
+import logging
+import logging.config
+import os
+import shutil
+import smtplib
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Permission
+from django.contrib import admin
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import compression, hashing, outbox
+from .analytics import category_analytics, rebuild_category_stats
+from .cache import GENERATION_KEY, TwoTierCache, get_or_compute
+from .compression import negotiate
+from .db_router import PIN_COOKIE, ReadReplicaRouter, ReplicaStickinessMiddleware, use_primary
+from .email_backend import CustomSMTPEmailBackend, PooledConnection, connection_pool
+from .email_service import EmailService
+from .email_templates import POLL_CLOSED
+from .log_handlers import QueueListenerHandler
+from .metrics import RETIRED_SNAPSHOT, ProcessMetrics, aggregate, render_prometheus
+from .models import (
+    POLL_CACHE_KEY, POLL_CATEGORIES_CACHE_KEY, BlacklistedToken, CategoryStats, OutboxEmail, OutboxStatus, Poll,
+    User, UserProfile, Vote,
+)
+from .parsers import CBORParser, MessagePackParser, ORJSONParser
+from .query_budget import QueryBudgetExceeded, assert_max_queries, normalize_sql
+from .renderers import CBORRenderer, MessagePackRenderer, ORJSONRenderer, cbor2, msgpack, orjson
+from .seeding import SeedGenerator
+from .slow_queries import SlowQueryLogger, slow_query_stats
+from .startup import profile_startup
+from .token_blacklist import token_blacklist
+from .user_import import UserImporter, read_rows
+from .warmup import Warmup
+
+
+@override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_ENFORCE=True)
+class QueryBudgetTests(TestCase):
+    """Every budgeted route stays within QUERY_BUDGETS no matter how many rows it returns"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create(username=f'user{i}', email=f'user{i}@example.com', first_name=f'User{i}')
+            for i in range(5)
+        ]
+        cls.polls = [
+            Poll.objects.create(
+                question=f'Question {i}?',
+                options=['A', 'B'],
+                votes={'A': i, 'B': 0},
+                category='Drama' if i % 2 else 'Comedy',
+                created_by=user,
+            )
+            for i, user in enumerate(cls.users)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_poll_lists(self):
+        poll = self.polls[0]
+        for url in [
+            reverse('get-all-polls'),
+            reverse('get-polls-by-category', args=['Drama']),
+            reverse('get-polls-by-user', args=[poll.created_by_id]),
+            reverse('get-polls-by-visibility', args=['public']),
+            reverse('get-poll-by-id', args=[poll.id]),
+            reverse('get-poll-statistics', args=[poll.id]),
+            reverse('get-available-categories'),
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_user_lists(self):
+        for url in [reverse('get-all-users'), reverse('get-active-users')]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_poll_writes(self):
+        poll = self.polls[1]
+        response = self.client.post(
+            reverse('vote-on-poll', args=[poll.id]),
+            {'option': 'A', 'voterUserId': self.users[0].id},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['createdBy']['id'], poll.created_by_id)
+
+        response = self.client.delete(
+            reverse('delete-poll', args=[poll.id]) + f'?userId={poll.created_by_id}'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(QUERY_BUDGETS={'get-all-polls': 0})
+    def test_exceeded_budget_fails(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('get-all-polls'))
+
+
+class RepeatedQueryDetectionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='author', email='author@example.com')
+        for i in range(4):
+            Poll.objects.create(question=f'Q{i}?', options=['A', 'B'], category='Drama', created_by=user)
+
+    def test_lazy_foreign_key_access_is_reported(self):
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with assert_max_queries():
+                [poll.created_by.email for poll in Poll.objects.all()]
+        self.assertIn('4x', str(raised.exception))
+        self.assertIn('core/tests.py', str(raised.exception))
+
+    def test_select_related_passes(self):
+        with assert_max_queries(1):
+            [poll.created_by.email for poll in Poll.objects.select_related('created_by')]
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM polls WHERE id IN (%s, %s, %s) AND category = 'Drama' LIMIT 21"),
+            'SELECT * FROM polls WHERE id IN (...) AND category = ? LIMIT ?',
+        )
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+class SlowQueryLogTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='author', email='author@example.com')
+        Poll.objects.create(question='Q?', options=['A', 'B'], category='Drama', created_by=user)
+
+    def setUp(self):
+        slow_query_stats.reset()
+
+    def test_slow_statement_is_aggregated_with_plan(self):
+        with self.assertLogs('core.slow_queries', 'WARNING') as logs:
+            for _ in range(2):
+                self.client.get(reverse('get-polls-by-category', args=['Drama']))
+        [row] = [r for r in slow_query_stats.report() if 'FROM "polls"' in r['statement']]
+        self.assertEqual(row['count'], 2)
+        self.assertEqual(row['views'], ['get-polls-by-category'])
+        self.assertTrue(any('polls' in line for line in row['plan']))
+        self.assertEqual(logs.records[-1].data['count'], 2)
+
+    def test_transaction_control_is_not_logged(self):
+        with connection.execute_wrapper(SlowQueryLogger()), transaction.atomic():
+            Poll.objects.count()
+        self.assertEqual([r['statement'].split()[0] for r in slow_query_stats.report()], ['SELECT'])
+
+
+class SeedDataTests(TestCase):
+
+    def test_tallies_match_votes_and_data_is_deterministic(self):
+        SeedGenerator(users=50, polls=10, votes=300, seed=3).run()
+        self.assertEqual(Vote.objects.count(), 300)
+        self.assertEqual(UserProfile.objects.count(), 50)
+        for poll in Poll.objects.all():
+            counted = dict(Vote.objects.filter(poll=poll).values_list('option').annotate(n=Count('id')))
+            self.assertEqual({k: v for k, v in poll.votes.items() if v}, counted)
+
+        first = list(Vote.objects.order_by('poll__question', 'user__email').values_list('user__email', 'option'))
+        Vote.objects.all().delete()
+        Poll.objects.all().delete()
+        User.objects.all().delete()
+        SeedGenerator(users=50, polls=10, votes=300, seed=3).run()
+        again = list(Vote.objects.order_by('poll__question', 'user__email').values_list('user__email', 'option'))
+        self.assertEqual(first, again)
+
+
+class UserImportTests(TestCase):
+
+    def test_rows_are_validated_deduplicated_and_imported_with_profiles(self):
+        User.objects.create(username='taken@example.com', email='taken@example.com')
+        existing_hash = make_password('imported-secret')
+        lines = [
+            '{"email": "a@example.com", "passwordHash": "%s", "firstName": "Ann"}' % existing_hash,
+            '{"email": "b@example.com"}',
+            '{"email": "a@example.com"}',
+            '{"email": "taken@example.com"}',
+            '{"email": "not-an-email"}',
+            '{"email": "c@example.com", "passwordHash": "garbage"}',
+            '{broken',
+        ]
+        rejected = []
+        importer = UserImporter(batch_size=3, on_reject=lambda line, row, reason: rejected.append(line))
+        result = importer.run(read_rows(io.StringIO('\n'.join(lines)), 'jsonl'))
+
+        self.assertEqual((result['read'], result['created'], result['rejected']), (7, 2, 5))
+        self.assertEqual(sorted(rejected), [3, 4, 5, 6, 7])
+        ann = User.objects.get(email='a@example.com')
+        self.assertTrue(ann.check_password('imported-secret'))
+        self.assertEqual(ann.first_name, 'Ann')
+        self.assertFalse(User.objects.get(email='b@example.com').has_usable_password())
+        self.assertEqual(UserProfile.objects.filter(user__email__in=['a@example.com', 'b@example.com']).count(), 2)
+
+
+    def test_command_masks_passwords_in_reject_log(self):
+        directory = tempfile.mkdtemp(prefix='import-test-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'users.jsonl')
+        with open(path, 'w') as f:
+            f.write('{"email": "not-an-email", "password": "plain-secret"}\n')
+            f.write('{"email": "c@example.com", "passwordHash": "not-a-hash"}\n')
+        call_command('import_users', path, stdout=io.StringIO())
+
+        with open(f'{path}.rejects.jsonl') as f:
+            rows = [json.loads(line)['row'] for line in f]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['password'], '***')
+        self.assertEqual(rows[1]['passwordHash'], '***')
+
+class StartupBudgetTests(SimpleTestCase):
+
+    def test_cold_start_stays_within_budget(self):
+        # profile.modules is sys.modules of a fresh interpreter after startup
+        profile = profile_startup('moviepoll.wsgi')
+        eager = [m for m in settings.STARTUP_LAZY_MODULES if profile.loaded(m)]
+        self.assertEqual(eager, [], 'These should only be imported on first use')
+        # Wall clock varies between machines, so only a blow-up fails the
+        # suite; `manage.py profile_startup --check` holds the exact budget
+        self.assertLess(
+            profile.import_us / 1000, settings.STARTUP_IMPORT_BUDGET_MS * 3,
+            'Slowest imports: ' + ', '.join(r.module for r in profile.top(10))
+        )
+
+
+class WarmupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create(username=f'w{i}', email=f'w{i}@example.com') for i in range(3)]
+        cls.polls = [
+            Poll.objects.create(question=f'Q{i}?', options=['A', 'B'], category=category, created_by=users[0])
+            for i, category in enumerate(['Drama', 'Drama', 'Comedy'])
+        ]
+        for user in users:
+            Vote.objects.create(user=user, poll=cls.polls[1], option='A')
+        cls.polls[1].votes = {'A': 3}
+        cls.polls[1].save()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_primes_categories_and_most_voted_polls(self):
+        report = {step['step']: step['primed'] for step in Warmup(top_polls=1).run()}
+        self.assertEqual(report['categories'], 2)
+        self.assertEqual(report['polls'], 1)
+        self.assertIsNotNone(cache.get(POLL_CACHE_KEY.format(self.polls[1].id)))
+        self.assertIsNone(cache.get(POLL_CACHE_KEY.format(self.polls[0].id)))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('get-available-categories'))
+        self.assertEqual(sorted(response.json()), ['Comedy', 'Drama'])
+
+
+    def test_category_change_invalidates_categories(self):
+        Warmup(top_polls=0).run()
+        poll = Poll.objects.get(id=self.polls[2].id)
+        with self.captureOnCommitCallbacks(execute=True):
+            poll.votes = {'B': 1}
+            poll.save()
+        self.assertIsNotNone(cache.get(POLL_CATEGORIES_CACHE_KEY))
+        with self.captureOnCommitCallbacks(execute=True):
+            poll.category = 'Horror'
+            poll.save()
+        self.assertIsNone(cache.get(POLL_CATEGORIES_CACHE_KEY))
+        self.assertEqual(self.client.get(reverse('get-available-categories')).json(), ['Drama', 'Horror'])
+
+class ORJSONCompatibilityTests(SimpleTestCase):
+    data = {
+        'aware': datetime.datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+        'offset': datetime.datetime(2025, 1, 2, 3, 4, 5, tzinfo=datetime.timezone(datetime.timedelta(hours=2))),
+        'naive': datetime.datetime(2025, 1, 2, 3, 4, 5),
+        'date': datetime.date(2025, 1, 2),
+        'decimal': decimal.Decimal('12.50'),
+        'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'lazy': gettext_lazy('Poll not found'),
+        'text': 'Zoë \u2028 \u2029 "quoted" \\ </script>',
+        'numbers': [0, -1, 2 ** 63 - 1, 1.5, 0.1, 66.67],
+        'votes': {1: 2, 'A': None, True: False},
+        'nested': ({'a': [()]}, set()),
+    }
+
+    def test_renderer_output_is_byte_identical(self):
+        self.assertEqual(ORJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_exponent_floats_differ_only_in_spelling(self):
+        if orjson is None:
+            self.skipTest('orjson is not installed')
+        data = {'large': 1e16, 'small': 1e-7, 'scaled': 1.5e-5, 'negative': -2.5e20}
+        fast, stock = ORJSONRenderer().render(data), JSONRenderer().render(data)
+        # orjson's exact spelling varies between its releases
+        self.assertNotEqual(fast, stock)
+        self.assertEqual(stock, b'{"large":1e+16,"small":1e-07,"scaled":1.5e-05,"negative":-2.5e+20}')
+        self.assertEqual(json.loads(fast), json.loads(stock))
+
+    def test_renderer_falls_back_for_what_orjson_cannot_encode(self):
+        for data, media_type in [({'big': 2 ** 70}, None), (self.data, 'application/json; indent=4')]:
+            with self.subTest(media_type=media_type):
+                self.assertEqual(
+                    ORJSONRenderer().render(data, media_type),
+                    JSONRenderer().render(data, media_type),
+                )
+
+    def test_parser_matches_stock_parser(self):
+        for body in [b'{"option": "A", "voterUserId": 1}', b'[1.5, null, "Zo\xc3\xab"]', b'{"big": 1180591620717411303424}']:
+            with self.subTest(body=body):
+                self.assertEqual(ORJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+
+        for body in [b'{"option": ', b'{"n": NaN}']:
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as stock:
+                    JSONParser().parse(io.BytesIO(body))
+                with self.assertRaises(ParseError) as fast:
+                    ORJSONParser().parse(io.BytesIO(body))
+                self.assertEqual(str(fast.exception), str(stock.exception))
+
+
+@override_settings(STREAMING_CHUNK_SIZE=2)
+class StreamingListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create(username=f's{i}', email=f's{i}@example.com') for i in range(5)]
+        for i, user in enumerate(users):
+            Poll.objects.create(question=f'Zoë {i}?', options=['A', 'B'], category='Drama', created_by=user)
+
+    def test_streamed_dump_matches_regular_response(self):
+        for name in ['get-all-polls', 'get-all-users']:
+            with self.subTest(route=name):
+                regular = self.client.get(reverse(name))
+                streamed = self.client.get(reverse(name), {'stream': 'true'})
+                self.assertTrue(streamed.streaming)
+                self.assertEqual(streamed['Content-Type'], 'application/json')
+                self.assertEqual(b''.join(streamed.streaming_content), regular.content)
+
+    def test_empty_table_streams_an_empty_array(self):
+        Poll.objects.all().delete()
+        response = self.client.get(reverse('get-all-polls'), {'stream': '1'})
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class PollExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create(username=f'e{i}', email=f'e{i}@example.com') for i in range(3)]
+        cls.polls = [
+            Poll.objects.create(
+                question=f'Q{i}, "quoted"?', options=['A', 'B'], votes={'A': 2, 'B': 1},
+                category=category, is_anonymous=anonymous, created_by=cls.users[0],
+            )
+            for i, (category, anonymous) in enumerate([('Drama', False), ('Drama', True), ('Comedy', False)])
+        ]
+        for poll in cls.polls:
+            for user in cls.users:
+                Vote.objects.create(user=user, poll=poll, option='A')
+        cls.staff = User.objects.create(username='staff@example.com', email='staff@example.com', is_staff=True)
+
+    def setUp(self):
+        access = RefreshToken.for_user(self.staff).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {access}'
+
+    def export(self, **params):
+        response = self.client.get(reverse('export-polls'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_tallies_csv_with_filters(self):
+        lines = self.export(dataset='tallies', category='Drama').splitlines()
+        self.assertEqual(lines[0], 'poll_id,category,option,votes')
+        self.assertEqual(lines[1:], [
+            f'{poll.id},Drama,{option},{count}'
+            for poll in self.polls[:2] for option, count in [('A', 2), ('B', 1)]
+        ])
+
+    def test_votes_jsonl_hides_voters_of_anonymous_polls_and_resumes(self):
+        rows = [json.loads(line) for line in self.export(dataset='votes', output='jsonl').splitlines()]
+        self.assertEqual(len(rows), 9)
+        self.assertEqual({row['user_id'] is None for row in rows if row['poll_id'] == self.polls[1].id}, {True})
+        self.assertNotIn(None, [row['user_id'] for row in rows if row['poll_id'] != self.polls[1].id])
+
+        resumed = self.export(dataset='votes', output='jsonl', after=rows[3]['id']).splitlines()
+        self.assertEqual([json.loads(line) for line in resumed], rows[4:])
+
+    def test_polls_csv_quotes_and_date_range(self):
+        lines = self.export(since='2000-01-01').splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn('"Q0, ""quoted""?"', lines[1])
+        self.assertTrue(lines[1].endswith(',3'))
+        self.assertEqual(self.export(until='2000-01-01').splitlines()[1:], [])
+
+    def test_invalid_parameters(self):
+        for params in [
+            {'dataset': 'users'}, {'output': 'xml'}, {'since': 'yesterday'}, {'until': '2025-13-01T00:00'},
+            {'after': 'x'},
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('export-polls'), params).status_code, 400)
+
+    def test_staff_only(self):
+        access = RefreshToken.for_user(self.users[0]).access_token
+        self.assertEqual(self.client.get(reverse('export-polls'), HTTP_AUTHORIZATION=f'Bearer {access}').status_code, 403)
+        del self.client.defaults['HTTP_AUTHORIZATION']
+        self.assertEqual(self.client.get(reverse('export-polls')).status_code, 401)
+
+    def test_command_rejects_bad_dates_and_resume_without_file(self):
+        path = os.path.join(tempfile.mkdtemp(prefix='export-test-'), 'votes.csv')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with self.assertRaisesMessage(CommandError, 'since must be a date'):
+            call_command('export_polls', 'votes', '-o', path, '--since', '2025-13-01T00:00')
+
+        with open(f'{path}.checkpoint', 'w') as f:
+            json.dump({'dataset': 'votes', 'format': 'csv', 'after': 5, 'offset': 120,
+                       'filters': {'category': None, 'since': None, 'until': None}}, f)
+        with self.assertRaisesMessage(CommandError, 'missing or shorter than its checkpoint'):
+            call_command('export_polls', 'votes', '-o', path, '--resume')
+
+
+@override_settings(COMPRESSION_MIN_SIZE=200, STREAMING_CHUNK_SIZE=3)
+class CompressionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='c@example.com', email='c@example.com')
+        cls.polls = [
+            Poll.objects.create(question=f'Question {i}?' * 10, options=['A', 'B'], category='Drama', created_by=user)
+            for i in range(10)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_negotiation(self):
+        self.assertEqual(negotiate('gzip, deflate'), 'gzip')
+        self.assertEqual(negotiate('br;q=1.0, gzip;q=0.5'), 'gzip')  # br not installed here
+        self.assertEqual(negotiate('*'), compression.available_encodings()[0])
+        self.assertIsNone(negotiate('gzip;q=0'))
+        self.assertIsNone(negotiate('identity'))
+        self.assertIsNone(negotiate(''))
+
+    def test_large_responses_are_compressed_small_ones_are_not(self):
+        plain = self.client.get(reverse('get-all-polls'))
+        compressed = self.client.get(reverse('get-all-polls'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertEqual(int(compressed['Content-Length']), len(compressed.content))
+
+        small = self.client.get(reverse('get-available-categories'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', small)
+
+    def test_streamed_responses_are_compressed(self):
+        plain = self.client.get(reverse('get-all-polls'))
+        response = self.client.get(reverse('get-all-polls'), {'stream': 'true'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain.content)
+
+    def test_compressed_variant_of_cached_response_is_reused(self):
+        url = reverse('get-poll-by-id', args=[self.polls[0].id])
+        with mock.patch.object(compression, 'compress', wraps=compression.compress) as compress:
+            first = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+            second = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(gzip.decompress(second.content), self.client.get(url).content)
+
+
+class BinaryFormatTests(TestCase):
+    formats = [
+        (MessagePackRenderer, MessagePackParser, lambda body: msgpack.unpackb(body)),
+        (CBORRenderer, CBORParser, lambda body: cbor2.loads(body)),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='m@example.com', email='m@example.com')
+        cls.poll = Poll.objects.create(question='Which?', options=['A', 'B'], category='Drama', created_by=cls.user)
+
+    def available_formats(self):
+        available = [f for f in self.formats if f[0].available]
+        if not available:
+            self.skipTest('neither msgpack nor cbor2 is installed')
+        return available
+
+    def test_payloads_match_json(self):
+        data = {key: value for key, value in ORJSONCompatibilityTests.data.items() if key != 'votes'}
+        expected = json.loads(JSONRenderer().render(data))
+        for renderer, parser, loads in self.available_formats():
+            with self.subTest(renderer.format):
+                body = renderer().render(data)
+                self.assertEqual(loads(body), expected)
+                self.assertEqual(parser().parse(io.BytesIO(body)), expected)
+                with self.assertRaises(ParseError):
+                    parser().parse(io.BytesIO(b'\xc1\xff'))
+
+    def test_responses_are_negotiated_by_accept(self):
+        url = reverse('get-poll-by-id', args=[self.poll.id])
+        expected = self.client.get(url).json()
+        for renderer, _, loads in self.available_formats():
+            with self.subTest(renderer.format):
+                response = self.client.get(url, HTTP_ACCEPT=renderer.media_type)
+                self.assertEqual(response['Content-Type'], renderer.media_type)
+                self.assertIn('Accept', response['Vary'])
+                self.assertEqual(loads(response.content), expected)
+                # Streaming is JSON only; binary clients get the regular list
+                response = self.client.get(reverse('get-all-polls'), {'stream': 'true'}, HTTP_ACCEPT=renderer.media_type)
+                self.assertFalse(response.streaming)
+                self.assertEqual(loads(response.content)[0]['id'], self.poll.id)
+
+    def test_vote_accepts_binary_body(self):
+        for i, (renderer, _, loads) in enumerate(self.available_formats()):
+            with self.subTest(renderer.format):
+                voter = User.objects.create(username=f'v{i}@example.com', email=f'v{i}@example.com')
+                response = self.client.post(
+                    reverse('vote-on-poll', args=[self.poll.id]),
+                    renderer().render({'option': 'A', 'voterUserId': voter.id}),
+                    content_type=renderer.media_type, HTTP_ACCEPT=renderer.media_type,
+                )
+                self.assertEqual(response.status_code, 200, loads(response.content))
+                self.assertTrue(Vote.objects.filter(poll=self.poll, user=voter, option='A').exists())
+
+    def test_missing_library_is_not_acceptable(self):
+        url = reverse('get-poll-by-id', args=[self.poll.id])
+        with mock.patch.object(MessagePackRenderer, 'available', False), \
+                mock.patch.object(MessagePackParser, 'available', False):
+            self.assertEqual(self.client.get(url, HTTP_ACCEPT='application/msgpack').status_code, 406)
+            response = self.client.post(
+                reverse('vote-on-poll', args=[self.poll.id]), b'\x80', content_type='application/msgpack'
+            )
+            self.assertEqual(response.status_code, 415)
+
+
+class PollAnalyticsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create(username=f'a{i}', email=f'a{i}@example.com') for i in range(3)]
+
+    def create_poll(self, category, options):
+        response = self.client.post(reverse('create-poll'), {
+            'question': f'{category}?', 'options': options, 'category': category,
+            'createdByUserId': self.users[0].id, 'isAnonymous': False, 'visibility': 'PUBLIC',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def vote(self, poll_id, user, option):
+        response = self.client.post(
+            reverse('vote-on-poll', args=[poll_id]), {'option': option, 'voterUserId': user.id},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def stats(self):
+        return {
+            c['category']: (c['pollCount'], c['voteCount'], c['averageOptions'], [p['id'] for p in c['topPolls']])
+            for c in category_analytics(top=2)['categories']
+        }
+
+    def test_aggregates_follow_creates_votes_and_deletes(self):
+        drama = self.create_poll('Drama', ['A', 'B'])
+        drama_hit = self.create_poll('Drama', ['A', 'B', 'C'])
+        comedy = self.create_poll('Comedy', ['A', 'B'])
+        for user in self.users:
+            self.vote(drama_hit, user, 'C')
+        self.vote(drama, self.users[0], 'A')
+        self.assertEqual(self.stats(), {
+            'Comedy': (1, 0, 2.0, [comedy]),
+            'Drama': (2, 4, 2.5, [drama_hit, drama]),
+        })
+
+        # Moving a poll to another category moves its totals
+        poll = Poll.objects.get(id=drama)
+        poll.category = 'Comedy'
+        poll.save()
+        self.assertEqual(self.stats()['Drama'], (1, 3, 3.0, [drama_hit]))
+        self.assertEqual(self.stats()['Comedy'], (2, 1, 2.0, [drama, comedy]))
+
+        response = self.client.delete(reverse('delete-poll', args=[drama_hit]) + f'?userId={self.users[0].id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Drama', self.stats())
+
+        incremental = self.stats()
+        rebuild_category_stats()
+        self.assertEqual(self.stats(), incremental)
+
+    def test_delete_reads_the_poll_in_its_transaction(self):
+        poll_id = self.create_poll('Horror', ['A', 'B'])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.delete(reverse('delete-poll', args=[poll_id]) + f'?userId={self.users[0].id}')
+        statements = [q['sql'] for q in queries.captured_queries]
+        load = next(i for i, sql in enumerate(statements) if sql.startswith('SELECT') and 'FROM "polls"' in sql)
+        self.assertTrue(statements[load - 1].startswith('SAVEPOINT'), statements[:load + 1])
+        self.assertNotIn('Horror', self.stats())
+
+    def test_rebuild_repairs_bulk_changes(self):
+        poll_id = self.create_poll('Horror', ['A', 'B'])
+        Poll.objects.filter(id=poll_id).update(votes={'A': 5, 'B': 2})  # Skips save() and the signals
+        Poll.objects.bulk_create([Poll(question='Bulk?', options=['A'], votes={'A': 1}, category='Horror',
+                                       created_by=self.users[1])])
+        self.assertEqual(self.stats()['Horror'][:2], (1, 0))
+
+        self.assertEqual(rebuild_category_stats(), {'polls': 2, 'categories': 1, 'vote_counts_fixed': 2})
+        self.assertEqual(self.stats()['Horror'][:3], (2, 8, 1.5))
+        self.assertEqual(Poll.objects.get(id=poll_id).vote_count, 7)
+
+    def test_endpoint_reads_one_row_per_category(self):
+        for category in ['Drama', 'Comedy', 'Drama']:
+            self.create_poll(category, ['A', 'B'])
+        with self.assertNumQueries(1 + CategoryStats.objects.count()):
+            response = self.client.get(reverse('get-poll-analytics'), {'top': 1})
+        data = response.json()
+        self.assertEqual((data['totalPolls'], data['totalVotes']), (3, 0))
+        self.assertEqual([c['category'] for c in data['categories']], ['Comedy', 'Drama'])
+        self.assertEqual(len(data['categories'][1]['topPolls']), 1)
+        self.assertEqual(self.client.get(reverse('get-poll-analytics'), {'top': 'x'}).status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], LAST_LOGIN_UPDATE_INTERVAL=60)
+class LoginStampTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='l@example.com', email='l@example.com', password=make_password('secret'))
+
+    def login(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('login'), {'email': 'l@example.com', 'password': 'secret'}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        statements = [q['sql'] for q in queries.captured_queries]
+        self.assertFalse([sql for sql in statements if 'user_profiles' in sql])
+        return [sql for sql in statements if sql.startswith('UPDATE')]
+
+    def test_login_stamps_with_one_narrow_update(self):
+        [update] = self.login()
+        self.assertRegex(update, r'^UPDATE "users" SET "last_login" = .*, "last_login_at" = .* WHERE "users"."id" = ')
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login_at)
+
+    def test_second_login_within_interval_writes_nothing(self):
+        self.login()
+        self.assertEqual(self.login(), [])
+
+        User.objects.filter(pk=self.user.pk).update(last_login_at=timezone.now() - datetime.timedelta(minutes=5))
+        self.assertEqual(len(self.login()), 1)
+
+    def test_record_login_is_coalesced(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.user.record_login())
+        with self.assertNumQueries(0):
+            self.assertFalse(self.user.record_login())
+
+
+class TokenRevocationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='t@example.com', email='t@example.com')
+        cls.other = User.objects.create(username='o@example.com', email='o@example.com')
+
+    def setUp(self):
+        token_blacklist.reset()
+
+    def refresh(self, token):
+        return self.client.post(
+            reverse('refresh-token'), {'refresh_token': str(token)}, content_type='application/json'
+        )
+
+    def test_rotation_revokes_the_presented_token(self):
+        refresh = RefreshToken.for_user(self.user)
+        response = self.refresh(refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()['refreshToken'], str(refresh))
+
+        # Reusing the rotated token fails, the new one works
+        self.assertEqual(self.refresh(refresh).status_code, 401)
+        self.assertEqual(self.refresh(response.json()['refreshToken']).status_code, 200)
+
+    def test_concurrent_reuse_gets_one_new_pair(self):
+        refresh = RefreshToken.for_user(self.user)
+        # Both requests pass the pre-check before either has blacklisted the token
+        with mock.patch.object(token_blacklist, 'is_blacklisted', return_value=False):
+            self.assertEqual(self.refresh(refresh).status_code, 200)
+            self.assertEqual(self.refresh(refresh).status_code, 401)
+
+    @override_settings(TOKEN_BLACKLIST_BLOOM_CAPACITY=10)
+    def test_filter_grows_past_configured_capacity(self):
+        expires_at = timezone.now() + datetime.timedelta(hours=1)
+        BlacklistedToken.objects.bulk_create(
+            [BlacklistedToken(jti=f'revoked-{i}', expires_at=expires_at) for i in range(50)]
+        )
+        self.assertEqual(token_blacklist.load(), 50)
+        with self.assertNumQueries(0):
+            self.assertFalse(token_blacklist.is_blacklisted('never-revoked'))
+        with self.assertNumQueries(1):
+            self.assertTrue(token_blacklist.is_blacklisted('revoked-7'))
+
+    def test_logout_revokes_own_tokens_only(self):
+        refresh = RefreshToken.for_user(self.user)
+        others = RefreshToken.for_user(self.other)
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {refresh.access_token}'}
+
+        response = self.client.post(
+            reverse('logout'), {'refresh_token': str(others)}, content_type='application/json', **auth
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(token_blacklist.is_blacklisted(others['jti']))
+
+        response = self.client.post(
+            reverse('logout'), {'refresh_token': str(refresh)}, content_type='application/json', **auth
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(token_blacklist.is_blacklisted(refresh['jti']))
+        self.assertEqual(self.refresh(refresh).status_code, 401)
+        # The access token is revoked as well
+        self.assertEqual(self.client.post(reverse('logout'), **auth).status_code, 401)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PasswordHashingPoolTests(SimpleTestCase):
+
+    def test_async_helpers_hash_and_check(self):
+        async def run():
+            encoded = await hashing.amake_password('s3cret')
+            user = User(password=encoded)
+            return await hashing.acheck_password(user, 's3cret'), await hashing.acheck_password(user, 'wrong')
+
+        self.assertEqual(asyncio.run(run()), (True, False))
+
+    def test_saturated_pool_does_not_block_the_event_loop(self):
+        pool = hashing.PasswordHashingPool(max_workers=1, max_queue=0, queue_timeout=0.3)
+        release = threading.Event()
+        busy = pool.submit(release.wait)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        async def run():
+            task = asyncio.create_task(ticker())
+            try:
+                with self.assertRaises(hashing.PasswordHashingBusy):
+                    await pool.asubmit(str, 1)
+            finally:
+                task.cancel()
+
+        try:
+            asyncio.run(run())
+        finally:
+            release.set()
+            busy.result()
+        # The loop kept running while the caller waited out the queue timeout
+        self.assertGreater(ticks, 10)
+        self.assertEqual(pool.stats()['rejected'], 1)
+        # The slot is free again once the blocking job is done
+        self.assertEqual(asyncio.run(pool.asubmit(str, 1)), '1')
+
+
+class FailingConnection:
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise ConnectionError('connection reset')
+
+
+@override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=1)
+class OutboxTests(TestCase):
+
+    def test_bodies_are_blanked_once_delivered_or_abandoned(self):
+        sent = outbox.enqueue('a@example.com', 'Your code', 'Code: 123456', '<b>123456</b>')
+        self.assertEqual(outbox.deliver_batch(), (1, 0))
+        self.assertIn('123456', mail.outbox[0].body)
+        sent.refresh_from_db()
+        self.assertEqual((sent.status, sent.body, sent.html_body), (OutboxStatus.SENT, '', ''))
+
+        failed = outbox.enqueue('b@example.com', 'Your code', 'Code: 654321')
+        self.assertEqual(outbox.deliver_batch(connection=FailingConnection()), (0, 1))
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.body), (OutboxStatus.FAILED, ''))
+
+    def test_finished_emails_are_purged_after_retention(self):
+        old = timezone.now() - datetime.timedelta(days=8)
+        for status in [OutboxStatus.SENT, OutboxStatus.FAILED, OutboxStatus.PENDING]:
+            OutboxEmail.objects.create(to_email='c@example.com', subject='s', body='', status=status, created_at=old)
+        recent = OutboxEmail.objects.create(to_email='c@example.com', subject='s', body='', status=OutboxStatus.SENT)
+        self.assertEqual(outbox.purge_finished(batch_size=1), 2)
+        self.assertEqual(
+            set(OutboxEmail.objects.values_list('status', flat=True)), {OutboxStatus.PENDING, recent.status}
+        )
+
+    def test_admin_hides_bodies(self):
+        fields = admin.site.get_model_admin(OutboxEmail).get_fields(request=None)
+        self.assertNotIn('body', fields)
+        self.assertNotIn('html_body', fields)
+
+
+class FakeSMTP:
+    instances = []
+    fail = False
+
+    def __init__(self, *args, **kwargs):
+        self.sent = []
+        self.closed = False
+        FakeSMTP.instances.append(self)
+
+    def noop(self):
+        return (250, b'OK')
+
+    def sendmail(self, from_addr, to_addrs, message):
+        if FakeSMTP.fail:
+            raise smtplib.SMTPServerDisconnected('gone')
+        self.sent.append(to_addrs)
+
+    def quit(self):
+        self.closed = True
+
+    close = quit
+
+
+class SMTPConnectionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        FakeSMTP.instances, FakeSMTP.fail = [], False
+        connection_pool.clear()
+        patcher = mock.patch('smtplib.SMTP', FakeSMTP)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(connection_pool.clear)
+
+    def send(self, fail_silently=False):
+        backend = CustomSMTPEmailBackend(
+            host='smtp.example.com', port=25, username='', password='',
+            use_tls=False, use_ssl=False, fail_silently=fail_silently, pool=True,
+        )
+        return backend.send_messages([mail.EmailMessage('Hi', 'Body', 'from@example.com', ['to@example.com'])])
+
+    def test_sessions_are_reused(self):
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(len(FakeSMTP.instances), 1)
+        self.assertEqual(len(FakeSMTP.instances[0].sent), 2)
+
+    def test_silently_failed_session_is_not_pooled(self):
+        self.send()
+        FakeSMTP.fail = True
+        self.assertEqual(self.send(fail_silently=True), 0)
+        self.assertTrue(FakeSMTP.instances[0].closed)
+        FakeSMTP.fail = False
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(len(FakeSMTP.instances), 2)
+
+    def test_forked_child_starts_with_an_empty_pool(self):
+        connection_pool.release('key', PooledConnection(FakeSMTP()))
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # Child: report and leave without running any cleanup
+            os.write(write, str(connection_pool.stats()['idle']).encode())
+            os._exit(0)
+        os.close(write)
+        os.waitpid(pid, 0)
+        with os.fdopen(read) as f:
+            self.assertEqual(f.read(), '0')
+        self.assertEqual(connection_pool.stats()['idle'], 1)
+        self.assertFalse(FakeSMTP.instances[0].closed)
+
+
+class EmailServiceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.voters = [
+            User.objects.create(username=f'voter{i}@example.com', email=f'voter{i}@example.com', first_name=f'V{i}')
+            for i in range(3)
+        ]
+        cls.poll = Poll.objects.create(
+            question='Which?', options=['A', 'B'], votes={'A': 2, 'B': 1}, category='Drama',
+            created_by=cls.voters[0], duration=timezone.now() - datetime.timedelta(minutes=1),
+        )
+        for voter, option in zip(cls.voters, ['A', 'A', 'B']):
+            Vote.objects.create(user=voter, poll=cls.poll, option=option)
+
+    def recipients(self, *emails):
+        context = {'question': 'Which?', 'winner': 'A', 'winner_votes': 2, 'total_votes': 3}
+        return [(email, dict(context) if email != 'broken@example.com' else {}) for email in emails]
+
+    def refusing(self, backend):
+        """Patch the backend to fail any batch with refused@example.com in it; returns the batch sizes"""
+        batches = []
+        send_messages = backend.send_messages
+
+        def refuse(messages):
+            batches.append(len(messages))
+            if any(m.to == ['refused@example.com'] for m in messages):
+                raise smtplib.SMTPRecipientsRefused({})
+            return send_messages(messages)
+
+        patcher = mock.patch.object(backend, 'send_messages', refuse)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return batches
+
+    def test_bulk_send_batches_chunks_and_skips_failed_recipients(self):
+        recipients = self.recipients(
+            'ok1@example.com', 'ok2@example.com', 'broken@example.com',  # Missing slots: fails to render
+            'refused@example.com', 'ok3@example.com', 'ok4@example.com',
+        )
+        backend = mail.get_connection()
+        batches = self.refusing(backend)
+        self.assertEqual(EmailService.send_bulk(POLL_CLOSED, recipients, chunk_size=3, connection=backend), 4)
+        # One batch per chunk; only the failed chunk is retried one by one
+        self.assertEqual(batches, [2, 3, 1, 1, 1])
+        self.assertEqual([m.to[0] for m in mail.outbox], [
+            'ok1@example.com', 'ok2@example.com', 'ok3@example.com', 'ok4@example.com',
+        ])
+
+    def test_bulk_send_stops_when_server_is_unreachable(self):
+        recipients = self.recipients('refused@example.com', 'ok1@example.com', 'ok2@example.com')
+        backend = mail.get_connection()
+        self.refusing(backend)
+        with mock.patch.object(backend, 'open', side_effect=[None, OSError('connection refused')]):
+            with self.assertLogs('core.email_service', 'ERROR') as logs:
+                self.assertEqual(EmailService.send_bulk(POLL_CLOSED, recipients, chunk_size=2, connection=backend), 0)
+        self.assertIn('Sent 0, failed 2', logs.output[-1])
+        self.assertEqual(mail.outbox, [])
+
+    def test_closing_expired_polls_announces_once(self):
+        call_command('close_expired_polls', stdout=io.StringIO())
+        self.poll.refresh_from_db()
+        self.assertFalse(self.poll.is_active)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [v.email for v in self.voters])
+        self.assertIn('Which?', mail.outbox[0].subject)
+
+        call_command('close_expired_polls', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReadReplicaRouterTests(SimpleTestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        self.router = ReadReplicaRouter()
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Poll), 'replica')
+        self.assertIsNone(self.router.db_for_read(Permission))
+
+    def test_reads_inside_transaction_stay_on_primary(self):
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Poll), 'default')
+        self.assertEqual(self.router.db_for_read(Poll), 'replica')
+
+    def test_use_primary(self):
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Poll), 'default')
+
+    def test_write_pins_rest_of_request_and_next_requests(self):
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(Poll))
+            self.router.db_for_write(Poll)
+            reads.append(self.router.db_for_read(Poll))
+            return HttpResponse()
+
+        middleware = ReplicaStickinessMiddleware(view)
+        response = middleware(RequestFactory().post('/'))
+        self.assertEqual(reads, ['replica', 'default'])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        reads.clear()
+        request = RequestFactory().get('/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        middleware(request)
+        self.assertEqual(reads[0], 'default')
+
+    def test_cache_recompute_reads_primary(self):
+        key = f'router-test:{uuid.uuid4()}'
+        try:
+            self.assertEqual(get_or_compute(key, lambda: self.router.db_for_read(Poll), timeout=5), 'default')
+        finally:
+            cache.delete(key)
+
+
+class TwoTierCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        location = tempfile.mkdtemp(prefix='two-tier-test-')
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        override = override_settings(CACHES={**settings.CACHES, 'two_tier_l2': shared})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def worker(self):
+        """A cache as seen from another process: its own L1, the same L2"""
+        return TwoTierCache('', {'OPTIONS': {'L2': 'two_tier_l2', 'SYNC_INTERVAL': 0}})
+
+    def test_write_evicts_other_workers_l1(self):
+        a, b = self.worker(), self.worker()
+        a.set('k', 1)
+        self.assertEqual(b.get('k'), 1)
+        a.set('k', 2)
+        self.assertEqual(b.get('k'), 2)
+        a.delete('k')
+        self.assertIsNone(b.get('k'))
+
+    def test_clear_evicts_other_workers_l1(self):
+        a, b = self.worker(), self.worker()
+        a.set('k', 1)
+        b.get('k')
+        a.clear()
+        self.assertIsNone(b.get('k'))
+        self.assertEqual(b.stats()['l1_entries'], 0)
+
+    def test_concurrent_publishes_get_distinct_generations(self):
+        workers = [self.worker() for _ in range(4)]
+
+        def write(cache):
+            for i in range(25):
+                cache.set(f'k{i}', i)
+
+        threads = [threading.Thread(target=write, args=(w,)) for w in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(workers[0].l2.get(GENERATION_KEY), 100)
+
+    def test_stats_count_every_get(self):
+        cache = self.worker()
+        cache.set('k', 1)
+
+        def read():
+            for _ in range(500):
+                cache.get('k')
+                cache.get('missing')
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = cache.stats()
+        self.assertEqual(stats['l1_hits'] + stats['l1_misses'], 8000)
+        self.assertEqual(stats['l2_misses'], 4000)
+
+
+@override_settings(CACHE_LOCK_TIMEOUT=5)
+class GetOrComputeTests(SimpleTestCase):
+
+    def setUp(self):
+        self.key = f'get-or-compute-test:{uuid.uuid4()}'
+        self.addCleanup(cache.delete, self.key)
+        self.calls = 0
+
+    def compute(self, value='ours', delay=0):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def other_worker(self, finish):
+        """Hold the shared lock from another thread's cache instance, as another process would"""
+        locked = threading.Event()
+
+        def hold():
+            other = caches['default']
+            other.add(f'{self.key}:lock', 1, 5)
+            locked.set()
+            time.sleep(0.2)
+            finish(other)
+            other.delete(f'{self.key}:lock')
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        self.addCleanup(thread.join)
+        locked.wait()
+
+    def test_concurrent_misses_compute_once(self):
+        results = []
+        compute = self.compute(delay=0.2)
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_compute(self.key, compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['ours'] * 8)
+        self.assertEqual(self.calls, 1)
+
+    def test_waits_for_value_computed_by_other_process(self):
+        self.other_worker(lambda other: other.set(self.key, ('theirs', time.time() + 60, 0.1), 60))
+        self.assertEqual(get_or_compute(self.key, self.compute()), 'theirs')
+        self.assertEqual(self.calls, 0)
+
+    def test_stops_waiting_when_other_process_gives_up(self):
+        self.other_worker(lambda other: None)
+        started = time.monotonic()
+        self.assertEqual(get_or_compute(self.key, self.compute()), 'ours')
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(self.calls, 1)
+
+
+class QueueListenerHandlerTests(SimpleTestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.log')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        target = logging.FileHandler(self.path)
+        self.addCleanup(target.close)
+        self.handler = QueueListenerHandler([target])
+        self.addCleanup(self.handler.close)
+        self.logger = logging.Logger('queue-listener-test')
+        self.logger.addHandler(self.handler)
+
+    def test_project_logging_config_loads(self):
+        logging.config.dictConfig(settings.LOGGING)
+        [handler] = logging.getLogger('core').handlers
+        self.assertIsInstance(handler, QueueListenerHandler)
+        self.assertEqual(
+            [type(target).__name__ for target in handler.listener.handlers], ['StreamHandler', 'RotatingFileHandler']
+        )
+
+    def test_records_reach_target(self):
+        self.logger.warning('from parent')
+        self.handler.stop()
+        with open(self.path) as f:
+            self.assertEqual(f.read(), 'from parent\n')
+
+    def test_forked_child_still_logs(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self.logger.warning('from child')
+                self.handler.stop()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), 'from child\n')
+
+
+class MetricsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='metrics-test-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        override = override_settings(METRICS_DIR=self.directory, METRICS_FLUSH_INTERVAL=0.05)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def dead_pid(self):
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0)
+        os.waitpid(pid, 0)
+        return pid
+
+    def test_snapshot_written_off_the_request_thread(self):
+        metrics = ProcessMetrics()
+        self.addCleanup(setattr, metrics, '_flusher_pid', None)  # Stops the thread
+        flushed_on = []
+        flushed = threading.Event()
+
+        def flush():
+            flushed_on.append(threading.current_thread())
+            flushed.set()
+
+        with mock.patch.object(metrics, 'flush', flush):
+            metrics.started()
+            metrics.finished('poll-list', 'GET', 200, 0.01, 2, 0.001, 100)
+            self.assertTrue(flushed.wait(2))
+        self.assertNotIn(threading.current_thread(), flushed_on)
+
+    def test_dead_workers_are_folded_into_retired_snapshot(self):
+        metrics = ProcessMetrics()
+        metrics.finished('poll-list', 'GET', 200, 0.01, 2, 0.001, 100)
+        snapshot = metrics.snapshot()
+        for _ in range(2):
+            pid = self.dead_pid()
+            with open(os.path.join(self.directory, f'{pid}.json'), 'w') as f:
+                json.dump({**snapshot, 'pid': pid}, f)
+
+        for _ in range(2):
+            merged = aggregate()
+            self.assertEqual(merged['requests'][('poll-list', 'GET', 200)], 2)
+            self.assertEqual(merged['in_flight'], 0)
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted([f'{os.getpid()}.json', RETIRED_SNAPSHOT, 'retire.lock']))
+
+    def test_exposition_escapes_labels_and_types_counters(self):
+        metrics = ProcessMetrics()
+        metrics.finished('say "hi"\\n\n', 'GET', 200, 0.01, 2, 0.001, 100)
+        pid = self.dead_pid()
+        with open(os.path.join(self.directory, f'{pid}.json'), 'w') as f:
+            json.dump({**metrics.snapshot(), 'pid': pid}, f)
+        text = render_prometheus(aggregate())
+        self.assertIn('route="say \\"hi\\"\\\\n\\n"', text)
+        self.assertIn('# TYPE password_hashing_rejected_total counter\n', text)
+        self.assertIn('# TYPE password_hashing_queue_depth gauge\n', text)
+
+    def test_metrics_view_is_restricted(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.7').status_code, 403)
+        with override_settings(METRICS_TOKEN='scrape-secret'):
+            response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.7', HTTP_AUTHORIZATION='Bearer scrape-secret')
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.7', HTTP_AUTHORIZATION='Bearer wrong')
+            self.assertEqual(response.status_code, 403)
+
+
+class SQLiteProfileTests(SimpleTestCase):
+    """The production SQLite settings, on a fresh file database (tests otherwise run in memory)"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='sqlite-profile-test-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'profile.sqlite3')
+        # A wrapper of our own, outside `connections`, like a new worker's
+        wrapper_class = type(connections['default'])
+        self.connection = wrapper_class({**settings.DATABASES['default'], 'NAME': self.path}, alias='profile')
+        self.addCleanup(self.connection.close)
+
+    def test_pragmas_are_applied_on_connect(self):
+        with self.connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 20000)
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)  # NORMAL
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (n INTEGER)')
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+        # What transaction.atomic() runs to open a transaction on SQLite
+        self.connection._start_transaction_under_autocommit()
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM t')
+            # BEGIN IMMEDIATE: even a transaction that has only read holds the lock
+            with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+                other.execute('INSERT INTO t VALUES (1)')
+        finally:
+            self.connection.rollback()
@@ -0,0 +1,166 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import BlacklistedToken
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter used as an in-memory pre-check for revoked JTIs.
+
+    A miss is definitive (the JTI was never added), a hit only means
+    "maybe" and has to be confirmed against the database.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        bits = -self.capacity * math.log(error_rate) / (math.log(2) ** 2)
+        self.num_bits = max(int(math.ceil(bits)), 8)
+        self.num_hashes = max(int(round(self.num_bits / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class TokenBlacklist:
+    """
+    Revoked token store backed by the ``token_blacklist`` table.
+
+    Each process keeps a Bloom filter of blacklisted JTIs so that the common
+    case (a token that was never revoked) is answered without touching the
+    database. Rows written by other workers are picked up incrementally by
+    primary key every ``TOKEN_BLACKLIST_SYNC_INTERVAL`` seconds, so a token
+    revoked in another process is still accepted here for up to that long.
+
+    The filter is sized for TOKEN_BLACKLIST_BLOOM_CAPACITY or twice the live
+    rows, whichever is larger, and rebuilt only once it fills up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    @property
+    def capacity(self):
+        return getattr(settings, 'TOKEN_BLACKLIST_BLOOM_CAPACITY', 100000)
+
+    @property
+    def error_rate(self):
+        return getattr(settings, 'TOKEN_BLACKLIST_BLOOM_ERROR_RATE', 0.001)
+
+    @property
+    def sync_interval(self):
+        return getattr(settings, 'TOKEN_BLACKLIST_SYNC_INTERVAL', 5)
+
+    def reset(self):
+        """Drop the in-memory filter; it is rebuilt from the database on next use"""
+        with self._lock:
+            self._bloom = None
+            self._last_id = 0
+            self._synced_at = 0.0
+
+    def _rebuild(self):
+        # Headroom for growth: a filter sized to the current rows would be
+        # over capacity again, and rebuilt, on the next revocation
+        live = BlacklistedToken.objects.filter(expires_at__gt=timezone.now()).count()
+        self._bloom = BloomFilter(max(self.capacity, 2 * live), self.error_rate)
+        self._last_id = 0
+        self._load_new_rows()
+
+    def _load_new_rows(self):
+        rows = (
+            BlacklistedToken.objects
+            .filter(id__gt=self._last_id, expires_at__gt=timezone.now())
+            .order_by('id')
+            .values_list('id', 'jti')
+        )
+        for row_id, jti in rows.iterator(chunk_size=5000):
+            self._bloom.add(jti)
+            self._last_id = row_id
+        self._synced_at = time.monotonic()
+
+    def _ensure_synced(self):
+        with self._lock:
+            if self._bloom is None or self._bloom.count > self._bloom.capacity:
+                self._rebuild()
+            elif time.monotonic() - self._synced_at >= self.sync_interval:
+                self._load_new_rows()
+
+    def load(self):
+        """Sync the filter now rather than on first use; returns the number of JTIs held"""
+        self._ensure_synced()
+        return self._bloom.count
+
+    def is_blacklisted(self, jti):
+        """Return True if the given JTI has been revoked and has not expired yet"""
+        if not jti:
+            return False
+        self._ensure_synced()
+        if jti not in self._bloom:
+            return False
+        return BlacklistedToken.objects.filter(jti=jti, expires_at__gt=timezone.now()).exists()
+
+    def add(self, token):
+        """
+        Revoke a validated simplejwt token until its ``exp`` claim.
+
+        Returns False if the token was already blacklisted.
+        """
+        jti = token[settings.SIMPLE_JWT['JTI_CLAIM']]
+        expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+        _, created = BlacklistedToken.objects.get_or_create(
+            jti=jti,
+            defaults={'expires_at': expires_at}
+        )
+        self._ensure_synced()
+        with self._lock:
+            self._bloom.add(jti)
+        return created
+
+    def purge_expired(self, batch_size=1000):
+        """
+        Delete expired entries in primary-key batches so the table lock is
+        never held for long. Returns the number of rows removed.
+        """
+        now = timezone.now()
+        deleted = 0
+        while True:
+            ids = list(
+                BlacklistedToken.objects
+                .filter(expires_at__lte=now)
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            count, _ = BlacklistedToken.objects.filter(id__in=ids).delete()
+            deleted += count
+        if deleted:
+            logger.info(f"Purged {deleted} expired blacklisted tokens")
+            self.reset()
+        return deleted
+
+
+token_blacklist = TokenBlacklist()
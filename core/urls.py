@@ -9,7 +9,7 @@ from .views import (
     # Poll management views
     get_all_polls, get_poll_by_id, create_poll, vote_on_poll, delete_poll,
     get_polls_by_category, get_polls_by_user, get_polls_by_visibility,
-    get_poll_statistics, get_available_categories, polls_health_check,
+    get_poll_statistics, get_available_categories, get_poll_analytics, export_polls, polls_health_check,
     # Legacy viewsets
     PollViewSet, VoteViewSet, UserViewSet, UserProfileUpdateView
 )
@@ -60,6 +60,8 @@ urlpatterns = [
     path('polls/visibility/<str:visibility>/', get_polls_by_visibility, name='get-polls-by-visibility'),
     path('polls/<int:id>/statistics/', get_poll_statistics, name='get-poll-statistics'),
     path('polls/categories/', get_available_categories, name='get-available-categories'),
+    path('polls/analytics/', get_poll_analytics, name='get-poll-analytics'),
+    path('polls/export/', export_polls, name='export-polls'),
     path('polls/health/', polls_health_check, name='polls-health-check'),
     
     # ==================== LEGACY ROUTES (for backward compatibility) ====================
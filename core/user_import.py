@@ -0,0 +1,186 @@
+import csv
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth import hashers
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import User, UserProfile
+from .serializers import ImportUserRowSerializer
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+def detect_format(path):
+    return FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+def read_rows(f, fmt):
+    """
+    Stream ``(line, row, error)`` from a CSV (header row required) or JSON
+    Lines file object. Only one row is held in memory at a time.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, {k: v for k, v in row.items() if k is not None}, None
+        return
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, 'Expected a JSON object'
+            continue
+        yield line_number, row, None
+
+
+class UserImporter:
+    """
+    Import users in batches of ``batch_size`` rows.
+
+    Per batch: validate rows (ImportUserRowSerializer), drop emails repeated
+    in the batch or already in the database (one query), hash raw passwords
+    across a process pool, then bulk_create the users and their profiles in
+    one transaction. Rows are never accumulated beyond a batch, and rejected
+    rows go to ``on_reject(line, row, reason)`` as they occur, so memory does
+    not grow with the file. Emails repeated across batches are caught by the
+    database check of the later batch.
+    """
+
+    def __init__(self, batch_size=1000, workers=None, dry_run=False, on_reject=None):
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 2
+        self.dry_run = dry_run
+        self.on_reject = on_reject or (lambda line, row, reason: None)
+        self._executor = None
+        self.counts = {'read': 0, 'created': 0, 'rejected': 0}
+
+    def run(self, rows):
+        started = time.perf_counter()
+        try:
+            rows = iter(rows)
+            while batch := list(itertools.islice(rows, self.batch_size)):
+                self.import_batch(batch)
+                logger.info('User import progress: %s', self.counts)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        return dict(self.counts, seconds=round(time.perf_counter() - started, 2))
+
+    def reject(self, line, row, reason):
+        self.counts['rejected'] += 1
+        self.on_reject(line, row, reason)
+
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                # Spawned workers inherit DJANGO_SETTINGS_MODULE but must load the settings
+                initializer=django.setup,
+            )
+        return self._executor
+
+    def validate(self, batch):
+        """Valid rows of ``batch`` as (line, row, email, data), unique by email"""
+        valid = {}
+        for line, row, error in batch:
+            self.counts['read'] += 1
+            if error:
+                self.reject(line, row, error)
+                continue
+            serializer = ImportUserRowSerializer(data=row)
+            if not serializer.is_valid():
+                self.reject(line, row, serializer.errors)
+                continue
+            email = User.objects.normalize_email(serializer.validated_data['email'])
+            if email in valid:
+                self.reject(line, row, 'Duplicate email in file')
+                continue
+            valid[email] = (line, row, email, serializer.validated_data)
+
+        # Usernames are the email too (see CreateUserRequestSerializer)
+        emails = list(valid)
+        taken = set()
+        for email, username in User.objects.filter(
+            Q(email__in=emails) | Q(username__in=emails)
+        ).values_list('email', 'username'):
+            taken.update((email, username))
+        accepted = []
+        for email, entry in valid.items():
+            if email in taken:
+                self.reject(entry[0], entry[1], 'User with this email already exists')
+            else:
+                accepted.append(entry)
+        return accepted
+
+    def hash_passwords(self, entries):
+        raw = [data['password'] for _, _, _, data in entries if data.get('password')]
+        hashed = iter(())
+        if raw:
+            chunksize = max(1, len(raw) // (self.workers * 4))
+            hashed = self.executor().map(hashers.make_password, raw, chunksize=chunksize)
+        passwords = []
+        for _, _, _, data in entries:
+            if data.get('password'):
+                passwords.append(next(hashed))
+            elif data.get('passwordHash'):
+                passwords.append(data['passwordHash'])
+            else:
+                passwords.append(hashers.make_password(None))
+        return passwords
+
+    def build_user(self, email, data, password):
+        return User(
+            username=email,
+            email=email,
+            password=password,
+            first_name=data.get('firstName', ''),
+            last_name=data.get('lastName', ''),
+            phone_number=data.get('phoneNumber', ''),
+        )
+
+    def import_batch(self, batch):
+        entries = self.validate(batch)
+        if self.dry_run:
+            # Counted as if created, so a dry run previews the real outcome
+            self.counts['created'] += len(entries)
+            return
+        if not entries:
+            return
+        passwords = self.hash_passwords(entries)
+        users = [self.build_user(email, data, password) for (_, _, email, data), password in zip(entries, passwords)]
+        try:
+            with transaction.atomic():
+                self.insert(users)
+            self.counts['created'] += len(users)
+        except IntegrityError:
+            # Someone registered one of these emails since we checked: go row by row
+            for (line, row, _, _), user in zip(entries, users):
+                try:
+                    with transaction.atomic():
+                        self.insert([user])
+                    self.counts['created'] += 1
+                except IntegrityError:
+                    self.reject(line, row, 'User with this email already exists')
+
+    def insert(self, users):
+        User.objects.bulk_create(users)
+        # Works whether or not the backend returns ids from bulk inserts
+        ids = User.objects.filter(email__in=[u.email for u in users]).values_list('id', flat=True)
+        UserProfile.objects.bulk_create([UserProfile(user_id=user_id) for user_id in ids])
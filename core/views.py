@@ -2,19 +2,29 @@ from django.shortcuts import render
 from rest_framework import viewsets, permissions, generics, status
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
 from django.contrib.auth import authenticate
 from django.utils import timezone
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.models import Q
+import logging
 import random
 import string
 from datetime import datetime, timedelta
-from google.oauth2 import id_token
-from google.auth.transport import requests
 
-from .models import User, UserProfile, Poll, Vote, LoyaltyTier, PollVisibility
+from .models import (
+    User, UserProfile, Poll, Vote, LoyaltyTier, PollVisibility,
+    POLL_CACHE_KEY, POLL_STATISTICS_CACHE_KEY, POLL_CATEGORIES_CACHE_KEY
+)
+from .analytics import category_analytics
+from .cache import get_or_compute
+from .compression import cache_compressed
+from .exports import FORMATS as EXPORT_FORMATS, ExportError, PollExport
+from .streaming import stream_json_list, streaming_response, wants_stream
 from .serializers import (
     UserSerializer, CreateUserRequestSerializer, UpdateUserRequestSerializer,
     AddLoyaltyPointsRequestSerializer, LoginRequestSerializer, RegisterRequestSerializer,
@@ -23,7 +33,11 @@ from .serializers import (
     CreatePollRequestSerializer, VoteRequestSerializer, HealthResponseSerializer,
     PollStatisticsSerializer, UserProfileSerializer, VoteSerializer
 )
-from .email_service import EmailService
+from .token_blacklist import token_blacklist
+from . import hashing
+from .hashing import PasswordHashingBusy
+
+logger = logging.getLogger(__name__)
 
 # ==================== AUTHENTICATION VIEWS ====================
 
@@ -34,7 +48,7 @@ def register(request):
     serializer = RegisterRequestSerializer(data=request.data)
     if serializer.is_valid():
         try:
-            user = User.objects.create_user(
+            user = hashing.create_user(
                 username=serializer.validated_data['email'],
                 email=serializer.validated_data['email'],
                 password=serializer.validated_data['password'],
@@ -51,11 +65,14 @@ def register(request):
                 'success': True,
                 'message': 'Registration successful',
                 'token': token,
+                'refreshToken': str(refresh),
                 'user': UserSerializer(user).data,
                 'expiresIn': 3600
             }
             
             return Response(response_data, status=status.HTTP_201_CREATED)
+        except PasswordHashingBusy:
+            raise
         except Exception as e:
             return Response({
                 'success': False,
@@ -81,16 +98,15 @@ def login(request):
         # Try to authenticate with email
         try:
             user = User.objects.get(email=email)
-            if user.check_password(password):
+            if hashing.check_password(user, password):
                 if not user.is_active:
                     return Response({
                         'success': False,
                         'message': 'Account is deactivated'
                     }, status=status.HTTP_400_BAD_REQUEST)
                 
-                # Update last login
-                user.last_login_at = timezone.now()
-                user.save()
+                # Update last login (single narrow UPDATE, coalesced per user)
+                user.record_login()
                 
                 # Generate token
                 refresh = RefreshToken.for_user(user)
@@ -100,6 +116,7 @@ def login(request):
                     'success': True,
                     'message': 'Login successful',
                     'token': token,
+                    'refreshToken': str(refresh),
                     'user': UserSerializer(user).data,
                     'expiresIn': 86400 if remember_me else 3600
                 }
@@ -128,12 +145,45 @@ def refresh_token(request):
     """Token refresh endpoint matching Spring Boot /api/auth/refresh"""
     serializer = RefreshTokenRequestSerializer(data=request.data)
     if serializer.is_valid():
-        # In a real implementation, you would validate the refresh token
-        # For now, just return a new token
+        try:
+            refresh = RefreshToken(serializer.validated_data['refresh_token'])
+        except TokenError:
+            return Response({
+                'success': False,
+                'message': 'Invalid or expired refresh token'
+            }, status=status.HTTP_401_UNAUTHORIZED)
+        
+        if token_blacklist.is_blacklisted(refresh.get('jti')):
+            return Response({
+                'success': False,
+                'message': 'Refresh token has been revoked'
+            }, status=status.HTTP_401_UNAUTHORIZED)
+        
+        user_id = refresh.get(settings.SIMPLE_JWT['USER_ID_CLAIM'])
+        if not User.objects.filter(id=user_id, is_active=True).exists():
+            return Response({
+                'success': False,
+                'message': 'Account is deactivated'
+            }, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # Rotate: revoke the presented token and hand out a fresh one. The
+        # blacklist insert is the real reuse check: of two concurrent
+        # refreshes with one token, only the one that inserts it wins
+        if settings.SIMPLE_JWT.get('ROTATE_REFRESH_TOKENS'):
+            if settings.SIMPLE_JWT.get('BLACKLIST_AFTER_ROTATION') and not token_blacklist.add(refresh):
+                return Response({
+                    'success': False,
+                    'message': 'Refresh token has been revoked'
+                }, status=status.HTTP_401_UNAUTHORIZED)
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+        
         return Response({
             'success': True,
             'message': 'Token refreshed',
-            'token': 'new_token_here',
+            'token': str(refresh.access_token),
+            'refreshToken': str(refresh),
             'expiresIn': 3600
         }, status=status.HTTP_200_OK)
     
@@ -146,7 +196,25 @@ def refresh_token(request):
 @permission_classes([IsAuthenticated])
 def logout(request):
     """Logout endpoint matching Spring Boot /api/auth/logout"""
-    # In a real implementation, you would invalidate the token
+    # The refresh token too, if the client sent one, but only the caller's own
+    refresh = None
+    raw_refresh = request.data.get('refresh_token')
+    if raw_refresh:
+        try:
+            refresh = RefreshToken(raw_refresh)
+        except TokenError:
+            pass
+    if refresh is not None and str(refresh.get(settings.SIMPLE_JWT['USER_ID_CLAIM'])) != str(request.user.pk):
+        return Response({
+            'message': 'Refresh token does not belong to this user'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    # Revoke the access token used for this request
+    if request.auth is not None:
+        token_blacklist.add(request.auth)
+    if refresh is not None:
+        token_blacklist.add(refresh)
+    
     return Response({
         'message': 'Logout successful'
     }, status=status.HTTP_200_OK)
@@ -158,6 +226,9 @@ otp_store = {}
 @permission_classes([AllowAny])
 def forgot_password(request):
     """Forgot password endpoint matching Spring Boot /api/auth/forgot"""
+    # Imported on first use to keep worker startup light (see core.startup)
+    from .email_service import EmailService
+
     serializer = ForgotPasswordRequestSerializer(data=request.data)
     if serializer.is_valid():
         email = serializer.validated_data['email']
@@ -170,11 +241,11 @@ def forgot_password(request):
                 'expires_at': timezone.now() + timedelta(minutes=10)
             }
             
-            # Send OTP via email
+            # Queue OTP email; the outbox worker delivers it
             user_name = f"{user.first_name} {user.last_name}".strip() if user.first_name or user.last_name else None
-            email_sent = EmailService.send_otp_email(email, otp, user_name)
+            email_queued = EmailService.queue_otp_email(email, otp, user_name)
             
-            if email_sent:
+            if email_queued:
                 return Response({
                     'message': f'OTP sent to {email}'
                 }, status=status.HTTP_200_OK)
@@ -219,9 +290,10 @@ def verify_otp(request):
 @permission_classes([AllowAny])
 def reset_password(request):
     """Reset password endpoint matching Spring Boot /api/auth/reset-password"""
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.info(f"Reset password request data: {request.data}")
+    from .email_service import EmailService
+
+    # Never log request.data here: it carries the OTP and the new password
+    logger.debug("Reset password request for %s", request.data.get('email'))
     
     serializer = ResetPasswordRequestSerializer(data=request.data)
     if serializer.is_valid():
@@ -233,14 +305,14 @@ def reset_password(request):
         if entry and entry['otp'] == otp and timezone.now() <= entry['expires_at']:
             try:
                 user = User.objects.get(email=email)
-                user.set_password(new_password)
+                hashing.set_password(user, new_password)
                 user.save()
                 # Remove OTP from store
                 del otp_store[email]
                 
-                # Send confirmation email
+                # Queue confirmation email
                 user_name = f"{user.first_name} {user.last_name}".strip() if user.first_name or user.last_name else None
-                EmailService.send_password_reset_confirmation(email, user_name)
+                EmailService.queue_password_reset_confirmation(email, user_name)
                 
                 return Response({
                     'message': 'Password updated successfully'
@@ -264,6 +336,10 @@ def reset_password(request):
 @permission_classes([AllowAny])
 def google_auth(request):
     """Google OAuth authentication endpoint"""
+    # google-auth pulls in requests, urllib3 and cryptography: only load them when used
+    from google.oauth2 import id_token
+    from google.auth.transport import requests
+
     serializer = GoogleAuthRequestSerializer(data=request.data)
     if serializer.is_valid():
         id_token_string = serializer.validated_data['idToken']
@@ -289,11 +365,15 @@ def google_auth(request):
             try:
                 user = User.objects.get(email=email)
                 # Update user info if needed
+                update_fields = []
                 if not user.first_name and first_name:
                     user.first_name = first_name
+                    update_fields.append('first_name')
                 if not user.last_name and last_name:
                     user.last_name = last_name
-                user.save()
+                    update_fields.append('last_name')
+                if update_fields:
+                    user.save(update_fields=update_fields + ['updated_at'])
             except User.DoesNotExist:
                 # Create new user
                 user = User.objects.create_user(
@@ -301,13 +381,12 @@ def google_auth(request):
                     email=email,
                     first_name=first_name,
                     last_name=last_name,
-                    # Set a random password since Google users don't have passwords
-                    password=User.objects.make_random_password()
+                    # Google users don't have passwords; an unusable one skips hashing
+                    password=None
                 )
             
             # Update last login
-            user.last_login_at = timezone.now()
-            user.save()
+            user.record_login()
             
             # Generate JWT token
             refresh = RefreshToken.for_user(user)
@@ -317,6 +396,7 @@ def google_auth(request):
                 'success': True,
                 'message': 'Google authentication successful',
                 'token': token,
+                'refreshToken': str(refresh),
                 'user': UserSerializer(user).data,
                 'expiresIn': 3600
             }
@@ -345,8 +425,10 @@ def google_auth(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_all_users(request):
-    """Get all users endpoint matching Spring Boot /api/users"""
+    """Get all users endpoint matching Spring Boot /api/users; ?stream=true streams a full dump"""
     users = User.objects.all()
+    if wants_stream(request):
+        return stream_json_list(request, users, UserSerializer)
     serializer = UserSerializer(users, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -385,6 +467,8 @@ def create_user(request):
         try:
             user = serializer.save()
             return Response(UserSerializer(user).data, status=status.HTTP_201_CREATED)
+        except PasswordHashingBusy:
+            raise
         except Exception as e:
             return Response({
                 'message': f'Failed to create user: {str(e)}'
@@ -520,8 +604,10 @@ def user_health_check(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_all_polls(request):
-    """Get all active polls endpoint matching Spring Boot /api/polls"""
-    polls = Poll.objects.filter(is_active=True)
+    """Get all active polls endpoint matching Spring Boot /api/polls; ?stream=true streams a full dump"""
+    polls = Poll.objects.filter(is_active=True).select_related('created_by')
+    if wants_stream(request):
+        return stream_json_list(request, polls, PollResponseSerializer)
     serializer = PollResponseSerializer(polls, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -530,14 +616,16 @@ def get_all_polls(request):
 def get_poll_by_id(request, id):
     """Get poll by ID endpoint matching Spring Boot /api/polls/{id}"""
     try:
-        poll = Poll.objects.get(id=id)
-        serializer = PollResponseSerializer(poll)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = get_or_compute(POLL_CACHE_KEY.format(id), lambda: _compute_poll(id))
+        return cache_compressed(Response(data, status=status.HTTP_200_OK), POLL_CACHE_KEY.format(id))
     except Poll.DoesNotExist:
         return Response({
             'message': 'Poll not found'
         }, status=status.HTTP_404_NOT_FOUND)
 
+def _compute_poll(id):
+    return dict(PollResponseSerializer(Poll.objects.select_related('created_by').get(id=id)).data)
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def create_poll(request):
@@ -594,24 +682,28 @@ def vote_on_poll(request, id):
                     'message': 'Invalid option'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Check if user already voted
-            if Vote.objects.filter(user_id=voter_user_id, poll=poll).exists():
-                return Response({
-                    'message': 'User has already voted on this poll'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Create vote record
-            Vote.objects.create(
-                user_id=voter_user_id,
-                poll=poll,
-                option=option
-            )
-            
-            # Update vote count
-            if poll.votes is None:
-                poll.votes = {}
-            poll.votes[option] = poll.votes.get(option, 0) + 1
-            poll.save()
+            # One write transaction (BEGIN IMMEDIATE on SQLite) so concurrent
+            # voters queue for the lock instead of losing tally updates
+            with transaction.atomic():
+                # Check if user already voted
+                if Vote.objects.filter(user_id=voter_user_id, poll=poll).exists():
+                    return Response({
+                        'message': 'User has already voted on this poll'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                
+                # Create vote record
+                Vote.objects.create(
+                    user_id=voter_user_id,
+                    poll=poll,
+                    option=option
+                )
+                
+                # Update vote count from the row as it is now, not as first read
+                poll = Poll.objects.select_for_update(of=('self',)).select_related('created_by').get(id=poll.id)
+                if poll.votes is None:
+                    poll.votes = {}
+                poll.votes[option] = poll.votes.get(option, 0) + 1
+                poll.save()
             
             return Response(PollResponseSerializer(poll).data, status=status.HTTP_200_OK)
         else:
@@ -629,21 +721,24 @@ def vote_on_poll(request, id):
 def delete_poll(request, id):
     """Delete poll endpoint matching Spring Boot /api/polls/{id}"""
     try:
-        poll = Poll.objects.get(id=id)
-        user_id = request.query_params.get('userId')
-        
-        if not user_id:
-            return Response({
-                'message': 'User ID is required'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Check if user is the creator
-        if poll.created_by.id != int(user_id):
-            return Response({
-                'message': 'Only poll creator can delete the poll'
-            }, status=status.HTTP_403_FORBIDDEN)
-        
-        poll.delete()
+        # Locked like vote_on_poll, so the totals the delete signal
+        # subtracts from CategoryStats include every vote committed before
+        with transaction.atomic():
+            poll = Poll.objects.select_for_update().get(id=id)
+            user_id = request.query_params.get('userId')
+            
+            if not user_id:
+                return Response({
+                    'message': 'User ID is required'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Check if user is the creator
+            if poll.created_by_id != int(user_id):
+                return Response({
+                    'message': 'Only poll creator can delete the poll'
+                }, status=status.HTTP_403_FORBIDDEN)
+            
+            poll.delete()
         return Response({
             'message': 'Poll deleted successfully'
         }, status=status.HTTP_200_OK)
@@ -656,7 +751,7 @@ def delete_poll(request, id):
 @permission_classes([AllowAny])
 def get_polls_by_category(request, category):
     """Get polls by category endpoint matching Spring Boot /api/polls/category/{category}"""
-    polls = Poll.objects.filter(category=category, is_active=True)
+    polls = Poll.objects.filter(category=category, is_active=True).select_related('created_by')
     serializer = PollResponseSerializer(polls, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -664,7 +759,7 @@ def get_polls_by_category(request, category):
 @permission_classes([AllowAny])
 def get_polls_by_user(request, userId):
     """Get polls by user endpoint matching Spring Boot /api/polls/user/{userId}"""
-    polls = Poll.objects.filter(created_by_id=userId)
+    polls = Poll.objects.filter(created_by_id=userId).select_related('created_by')
     serializer = PollResponseSerializer(polls, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -679,7 +774,7 @@ def get_polls_by_visibility(request, visibility):
                 'message': 'Invalid visibility setting'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        polls = Poll.objects.filter(visibility=visibility_upper, is_active=True)
+        polls = Poll.objects.filter(visibility=visibility_upper, is_active=True).select_related('created_by')
         serializer = PollResponseSerializer(polls, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     except Exception as e:
@@ -692,39 +787,94 @@ def get_polls_by_visibility(request, visibility):
 def get_poll_statistics(request, id):
     """Get poll statistics endpoint matching Spring Boot /api/polls/{id}/statistics"""
     try:
-        poll = Poll.objects.get(id=id)
-        total_votes = poll.total_votes
-        
-        # Calculate option statistics
-        option_stats = {}
-        for option, votes in poll.votes.items():
-            percentage = (votes / total_votes * 100) if total_votes > 0 else 0
-            option_stats[option] = {
-                'votes': votes,
-                'percentage': round(percentage, 2)
-            }
-        
-        # Calculate participation rate (simplified)
-        participation_rate = min(total_votes / 100, 1.0) * 100  # Assume 100 is max expected votes
-        
-        stats = {
-            'totalVotes': total_votes,
-            'optionStats': option_stats,
-            'participationRate': round(participation_rate, 2)
-        }
-        
-        return Response(stats, status=status.HTTP_200_OK)
+        stats = get_or_compute(POLL_STATISTICS_CACHE_KEY.format(id), lambda: _compute_poll_statistics(id))
+        return cache_compressed(Response(stats, status=status.HTTP_200_OK), POLL_STATISTICS_CACHE_KEY.format(id))
     except Poll.DoesNotExist:
         return Response({
             'message': 'Poll not found'
         }, status=status.HTTP_404_NOT_FOUND)
 
+def _compute_poll_statistics(id):
+    poll = Poll.objects.get(id=id)
+    total_votes = poll.total_votes
+    
+    # Calculate option statistics
+    option_stats = {}
+    for option, votes in poll.votes.items():
+        percentage = (votes / total_votes * 100) if total_votes > 0 else 0
+        option_stats[option] = {
+            'votes': votes,
+            'percentage': round(percentage, 2)
+        }
+    
+    # Calculate participation rate (simplified)
+    participation_rate = min(total_votes / 100, 1.0) * 100  # Assume 100 is max expected votes
+    
+    return {
+        'totalVotes': total_votes,
+        'optionStats': option_stats,
+        'participationRate': round(participation_rate, 2)
+    }
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_polls(request):
+    """
+    Stream polls, per-option tallies or individual votes as CSV or JSONL (staff only).
+
+    Query parameters: dataset (polls, tallies, votes), output (csv, jsonl),
+    category, since/until (date or datetime) and after, the first column of
+    the last row received, to resume an interrupted download. For tallies
+    drop the rows of that last poll before resuming, it may be incomplete.
+    """
+    params = request.query_params
+    output = params.get('output', 'csv')
+    try:
+        after = int(params['after']) if params.get('after') else None
+        export = PollExport(
+            params.get('dataset', 'polls'),
+            category=params.get('category'),
+            since=params.get('since'),
+            until=params.get('until'),
+            after=after,
+            chunk_size=settings.EXPORT_CHUNK_SIZE,
+        )
+        chunks = export.stream(output, header=after is None)
+    except (ExportError, ValueError) as e:
+        return Response({
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    response = streaming_response(request, chunks, EXPORT_FORMATS[output].content_type)
+    response['Content-Disposition'] = f'attachment; filename="{export.dataset.name}.{output}"'
+    return response
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_available_categories(request):
     """Get available categories endpoint matching Spring Boot /api/polls/categories"""
-    categories = Poll.objects.values_list('category', flat=True).distinct()
-    return Response(list(categories), status=status.HTTP_200_OK)
+    categories = get_or_compute(POLL_CATEGORIES_CACHE_KEY, _compute_categories)
+    return cache_compressed(Response(categories, status=status.HTTP_200_OK), POLL_CATEGORIES_CACHE_KEY)
+
+def _compute_categories():
+    return list(Poll.objects.order_by('category').values_list('category', flat=True).distinct())
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_poll_analytics(request):
+    """
+    Votes, polls, average options and top polls per category, read from the
+    CategoryStats aggregates. ``top`` sets the number of top polls listed per
+    category (ANALYTICS_TOP_POLLS by default, at most ANALYTICS_MAX_TOP_POLLS).
+    """
+    try:
+        top = int(request.query_params.get('top', settings.ANALYTICS_TOP_POLLS))
+    except ValueError:
+        top = -1
+    if not 0 <= top <= settings.ANALYTICS_MAX_TOP_POLLS:
+        return Response({
+            'message': f'top must be between 0 and {settings.ANALYTICS_MAX_TOP_POLLS}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return Response(category_analytics(top), status=status.HTTP_200_OK)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -738,7 +888,7 @@ def polls_health_check(request):
 # ==================== LEGACY VIEWS (for backward compatibility) ====================
 
 class PollViewSet(viewsets.ModelViewSet):
-    queryset = Poll.objects.all()
+    queryset = Poll.objects.select_related('created_by')
     serializer_class = PollResponseSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
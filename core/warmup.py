@@ -0,0 +1,133 @@
+import inspect
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.db import connections
+from django.urls import get_resolver
+from rest_framework import serializers as drf_serializers
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+# DRF resolves these import strings on first access, i.e. the first request
+_DRF_SETTINGS = [
+    'DEFAULT_RENDERER_CLASSES',
+    'DEFAULT_PARSER_CLASSES',
+    'DEFAULT_AUTHENTICATION_CLASSES',
+    'DEFAULT_PERMISSION_CLASSES',
+    'DEFAULT_THROTTLE_CLASSES',
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS',
+    'DEFAULT_PAGINATION_CLASS',
+    'EXCEPTION_HANDLER',
+]
+
+
+class Warmup:
+    """
+    Do the work a fresh worker would otherwise do on its first requests.
+
+    Steps, in order: build the URLconf and DRF's lazily imported classes;
+    build every serializer's fields (model metadata, validators); prime the
+    category catalogue and the ``top_polls`` most voted polls (detail and
+    statistics) through get_or_compute; load the token blacklist filter and
+    password hashers used by authentication.
+
+    Run it before forking (gunicorn --preload) so workers inherit the
+    loaded modules and the in-process cache tier.
+    """
+
+    def __init__(self, top_polls=100):
+        self.top_polls = top_polls
+        self.report = []
+
+    def run(self):
+        steps = [
+            ('urls', self.load_urls),
+            ('serializers', self.build_serializers),
+            ('categories', self.prime_categories),
+            ('polls', self.prime_polls),
+            ('auth', self.load_auth),
+        ]
+        for name, step in steps:
+            started = time.perf_counter()
+            primed = step()
+            self.report.append({
+                'step': name,
+                'seconds': round(time.perf_counter() - started, 4),
+                'primed': primed,
+            })
+        return self.report
+
+    @property
+    def seconds(self):
+        return round(sum(step['seconds'] for step in self.report), 4)
+
+    def load_urls(self):
+        resolver = get_resolver()
+        resolver.reverse_dict  # Builds the lookup tables for every included URLconf
+        for name in _DRF_SETTINGS:
+            getattr(api_settings, name)
+        return len(resolver.reverse_dict)
+
+    def build_serializers(self):
+        from . import serializers
+
+        built = 0
+        for _, cls in inspect.getmembers(serializers, inspect.isclass):
+            if issubclass(cls, drf_serializers.Serializer) and cls.__module__ == serializers.__name__:
+                cls().fields
+                built += 1
+        return built
+
+    def prime_categories(self):
+        from .cache import get_or_compute
+        from .models import POLL_CATEGORIES_CACHE_KEY
+        from .views import _compute_categories
+
+        return len(get_or_compute(POLL_CATEGORIES_CACHE_KEY, _compute_categories))
+
+    def prime_polls(self):
+        from .cache import get_or_compute
+        from .models import POLL_CACHE_KEY, POLL_STATISTICS_CACHE_KEY, Poll
+        from .views import _compute_poll, _compute_poll_statistics
+
+        poll_ids = (
+            Poll.objects.filter(is_active=True)
+            .order_by('-vote_count', '-id')
+            .values_list('id', flat=True)[:self.top_polls]
+        )
+        for poll_id in poll_ids:
+            get_or_compute(POLL_CACHE_KEY.format(poll_id), lambda: _compute_poll(poll_id))
+            get_or_compute(POLL_STATISTICS_CACHE_KEY.format(poll_id), lambda: _compute_poll_statistics(poll_id))
+        return len(poll_ids)
+
+    def load_auth(self):
+        from .token_blacklist import token_blacklist
+
+        hashers.get_hashers()
+        return token_blacklist.load()
+
+
+def warm_up_on_startup(entry_point):
+    """
+    Hook for moviepoll.wsgi and moviepoll.asgi: warm up when WARMUP_ON_STARTUP
+    is set. Failures are logged and the server starts cold rather than not at all.
+    """
+    if not settings.WARMUP_ON_STARTUP:
+        return None
+    warmup = Warmup(top_polls=settings.WARMUP_TOP_POLLS)
+    try:
+        report = warmup.run()
+    except Exception:
+        logger.exception('Warm-up of %s failed; starting cold', entry_point)
+        return None
+    finally:
+        # Workers forked after this must not share the master's sockets
+        connections.close_all()
+    logger.info(
+        'Warmed up %s in %.3fs', entry_point, warmup.seconds,
+        extra={'data': {'entry_point': entry_point, 'seconds': warmup.seconds, 'steps': report}}
+    )
+    return report
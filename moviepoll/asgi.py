@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'moviepoll.settings')
 
 application = get_asgi_application()
+
+# Preload and prime caches when DJANGO_WARMUP is set (see core.warmup)
+from core.warmup import warm_up_on_startup  # noqa: E402
+
+warm_up_on_startup('moviepoll.asgi')
@@ -8,6 +8,8 @@ Enhanced to provide the same functionality as the Spring Boot backend.
 from pathlib import Path
 from datetime import timedelta
 import os
+import sys
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -41,6 +43,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.compression.CompressionMiddleware',
+    'core.db_router.ReplicaStickinessMiddleware',
+    'core.query_budget.QueryBudgetMiddleware',
+    'core.slow_queries.SlowQueryMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -74,13 +81,50 @@ WSGI_APPLICATION = 'moviepoll.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite production profile: WAL lets readers run alongside the writer,
+# busy_timeout/timeout make writers queue instead of failing with
+# "database is locked", and BEGIN IMMEDIATE takes the write lock up front so
+# transactions never deadlock upgrading from a read lock.
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',  # Durable across app crashes; fsync only at checkpoints
+    'PRAGMA cache_size=-20000',  # ~20MB page cache per connection
+    'PRAGMA mmap_size=134217728',  # 128MB memory-mapped I/O
+    'PRAGMA busy_timeout=20000',
+    'PRAGMA temp_store=MEMORY',
+]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,  # Keep connections open between requests
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+        },
     }
 }
 
+# Read replicas: reads of core models go to a replica, writes to 'default'.
+# Try it locally with two SQLite files:
+#   DJANGO_DB_REPLICA=db_replica.sqlite3 python manage.py migrate --database replica
+DATABASE_REPLICAS = []
+if os.getenv('DJANGO_DB_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / os.getenv('DJANGO_DB_REPLICA'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append('replica')
+
+DATABASE_ROUTERS = ['core.db_router.ReadReplicaRouter']
+
+# Seconds a client keeps reading from the primary after it wrote, covering replica lag
+DATABASE_REPLICA_LAG_TOLERANCE = 2
+
 # MySQL Configuration (uncomment when MySQL is available)
 # DATABASES = {
 #     'default': {
@@ -151,17 +195,25 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.BlacklistJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',  # Changed to AllowAny to match Spring Boot
     ),
+    # orjson-backed drop-ins for JSONRenderer/JSONParser (stock ones without orjson);
+    # JSON stays the default, MessagePack/CBOR are negotiated via Accept/Content-Type
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'core.renderers.ORJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+        'core.renderers.CBORRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'core.parsers.ORJSONParser',
+        'core.parsers.MessagePackParser',
+        'core.parsers.CBORParser',
     ],
+    # Formats whose library isn't installed are not offered
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'core.negotiation.AvailableFormatsNegotiation',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
@@ -178,7 +230,7 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    'UPDATE_LAST_LOGIN': False,  # Login views stamp last_login themselves (see User.record_login)
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'VERIFYING_KEY': None,
@@ -199,6 +251,23 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Minimum seconds between two last-login writes for the same user
+LAST_LOGIN_UPDATE_INTERVAL = 60
+
+# ==================== PASSWORD HASHING POOL ====================
+# Bounded worker pool for PBKDF2 hashing/checking (see core/hashing.py)
+
+PASSWORD_HASHING_WORKERS = None  # Defaults to os.cpu_count()
+PASSWORD_HASHING_MAX_QUEUE = 64  # Jobs allowed to wait for a worker
+PASSWORD_HASHING_QUEUE_TIMEOUT = 2.0  # Seconds to wait for a slot before answering 503
+
+# ==================== TOKEN BLACKLIST CONFIGURATION ====================
+# Revoked refresh/access tokens (rotation and logout)
+
+TOKEN_BLACKLIST_BLOOM_CAPACITY = 100000  # Expected live (unexpired) revoked tokens
+TOKEN_BLACKLIST_BLOOM_ERROR_RATE = 0.001  # False positives fall through to a DB lookup
+TOKEN_BLACKLIST_SYNC_INTERVAL = 5  # Seconds a token revoked by another worker may still be accepted
+
 # ==================== CORS CONFIGURATION ====================
 # Matching Spring Boot CORS configuration
 
@@ -257,6 +326,27 @@ SESSION_COOKIE_SAMESITE = 'Lax'
 # ==================== LOGGING CONFIGURATION ====================
 # Enhanced logging for debugging and monitoring
 
+# Request threads only enqueue records (QueueListenerHandler); a background
+# listener writes JSON lines to a rotating file and plain text to console.
+# Rotation is size-based by default; set DJANGO_LOG_ROTATE_WHEN (e.g.
+# 'midnight') to rotate on time instead.
+LOG_FILE_HANDLER = {
+    'level': 'INFO',
+    'class': 'logging.handlers.RotatingFileHandler',
+    'filename': os.path.join(BASE_DIR, 'logs', 'django.log'),
+    'maxBytes': 10 * 1024 * 1024,
+    'backupCount': 5,
+    'delay': True,
+    'formatter': 'json',
+}
+if os.getenv('DJANGO_LOG_ROTATE_WHEN'):
+    LOG_FILE_HANDLER.update({
+        'class': 'logging.handlers.TimedRotatingFileHandler',
+        'when': os.getenv('DJANGO_LOG_ROTATE_WHEN'),
+        'backupCount': 7,
+    })
+    del LOG_FILE_HANDLER['maxBytes']
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -269,32 +359,47 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'core.log_handlers.JSONFormatter',
+        },
     },
-    'handlers': {
-        'file': {
-            'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'django.log'),
-            'formatter': 'verbose',
+    'filters': {
+        # Keep 10% of DEBUG records from core.* loggers
+        'sample_core_debug': {
+            '()': 'core.log_handlers.SamplingFilter',
+            'prefix': 'core',
+            'rate': 0.1,
+            'max_level': 'DEBUG',
         },
+    },
+    'handlers': {
+        'file': LOG_FILE_HANDLER,
         'console': {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        'queue': {
+            # '()' rather than 'class': from Python 3.12 dictConfig builds
+            # 'class' QueueHandlers itself and would not pass 'handlers' on
+            '()': 'core.log_handlers.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+            'queue_size': 10000,
+            'filters': ['sample_core_debug'],
+        },
     },
     'root': {
-        'handlers': ['console', 'file'],
+        'handlers': ['queue'],
         'level': 'INFO',
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
         'core': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': False,
         },
@@ -327,16 +432,146 @@ EMAIL_SSL_CERTFILE = None
 EMAIL_SSL_KEYFILE = None
 EMAIL_TIMEOUT = 30
 
+# SMTP connection pooling (see core/email_backend.py)
+EMAIL_POOL_ENABLED = True
+EMAIL_POOL_MAX_IDLE = 4  # Idle authenticated sessions kept per server
+EMAIL_POOL_IDLE_TIMEOUT = 60  # Seconds before an idle session is dropped
+EMAIL_POOL_MAX_MESSAGES = 100  # Messages per session before reconnecting
+EMAIL_POOL_NOOP_AFTER = 1.0  # Idle seconds after which a NOOP liveness check is sent
+
+# Outbox delivery (python manage.py send_outbox_emails --loop)
+EMAIL_OUTBOX_BATCH_SIZE = 50  # Emails sent per SMTP connection
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_BASE_DELAY = 30  # Seconds; doubles after every failed attempt
+EMAIL_OUTBOX_RETRY_MAX_DELAY = 3600
+EMAIL_OUTBOX_LEASE = 300  # Seconds before a claimed-but-unfinished email is retried
+EMAIL_OUTBOX_RETENTION_DAYS = 7  # Sent/failed rows (bodies already blanked) are then deleted
+
 # ==================== CACHE CONFIGURATION ====================
 # Cache configuration for better performance
 
+# Two tiers: a small per-process LRU in front of a cache shared by all
+# workers. Swap 'shared' for Redis/Memcached in production; invalidations
+# reach every worker within SYNC_INTERVAL (and never later than L1_TIMEOUT).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-    }
+        'BACKEND': 'core.cache.TwoTierCache',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'L2': 'shared',
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+            'SYNC_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'TIMEOUT': 300,
+    },
 }
 
+# Tests clear the cache; keep them away from the development cache directory
+if sys.argv[1:2] == ['test']:
+    CACHES['shared']['LOCATION'] = tempfile.mkdtemp(prefix='moviepoll-test-cache-')
+
+# Single-flight recomputation of hot entries (core.cache.get_or_compute)
+CACHE_FRESH_TIMEOUT = 60  # Seconds a computed value is served as fresh
+CACHE_STALE_TIMEOUT = 30  # Further seconds it may be served stale while one caller refreshes it
+CACHE_EARLY_EXPIRY_BETA = 1.0  # >1 refreshes earlier, 0 disables probabilistic early expiry
+CACHE_LOCK_TIMEOUT = 10  # Seconds other callers wait for the recomputing one
+
+# ==================== METRICS CONFIGURATION ====================
+# Per-route request metrics (core.metrics), served in Prometheus format at /metrics.
+# Each worker writes a snapshot into METRICS_DIR; /metrics sums all of them.
+
+METRICS_DIR = os.getenv('DJANGO_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'moviepoll-metrics'))
+METRICS_FLUSH_INTERVAL = 5  # Seconds between snapshot writes per worker (background thread)
+# /metrics answers requests carrying 'Authorization: Bearer <METRICS_TOKEN>'
+# or coming from METRICS_ALLOWED_IPS; everyone else gets 403.
+METRICS_TOKEN = os.getenv('DJANGO_METRICS_TOKEN')
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# ==================== QUERY BUDGET CONFIGURATION ====================
+# Per-request query counting and N+1 detection (core.query_budget). Off in
+# production; tests turn on QUERY_BUDGET_ENFORCE so an exceeded budget fails.
+
+QUERY_BUDGET_ENABLED = DEBUG
+QUERY_BUDGET_ENFORCE = False  # Raise QueryBudgetExceeded instead of logging a warning
+QUERY_REPEAT_THRESHOLD = 3  # Same query shape this many times in a request is reported as N+1
+QUERY_BUDGET_DEFAULT = None  # Budget for URL names not listed below (None: unlimited)
+QUERY_BUDGETS = {
+    # URL name -> maximum queries per request
+    'get-all-polls': 1,
+    'get-poll-by-id': 1,
+    'get-polls-by-category': 1,
+    'get-polls-by-user': 1,
+    'get-polls-by-visibility': 1,
+    'get-poll-statistics': 1,
+    'get-available-categories': 1,
+    'create-poll': 7,  # 4, plus the CategoryStats insert for the first poll of a category
+    'vote-on-poll': 6,
+    'delete-poll': 4,
+    'get-all-users': 1,
+    'get-active-users': 1,
+    'get-users-by-loyalty-tier': 1,
+    # get-poll-analytics: one query per category by design (see core.analytics)
+}
+
+# ==================== SLOW QUERY LOG ====================
+# Statements slower than the threshold are logged by core.slow_queries with
+# their plan; `manage.py slow_query_report` aggregates them from the log.
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('DJANGO_SLOW_QUERY_MS', '100'))
+SLOW_QUERY_EXPLAIN = True  # Capture EXPLAIN (QUERY PLAN) the first time a statement is slow
+SLOW_QUERY_SAMPLES = 1000  # Durations kept per statement for percentiles
+
+# ==================== STARTUP BUDGET ====================
+# Cold-start import cost of the WSGI entry point plus URLconf, measured by
+# `manage.py profile_startup --check`; the test suite fails at 3x the budget.
+
+STARTUP_IMPORT_BUDGET_MS = float(os.getenv('DJANGO_STARTUP_BUDGET_MS', '1500'))
+STARTUP_LAZY_MODULES = [
+    # Heavy, rarely used dependencies that must only load on first use
+    'google.auth',
+    'google.oauth2',
+    'core.email_service',
+]
+
+# ==================== WARM-UP CONFIGURATION ====================
+# With DJANGO_WARMUP=true the WSGI/ASGI entry points preload URLs,
+# serializers and hot cache entries (core.warmup) before serving. Use with
+# `gunicorn --preload` so the work happens once, before workers fork.
+
+WARMUP_ON_STARTUP = os.getenv('DJANGO_WARMUP', '').lower() in ('1', 'true', 'yes')
+WARMUP_TOP_POLLS = 100  # Most voted polls whose detail and statistics are cached
+
+# ==================== STREAMING CONFIGURATION ====================
+# List endpoints called with ?stream=true stream the whole table (core.streaming);
+# /api/polls/export/ streams polls, tallies and votes as CSV/JSONL (core.exports)
+
+STREAMING_CHUNK_SIZE = 2000  # Rows fetched, serialized and sent per chunk
+EXPORT_CHUNK_SIZE = 5000  # Rows per keyset query of /api/polls/export/ (core.exports)
+
+# ==================== COMPRESSION CONFIGURATION ====================
+# Response compression (core.compression). zstd and br are offered only when
+# the zstandard / brotli packages are installed; gzip always is.
+
+COMPRESSION_ENCODINGS = ['zstd', 'br', 'gzip']  # Server preference among what the client accepts
+COMPRESSION_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+COMPRESSION_MIN_SIZE = 1024  # Smaller bodies are sent as is
+COMPRESSION_CONTENT_TYPES = [
+    'application/json', 'application/x-ndjson', 'application/msgpack', 'application/cbor', 'text/',
+]
+COMPRESSION_CACHE_TIMEOUT = 300  # Compressed variants of cached responses (see cache_compressed)
+
+# ==================== ANALYTICS CONFIGURATION ====================
+# /api/polls/analytics/ reads per-category totals kept by the Poll signals
+# (core.models.CategoryStats); `manage.py rebuild_poll_analytics` recomputes them.
+
+ANALYTICS_TOP_POLLS = 5  # Top polls listed per category by default
+ANALYTICS_MAX_TOP_POLLS = 50
+
 # ==================== FILE UPLOAD CONFIGURATION ====================
 # File upload settings
 
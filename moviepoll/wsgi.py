@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'moviepoll.settings')
 
 application = get_wsgi_application()
+
+# Preload and prime caches when DJANGO_WARMUP is set (see core.warmup)
+from core.warmup import warm_up_on_startup  # noqa: E402
+
+warm_up_on_startup('moviepoll.wsgi')